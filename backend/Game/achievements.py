@@ -0,0 +1,85 @@
+import math
+import logging
+from api.db_utils import load_achievement_rules
+
+SIDES = ("LEFT", "RIGHT")
+
+class AchievementTracker:
+	"""Achievements of one game, evaluated on the in-memory game state.
+
+	on_score only follows the scores for the comeback achievements, every
+	other rule is evaluated once when the game ends. The results go out with
+	the GameResult and are written in one bulk_update per player. Unlock
+	values come from the Achievement table, read once per worker.
+	"""
+	CLUTCH_MARGIN = 3
+	GODS_CLUTCH_MARGIN = 6
+	FLAWLESS_SCORE = 10
+	rules = None
+
+	def __init__(self, mode, eligible):
+		self.logger = logging.getLogger('game')
+		self.mode = mode
+		self.eligible = eligible
+		self.clutch = None
+		self.gods_clutch = None
+
+	@classmethod
+	async def load_rules(cls):
+		if cls.rules is None:
+			cls.rules = await load_achievement_rules()
+		return cls.rules
+
+	def on_score(self, game):
+		if not self.eligible or game.ended:
+			return
+		left = game.player_left.score
+		right = game.player_right.score
+		trailing = "LEFT" if left < right else "RIGHT"
+		if self.clutch is None and abs(left - right) > self.CLUTCH_MARGIN:
+			self.clutch = trailing
+			self.logger.info(f"Player {trailing.lower()} elligible for Clutch")
+		if self.gods_clutch is None and abs(left - right) > self.GODS_CLUTCH_MARGIN:
+			self.gods_clutch = trailing
+			self.logger.info(f"Player {trailing.lower()} elligible for God's Clutch")
+
+	def progress(self, game, winner, profiles):
+		"""Value each side reached this game, {side: {achievement name: value}}."""
+		progress = {side: {} for side in SIDES}
+		if not self.eligible or winner not in SIDES:
+			return progress
+		loser = SIDES[1 - SIDES.index(winner)]
+		scores = {"LEFT": game.player_left.score, "RIGHT": game.player_right.score}
+		won = progress[winner]
+		if self.clutch == winner:
+			won["Clutch"] = 1
+		if self.gods_clutch == winner:
+			won["God's Clutch"] = 1
+		if scores[winner] == self.FLAWLESS_SCORE and scores[loser] == 0:
+			won["Flawless"] = 1
+		won["Challenger"] = profiles[winner].wins + 1
+		if self.mode == "classic":
+			won["Vanilla"] = 1
+		else:
+			won["Rumbler"] = 1
+			for side, player in zip(SIDES, (game.player_left, game.player_right)):
+				progress[side]["Speed Of Light"] = math.floor(game.ball.highestSpeed)
+				progress[side]["Survivor"] = math.floor(game.highestKillerSurvive)
+				progress[side]["Honey, I Shrunk the Paddles"] = player.highestShrinkPaddle
+		return progress
+
+	async def results(self, game, winner, profiles):
+		"""Per side [achievement id, progression, unlocked] rows for flush_achievements."""
+		rules = await self.load_rules()
+		results = {}
+		for side, reached in self.progress(game, winner, profiles).items():
+			rows = []
+			for name, value in reached.items():
+				if name not in rules:
+					self.logger.info(f"Achievement {name} not found")
+					continue
+				achievement_id, unlock_value = rules[name]
+				if value > 0:
+					rows.append([achievement_id, min(value, unlock_value), value >= unlock_value])
+			results[side] = rows
+		return results
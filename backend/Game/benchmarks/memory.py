@@ -0,0 +1,164 @@
+"""Memory footprint and per tick allocation benchmark for the game entities.
+
+Run from the backend directory:
+
+	python -m Game.benchmarks.memory [--games 500] [--ticks 600] [--minutes 10]
+
+Reports the bytes retained by one game instance and the bytes allocated while
+stepping a running game, serializing its state and refreshing a bot's vision,
+as measured by tracemalloc. For comparison the footprint is measured again
+with dict-backed copies of the slotted entities (Vector2D, Ball, Player,
+GameBounds), the layout they had before __slots__. A new game already holds
+its seeded generator, input buffer and replay header; the replay log then
+grows by one 3 byte record per key change, reported per minute of a bot
+against bot game, up to ReplayRecorder.MAX_BYTES.
+"""
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+from .. import game_helper_class, normal_game_logic, rumble_game_logic
+from ..normal_game_logic import ClassicGameInstance
+from ..rumble_game_logic import RumbleGameInstance
+from ..bot import Bot
+from ..replay_log import ReplayRecorder
+
+MODES = {"classic": ClassicGameInstance, "rumble": RumbleGameInstance}
+
+async def noop(*args):
+	pass
+
+def dict_backed(cls):
+	"""Copy of a slotted class that keeps its attributes in an instance __dict__."""
+	hidden = set(cls.__slots__) | {"__slots__", "__dict__", "__weakref__"}
+	return type(cls.__name__, cls.__bases__, {name: value for name, value in vars(cls).items() if name not in hidden})
+
+class DictBacked:
+	"""Swaps the slotted game entities of the game logic modules for dict-backed copies."""
+	ENTITIES = (
+		(game_helper_class, ("Vector2D",)),
+		(normal_game_logic, ("Vector2D", "Ball", "Player", "GameBounds")),
+		(rumble_game_logic, ("Vector2D", "Ball", "Player", "GameBounds")),
+	)
+
+	def __init__(self):
+		self.originals = []
+
+	def __enter__(self):
+		copies = {}
+		for module, names in self.ENTITIES:
+			for name in names:
+				cls = getattr(module, name)
+				if cls not in copies:
+					copies[cls] = dict_backed(cls)
+				self.originals.append((module, name, cls))
+				setattr(module, name, copies[cls])
+		return self
+
+	def __exit__(self, *exc):
+		for module, name, cls in self.originals:
+			setattr(module, name, cls)
+		self.originals = []
+
+def create_game(mode):
+	return MODES[mode](noop, noop, False, False)
+
+def frame_payload(game):
+	# rumble is measured with the Visible Trajectory payload, its most expensive frame
+	trajectory = game.ball.predict_trajectory() if hasattr(game, 'event') else []
+	return {
+		"positions": {
+			"player_left": game.player_left.position.to_dict(),
+			"player_right": game.player_right.position.to_dict(),
+			"ball": game.ball.position.to_dict(),
+		},
+		"trajectory": [point.to_dict() for point in trajectory],
+	}
+
+def measure_footprint(mode, count):
+	games = []
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	for _ in range(count):
+		games.append(create_game(mode))
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return (after - before) / count
+
+def measure_ticks(mode, ticks):
+	game = create_game(mode)
+	bot = Bot(5, game, None)
+	game.start()
+	game.ball.countdown = 0
+	game.ball.start_movement()
+	step = game.clock.step
+
+	tracemalloc.start()
+	transient = 0
+	started = time.perf_counter()
+	for _ in range(ticks):
+		base = tracemalloc.get_traced_memory()[0]
+		tracemalloc.reset_peak()
+		game.step(step)
+		game.pending_events.clear()
+		bot.update_vision()
+		bot.update_movement()
+		frame_payload(game)
+		transient += tracemalloc.get_traced_memory()[1] - base
+		if not game.is_running:
+			game.start()
+	elapsed = time.perf_counter() - started
+	tracemalloc.stop()
+	return transient / ticks, elapsed / ticks
+
+def measure_replay(mode, minutes):
+	game = create_game(mode)
+	bots = [Bot(5, game, None, side) for side in ("LEFT", "RIGHT")]
+	now = 0.0
+	for bot in bots:
+		bot.last_vision_update = now
+		bot.start_bot()
+	game.start()
+	game.clock.reset(now)
+	start = len(game.recorder.buffer)
+	# the log survives a restart, keep playing the same game for the whole span
+	while now < minutes * 60:
+		now += game.clock.broadcast_interval
+		for bot in bots:
+			bot.tick(now)
+		game.advance(now)
+		game.pending_events.clear()
+		if not game.is_running:
+			game.start()
+			game.clock.reset(now)
+	return (len(game.recorder.buffer) - start) / minutes
+
+def run(args):
+	for mode in MODES:
+		random.seed(args.seed)
+		footprint = measure_footprint(mode, args.games)
+		random.seed(args.seed)
+		with DictBacked():
+			unslotted = measure_footprint(mode, args.games)
+		random.seed(args.seed)
+		per_tick, tick_time = measure_ticks(mode, args.ticks)
+		random.seed(args.seed)
+		replay = measure_replay(mode, args.minutes)
+		print(f"{mode:8} footprint {footprint/1024:8.2f} KiB/game ({unslotted/1024:.2f} dict-backed)   "
+			f"allocated {per_tick/1024:8.2f} KiB/tick   "
+			f"{tick_time*1e6:8.1f} us/tick (traced)   "
+			f"replay {replay:6.0f} B/min (cap {ReplayRecorder.MAX_BYTES // 1024} KiB)")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--games", type=int, default=500)
+	parser.add_argument("--ticks", type=int, default=600)
+	parser.add_argument("--minutes", type=float, default=10)
+	parser.add_argument("--seed", type=int, default=42)
+	args = parser.parse_args()
+	logging.disable(logging.CRITICAL)
+	run(args)
+
+if __name__ == "__main__":
+	main()
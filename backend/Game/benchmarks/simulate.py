@@ -0,0 +1,225 @@
+"""Headless throughput benchmark, bot against bot games in virtual time.
+
+Run from the backend directory:
+
+	python -m Game.benchmarks.simulate [--games 1000] [--seconds 60] [--mode all]
+
+Each game gets its seed from --seed and a hard bot on both sides, nothing
+touches a channel layer or the database. The clock is virtual, so games run
+as fast as the CPU allows; ended games are replaced by fresh ones. Reports
+game ticks per second (and the 60 Hz games one worker sustains at that rate),
+the per tick cost of each phase, the bytes allocated per tick and a digest
+of the final game states to check two runs simulated the same.
+"""
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+import zlib
+from .. import normal_game_logic, rumble_game_logic
+from ..normal_game_logic import ClassicGameInstance
+from ..rumble_game_logic import RumbleGameInstance
+from ..bot import Bot
+from ..frame_codec import JsonFrameCodec, BinaryFrameCodec, wire_position
+from ..frame_delta import DeltaEncoder
+from .wire import key_state
+
+MODES = {"classic": ClassicGameInstance, "rumble": RumbleGameInstance}
+PHASES = ("bots", "movement", "collision", "events", "encode")
+
+async def noop(*args):
+	pass
+
+class FrameSink:
+	"""Stands in for GameBackend's broadcast: builds, deltas and encodes the frame with both codecs."""
+	def __init__(self):
+		self.game = None
+		self.delta = DeltaEncoder(120)
+		self.codecs = (JsonFrameCodec(), BinaryFrameCodec())
+		self.bytes = 0
+
+	async def broadcast(self):
+		game = self.game
+		data = {
+			"positions": {
+				"player_left": wire_position(game.player_left.position),
+				"player_right": wire_position(game.player_right.position),
+				"ball": wire_position(game.ball.position),
+			},
+			"keys": {
+				"player_left": key_state(game.player_left.keys),
+				"player_right": key_state(game.player_right.keys),
+			},
+			"scores": {"left": game.player_left.score, "right": game.player_right.score},
+			"ball_color": "#447AFF" if game.ball.lastHitter == "LEFT" else "#00BDD1",
+			"events": [],
+		}
+		if hasattr(game, 'event'):
+			data["trajectory"] = [wire_position(point) for point in game.ball.trajectory.ahead()] if game.event.name == 'Visible Trajectory' else []
+		frame = self.delta.encode(data)
+		if frame:
+			for codec in self.codecs:
+				self.bytes += len(codec.encode("game_update", frame))
+
+class Match:
+	__slots__ = ('game', 'bots', 'sink')
+
+	def __init__(self, mode, seed, now):
+		self.sink = FrameSink()
+		self.game = MODES[mode](self.sink.broadcast, noop, False, False, seed)
+		self.sink.game = self.game
+		self.bots = (Bot(5, self.game, None, "LEFT"), Bot(5, self.game, None, "RIGHT"))
+		for bot in self.bots:
+			bot.last_vision_update = now
+			bot.start_bot()
+		self.game.start()
+		self.game.clock.reset(now)
+
+class Timed:
+	"""Wraps sweep_ball in a game logic module so collision time can be told apart from movement."""
+	def __init__(self, module):
+		self.module = module
+		self.original = module.sweep_ball
+		self.elapsed = 0.0
+
+	def __enter__(self):
+		def sweep_ball(game, delta_time):
+			started = time.perf_counter()
+			self.original(game, delta_time)
+			self.elapsed += time.perf_counter() - started
+		self.module.sweep_ball = sweep_ball
+		return self
+
+	def __exit__(self, *exc):
+		self.module.sweep_ball = self.original
+
+class Simulation:
+	def __init__(self, mode, games, seed):
+		self.mode = mode
+		self.seed = seed
+		self.started = 0
+		self.now = 0.0
+		self.step = 1 / MODES[mode].PHYSICS_RATE
+		self.matches = [self.new_match() for _ in range(games)]
+		self.finished = 0
+		self.ticks = 0
+
+	def new_match(self):
+		match = Match(self.mode, self.seed + self.started, self.now)
+		self.started += 1
+		return match
+
+	def digest(self):
+		"""Checksum of every game's state, equal across runs as long as the simulation is deterministic."""
+		state = [(match.game.player_left.score, match.game.player_right.score, round(match.game.ball.position.x, 6), round(match.game.ball.position.y, 6)) for match in self.matches]
+		return zlib.crc32(repr((self.finished, state)).encode())
+
+	def replace_finished(self):
+		for index, match in enumerate(self.matches):
+			if not match.game.is_running:
+				self.finished += 1
+				self.matches[index] = self.new_match()
+
+	async def tick(self):
+		"""One scheduler frame for every game, the same calls GameScheduler makes with the I/O awaited in place."""
+		self.now += self.step
+		for match in self.matches:
+			game = match.game
+			game.inputs.apply()
+			for bot in match.bots:
+				bot.tick(self.now)
+			game.advance(self.now)
+			broadcast = game.broadcast_due()
+			await game.dispatch_events()
+			if broadcast:
+				await game.broadcast()
+		self.ticks += len(self.matches)
+		self.replace_finished()
+
+	async def timed_tick(self, phases, sweep):
+		"""Same work as tick, one phase at a time so each can be timed."""
+		self.now += self.step
+		for match in self.matches:
+			game = match.game
+			started = time.perf_counter()
+			game.inputs.apply()
+			for bot in match.bots:
+				bot.tick(self.now)
+			moved = time.perf_counter()
+			collision = sweep.elapsed
+			game.advance(self.now)
+			stepped = time.perf_counter()
+			collision = sweep.elapsed - collision
+			broadcast = game.broadcast_due()
+			await game.dispatch_events()
+			dispatched = time.perf_counter()
+			if broadcast:
+				await game.broadcast()
+			encoded = time.perf_counter()
+			phases["bots"] += moved - started
+			phases["movement"] += stepped - moved - collision
+			phases["collision"] += collision
+			phases["events"] += dispatched - stepped
+			phases["encode"] += encoded - dispatched
+		self.ticks += len(self.matches)
+		self.replace_finished()
+
+async def throughput(mode, args):
+	simulation = Simulation(mode, args.games, args.seed)
+	frames = int(args.seconds / simulation.step)
+	started = time.perf_counter()
+	for _ in range(frames):
+		await simulation.tick()
+	elapsed = time.perf_counter() - started
+	return simulation.ticks / elapsed, simulation.finished, simulation.digest()
+
+async def phase_costs(mode, args):
+	simulation = Simulation(mode, min(args.games, args.phase_games), args.seed)
+	module = normal_game_logic if mode == "classic" else rumble_game_logic
+	phases = dict.fromkeys(PHASES, 0.0)
+	with Timed(module) as sweep:
+		for _ in range(int(args.seconds / simulation.step)):
+			await simulation.timed_tick(phases, sweep)
+	return {phase: elapsed / simulation.ticks for phase, elapsed in phases.items()}
+
+async def allocations(mode, args):
+	simulation = Simulation(mode, 1, args.seed)
+	for _ in range(60):
+		await simulation.tick()
+	tracemalloc.start()
+	transient = 0
+	for _ in range(args.alloc_ticks):
+		base = tracemalloc.get_traced_memory()[0]
+		tracemalloc.reset_peak()
+		await simulation.tick()
+		transient += tracemalloc.get_traced_memory()[1] - base
+	tracemalloc.stop()
+	return transient / args.alloc_ticks
+
+async def run(args):
+	modes = list(MODES) if args.mode == "all" else [args.mode]
+	print(f"{args.games} games per mode, {args.seconds}s of virtual time, seed {args.seed}")
+	print(f"{'mode':8} {'ticks/s':>10} {'60Hz games':>10} {'ended':>6} {'digest':>8} " + " ".join(f"{phase:>9}" for phase in PHASES) + f" {'alloc/tick':>10}")
+	for mode in modes:
+		ticks_per_second, finished, digest = await throughput(mode, args)
+		phases = await phase_costs(mode, args)
+		allocated = await allocations(mode, args)
+		print(f"{mode:8} {ticks_per_second:10.0f} {ticks_per_second / 60:10.0f} {finished:6} {digest:08x} "
+			+ " ".join(f"{phases[phase] * 1e6:7.2f}us" for phase in PHASES)
+			+ f" {allocated / 1024:7.2f}KiB")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--games", type=int, default=1000)
+	parser.add_argument("--seconds", type=int, default=60)
+	parser.add_argument("--mode", choices=["all", *MODES], default="all")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--phase-games", type=int, default=200, help="games in the instrumented per phase run")
+	parser.add_argument("--alloc-ticks", type=int, default=600)
+	args = parser.parse_args()
+	logging.disable(logging.CRITICAL)
+	asyncio.run(run(args))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+"""Encode/decode cost and size of game frames, JSON text against the binary protocol.
+
+Run from the backend directory:
+
+	python -m Game.benchmarks.wire [--seconds 60]
+
+Frames come from a classic game driven by the bot for the given number of
+simulated seconds, both as full frames and as the deltas sent to the group.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from ..normal_game_logic import ClassicGameInstance
+from ..bot import Bot
+from ..frame_codec import JsonFrameCodec, BinaryFrameCodec, wire_position
+from ..frame_delta import DeltaEncoder
+
+async def noop(*args):
+	pass
+
+def key_state(keys):
+	states = []
+	if keys["ArrowUp"] or keys["W"]:
+		states.append("UP")
+	if keys["ArrowDown"] or keys["S"]:
+		states.append("DOWN")
+	return states
+
+def frame_data(game):
+	events = [{"type": event["type"], "side": event.get("side")} for event in game.pending_events if event["type"] == "score"]
+	return {
+		"positions": {
+			"player_left": wire_position(game.player_left.position),
+			"player_right": wire_position(game.player_right.position),
+			"ball": wire_position(game.ball.position),
+		},
+		"keys": {
+			"player_left": key_state(game.player_left.keys),
+			"player_right": key_state(game.player_right.keys),
+		},
+		"scores": {"left": game.player_left.score, "right": game.player_right.score},
+		"ball_color": "#447AFF" if game.ball.lastHitter == "LEFT" else "#00BDD1",
+		"events": events,
+	}
+
+def record_frames(seconds):
+	game = ClassicGameInstance(noop, noop, False, False)
+	bot = Bot(5, game, None)
+	game.start()
+	step = game.clock.step
+	frames = []
+	for tick in range(int(seconds / step)):
+		bot.tick(tick * step)
+		game.step(step)
+		frames.append(frame_data(game))
+		game.pending_events.clear()
+		if not game.is_running:
+			game.start()
+	return frames
+
+def measure(codec, frames):
+	started = time.perf_counter()
+	payloads = [codec.encode("game_update", frame) for frame in frames]
+	encoded = time.perf_counter()
+	for payload in payloads:
+		codec.decode(payload)
+	decoded = time.perf_counter()
+	size = sum(len(payload.encode() if isinstance(payload, str) else payload) for payload in payloads)
+	count = len(frames)
+	return size / count, (encoded - started) / count, (decoded - encoded) / count
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--seconds", type=int, default=60)
+	parser.add_argument("--keyframe-interval", type=int, default=120)
+	parser.add_argument("--seed", type=int, default=42)
+	args = parser.parse_args()
+	logging.disable(logging.CRITICAL)
+	random.seed(args.seed)
+
+	full = record_frames(args.seconds)
+	delta = DeltaEncoder(args.keyframe_interval)
+	deltas = [frame for frame in (delta.encode(data) for data in full) if frame]
+
+	# the frame as sent before: full state, default json.dumps separators
+	legacy = [{"type": "game_update", "data": dict(frame, trajectory=[])} for frame in full]
+	started = time.perf_counter()
+	legacy_size = sum(len(json.dumps(message)) for message in legacy) / len(legacy)
+	legacy_encode = (time.perf_counter() - started) / len(legacy)
+
+	print(f"{len(full)} frames, {len(deltas)} deltas sent")
+	print(f"{'':16}{'bytes/frame':>12}{'encode us':>12}{'decode us':>12}")
+	print(f"{'json (legacy)':16}{legacy_size:12.1f}{legacy_encode*1e6:12.2f}{'':>12}")
+	for name, codec in (("json", JsonFrameCodec()), ("binary", BinaryFrameCodec())):
+		for label, frames in (("full", full), ("delta", deltas)):
+			size, encode, decode = measure(codec, frames)
+			print(f"{name + ' ' + label:16}{size:12.1f}{encode*1e6:12.2f}{decode*1e6:12.2f}")
+
+if __name__ == "__main__":
+	main()
@@ -3,7 +3,7 @@ import time
 import random
 import math
 import logging
-from .normal_game_logic import Vector2D
+from .game_helper_class import TrajectoryPredictor
 
 class BotAvatar:
  def __init__(self, url):
@@ -26,7 +26,7 @@ class BotUser:
 		self.avatar_42 = None
 
 class Bot:
-	def __init__(self, difficulty, game, localUser):
+	def __init__(self, difficulty, game, localUser, side="RIGHT"):
 		if not localUser:
 			match difficulty:
 				case 1:
@@ -41,16 +41,18 @@ class Bot:
 		self.state = "Ready"
 		if not localUser:
 			self.game = game
+			# the bot plays the right paddle in games, benchmarks also put one on the left
+			self.player = game.player_right if side == "RIGHT" else game.player_left
+			self.facing = 1 if side == "RIGHT" else -1
 			self.difficulty = difficulty
 			self.is_running = False
 			self.ready = False
-			self.loop_task = None
-			self.last_update_time = time.time()
-			self.last_vision_update = time.time()
+			self.last_vision_update = time.monotonic()
 			self.vision_update_rate = 1.0 / self.difficulty  # Update vision once per second
 			self.ball_position = None
 			self.ball_velocity = None
 			self.ball_radius = None
+			self.trajectory = None
 			self.paddle_position = None
 			self.paddle_height = None
 			self.target_y = None  # Store the target position
@@ -63,14 +65,14 @@ class Bot:
 		if not self.paddle_position:
 			return None
 
-		# Only calculate if ball is moving towards the bot (right side)
-		if self.ball_velocity.x <= 0:
+		# Only calculate if ball is moving towards the bot's side
+		if self.ball_velocity.x * self.facing <= 0:
 			return self.paddle_position.y  # Return current paddle position if ball moving away
 
-		# Simple linear interpolation to predict Y position
-		distance_to_paddle = self.paddle_position.x - self.ball_position.x
-		time_to_reach = distance_to_paddle / self.ball_velocity.x
-		predicted_y = self.ball_position.y + (self.ball_velocity.y * time_to_reach)
+		# Follow the predicted path, wall bounces included, up to the paddle
+		predicted_y = self.trajectory.y_at(self.paddle_position.x)
+		if predicted_y is None:
+			return self.paddle_position.y
 
 		# Bound the prediction within the court limits
 		court_top = self.game.bounds.top.y
@@ -90,21 +92,21 @@ class Bot:
 		if abs(distance) > dead_zone:
 			if hasattr(self.game, 'event'):
 				if distance > 0:
-					self.game.player_right.keys["ArrowUp"] = self.game.event.name != 'Inverted Controls'
-					self.game.player_right.keys["ArrowDown"] = self.game.event.name == 'Inverted Controls'
+					self.player.keys["ArrowUp"] = self.game.event.name != 'Inverted Controls'
+					self.player.keys["ArrowDown"] = self.game.event.name == 'Inverted Controls'
 				else:
-					self.game.player_right.keys["ArrowUp"] = self.game.event.name == 'Inverted Controls'
-					self.game.player_right.keys["ArrowDown"] = self.game.event.name != 'Inverted Controls'
+					self.player.keys["ArrowUp"] = self.game.event.name == 'Inverted Controls'
+					self.player.keys["ArrowDown"] = self.game.event.name != 'Inverted Controls'
 			else:
 				if distance > 0:
-					self.game.player_right.keys["ArrowUp"] = True
-					self.game.player_right.keys["ArrowDown"] = False
+					self.player.keys["ArrowUp"] = True
+					self.player.keys["ArrowDown"] = False
 				else:
-					self.game.player_right.keys["ArrowUp"] = False
-					self.game.player_right.keys["ArrowDown"] = True
+					self.player.keys["ArrowUp"] = False
+					self.player.keys["ArrowDown"] = True
 		else:
-			self.game.player_right.keys["ArrowUp"] = False
-			self.game.player_right.keys["ArrowDown"] = False
+			self.player.keys["ArrowUp"] = False
+			self.player.keys["ArrowDown"] = False
 
 	def calculate_safe_position(self):
 		# Move the paddle to the opposite side of the ball
@@ -119,19 +121,17 @@ class Bot:
 
 	def update_vision(self):
 		#self.logger.info("Bot Updated Vision")
-		self.ball_position = Vector2D(
-		self.game.ball.position.x,
-		self.game.ball.position.y,
-		self.game.ball.position.z
-	)
-		self.ball_velocity = Vector2D(
-		self.game.ball.velocity.x,
-		self.game.ball.velocity.y,
-		self.game.ball.velocity.z
-	)
+		if self.ball_position is None:
+			self.ball_position = self.game.ball.position.copy()
+			self.ball_velocity = self.game.ball.velocity.copy()
+			self.trajectory = TrajectoryPredictor(self.ball_position, self.ball_velocity, self.game.ball.radius, self.game.bounds)
+		else:
+			self.ball_position.copy_from(self.game.ball.position)
+			self.ball_velocity.copy_from(self.game.ball.velocity)
+			self.trajectory.invalidate()
 		self.ball_radius = self.game.ball.radius
-		self.paddle_position = self.game.player_right.position
-		self.paddle_height = self.game.player_right.paddle_height
+		self.paddle_position = self.player.position
+		self.paddle_height = self.player.paddle_height
 
 	def update_movement(self):
 		if hasattr(self.game, 'event') and self.game.event.name == 'Killer Ball':
@@ -144,22 +144,19 @@ class Bot:
 
 	def start_bot(self):
 		self.is_running = True
-		self.loop_task = asyncio.create_task(self.update_view())
 		self.logger.info("Bot Started")
 
-	async def update_view(self):
-		try:
-			while self.is_running:
-				current_time = time.time()
-
-				if current_time - self.last_vision_update >= self.vision_update_rate:
-					self.update_vision()
-					self.last_vision_update = current_time
+	def stop_bot(self):
+		self.is_running = False
 
-				self.update_movement()
-				await asyncio.sleep(1/60)
+	def tick(self, now):
+		if not self.is_running:
+			return
+		try:
+			if now - self.last_vision_update >= self.vision_update_rate:
+				self.update_vision()
+				self.last_vision_update = now
 
-		except asyncio.CancelledError:
-			self.logger.error(f"Bot stopped")
+			self.update_movement()
 		except Exception as e:
-			self.logger.error(f"Error in bot loop: {e}")
+			self.logger.error(f"Error in bot tick: {e}")
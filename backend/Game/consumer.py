@@ -9,12 +9,14 @@ import json
 import logging
 from urllib.parse import parse_qs
 from api.utils import jwt_to_user
-from api.db_utils import get_user_preference
 from channels.layers import get_channel_layer
 from datetime import datetime
 from time import sleep
-from api.db_utils import user_update_game, delete_game_history, get_user_statistic, get_user_by_name
+from api.db_utils import user_update_game, delete_game_history, get_user_by_name
 from .game_manager import GameManager
+from .frame_codec import decode_input
+from .outbox import FrameOutbox
+from .player_profile import profile_group
 
 active_connections = {}
 game_manager = GameManager.get_instance()
@@ -29,10 +31,14 @@ class GameConsumer(AsyncWebsocketConsumer):
 		self.spectator = False
 		self.logger = logging.getLogger('game')
 		self.logger.info(f"Websocket connection made with channel name {self.channel_name}")
+		# the first connection of this worker drains what a previous one left queued
+		game_manager.results.start()
 		query_string = self.scope["query_string"].decode()
 		query_params = parse_qs(query_string)
 		watchId = query_params.get("watchId", [None])[0]
 		watch = query_params.get("watch", [None])[0]
+		self.frame_protocol = query_params.get("protocol", ["json"])[0]
+		self.outbox = None
 
 		user = await jwt_to_user(self.scope['headers'])
 		self.user = user
@@ -107,7 +113,7 @@ class GameConsumer(AsyncWebsocketConsumer):
 			await self.accept()
 			self.logger.info("User accepted")
 
-			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
+			await self.join_game_group()
 
 			# game created, send message to inviter
 			inviter_group = f"user_{sender}"
@@ -135,12 +141,8 @@ class GameConsumer(AsyncWebsocketConsumer):
 					"message": "Game not found."
 				}))
 				return
-			self.logger.info(f"Spectator connected to game {game_id}")
-			self.spectator = True
 			await self.accept()
-			active_connections[self.user.id] = self
-			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
-			await self.send_initial_game_state(self.game)
+			await self.watch_game()
 
 		elif watchId:
 			game_id = int(watchId)
@@ -153,12 +155,8 @@ class GameConsumer(AsyncWebsocketConsumer):
 					"message": "Game not found."
 				}))
 				return
-			self.logger.info(f"Spectator connected to game {game_id}")
-			self.spectator = True
 			await self.accept()
-			active_connections[self.user.id] = self
-			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
-			await self.send_initial_game_state(self.game)
+			await self.watch_game()
 
 		elif recipient: # invitation: WS msg from A, A invite B, recipient is B
 			game_db = await game_manager.get_invite_game(await self.get_user(recipient), user)
@@ -169,11 +167,12 @@ class GameConsumer(AsyncWebsocketConsumer):
 			await self.accept()
 			active_connections[self.user.id] = self
 
-			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
+			await self.join_game_group()
 
 			if (self.game.is_full()):
 				self.logger.info(f"Game is ready to start,game is full {self.game}")
 				await game_manager.set_game_state(await game_manager.get_game_by_id(self.game.game_id), 'playing')
+				await self.game.load_profiles()
 				await self.send_initial_game_state(self.game)
 			return
 		else: # quick match or bot
@@ -205,27 +204,73 @@ class GameConsumer(AsyncWebsocketConsumer):
 			self.logger.info("User accepted")
 			await self.accept()
 			active_connections[self.user.id] = self
-			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
+			await self.join_game_group()
 
 			if (self.game.is_full()):
 				self.logger.info(f"Game is ready to start,game is full {self.game}")
 				await game_manager.set_game_state(await game_manager.get_game_by_id(self.game.game_id), 'playing')
+				await self.game.load_profiles()
 				await self.send_initial_game_state(self.game)
 
 
 	
-	async def receive(self, text_data):
+	async def join_game_group(self):
+		codec = self.game.use_frame_codec(self.frame_protocol)
+		self.frame_protocol = codec.name
+		self.outbox = FrameOutbox(self.channel_name, self.send_payload, codec)
+		if not self.spectator:
+			await self.channel_layer.group_add(str(self.game.game_id), self.channel_name)
+			await self.channel_layer.group_add(profile_group(self.user.id), self.channel_name)
+		await self.game.join_frames(self)
+
+	async def watch_game(self):
+		if not self.game.spectator_slots():
+			self.logger.info(f"Spectator refused, game {self.game.game_id} is full")
+			self.game = None
+			await self.send(text_data=json.dumps({
+				"type": "handle_error",
+				"message": "Too many spectators for this game"
+			}))
+			await self.close()
+			return
+		self.logger.info(f"Spectator connected to game {self.game.game_id}")
+		self.spectator = True
+		active_connections[self.user.id] = self
+		await self.join_game_group()
+		await self.send_spectator_snapshot(self.game)
+
+	async def receive(self, text_data=None, bytes_data=None):
+		if self.spectator:
+			# spectators only confirm their init or report a lost frame, both get them a fresh keyframe
+			try:
+				data = json.loads(text_data) if text_data else None
+			except json.JSONDecodeError:
+				return
+			if isinstance(data, dict) and data.get("type") in ("init_confirm", "resync"):
+				self.game.request_spectator_keyframe()
+			return
+		if bytes_data is not None:
+			try:
+				input_type, key, seq, client_time = decode_input(bytes_data)
+				self.game.handle_key_event(self.channel_name, key, input_type == "keydown", seq, client_time)
+			except Exception as e:
+				self.logger.info(f"Error handling input packet: {e}")
+			return
 		try:
 			data = json.loads(text_data)
 			if data["type"] in ["keydown", "keyup"]:
 				self.game.handle_key_event(
 					self.channel_name,
 					data["key"],
-					data["type"] == "keydown"
+					data["type"] == "keydown",
+					data.get("seq"),
+					data.get("t")
 				)
 			elif data["type"] == "init_confirm":
 				logging.getLogger('game').info("init confirmed")
 				await self.game.set_player_init(self.channel_name)
+			elif data["type"] == "resync":
+				self.game.request_keyframe()
 
 		except json.JSONDecodeError:
 			print("Error decoding JSON message")
@@ -240,9 +285,14 @@ class GameConsumer(AsyncWebsocketConsumer):
 	async def disconnect(self, close_code):
 		if self.user.id in active_connections:
 			del active_connections[self.user.id]
+		if self.game:
+			await self.game.leave_frames(self)
+			if not self.spectator:
+				await self.channel_layer.group_discard(profile_group(self.user.id), self.channel_name)
+		if self.outbox:
+			self.outbox.close()
 		if (self.spectator):
 			self.logger.info(f"Spectator disconnected")
-			await self.channel_layer.group_discard(str(self.game.game_id), self.channel_name)
 			return
 		if (self.game and self.game.game_id):
 			await user_update_game(self.user, False, game_id=-1)
@@ -255,122 +305,89 @@ class GameConsumer(AsyncWebsocketConsumer):
 				await delete_game_history(self.game.game_id)
 		self.logger.info(f"WebSocket disconnected with code: {close_code}")
 
+	async def player_profile_changed(self, event):
+		# sent by the settings endpoints, which run in the HTTP process without the game
+		if not self.game or self.spectator:
+			return
+		user = await get_user_by_name(self.user.username)
+		if user:
+			await self.game.refresh_profile(user)
+
 	async def chat_message(self, event):
 		await self.send(text_data=json.dumps({"message":event["text"]}))
 
-	async def game_update(self, event):
+	async def game_frame(self, event):
 		try:
-			#self.logger.info("Sending game updates")
-			await self.send(text_data=json.dumps({
-				"type": "game_update",
-				"data":event["data"]
-			}))
+			self.outbox.push(event["data"], event["payloads"][self.frame_protocol])
 		except Exception as e:
-			self.logger.info(f"Crashed in update {e}")
-
-	async def get_color(self, user):
-		color_map = {
-			0: '#447AFF',
-			1: "#00BDD1",
-			2: "#00AD06",
-			3: "#E67E00",
-			4: "#E6008F",
-			5: "#6900CC",
-			6: "#E71200",
-			7: "#0EC384",
-			8: "#E6E3E1",
-			9: "#D5DA2B"
-		}
-		try:
-			user_preference = await get_user_preference(user)
-			color = color_map.get(user_preference.color)
-			if (color is None):
-				return "#00BDD1" #Cyan
-			else:
-				return color
-		except:
-			return "#00BDD1" #Cyan
-
-	async def send_initial_game_state(self, instance):
-		if (instance.player_right.user.avatar_42 and instance.player_right.user.is_42_avatar_used):
-			self.logger.info("Avatar 42 found")
-			avatarRight = instance.player_right.user.avatar_42
-		elif (instance.player_right.user.avatar):
-			avatarRight = instance.player_right.user.avatar.url
-			self.logger.info("Avatar found")
-		else:
-			avatarRight = '/imgs/default_avatar.png'
-
-		if (instance.player_left.user.avatar_42 and instance.player_left.user.is_42_avatar_used):
-			self.logger.info("Avatar 42 found")
-			avatarLeft = instance.player_left.user.avatar_42
-		elif (instance.player_left.user.avatar):
-			avatarLeft = instance.player_left.user.avatar.url
-			self.logger.info("Avatar found")
-		else:
-			avatarLeft = '/imgs/default_avatar.png'
+			self.logger.info(f"Crashed in frame {e}")
 
-		if (instance.player_left.user.display_name):
-			usernameLeft = instance.player_left.user.display_name
+	async def send_payload(self, payload):
+		if isinstance(payload, bytes):
+			await self.send(bytes_data=payload)
 		else:
-			usernameLeft = instance.player_left.user.username
-
-		if (instance.player_right.user.display_name):
-			usernameRight = instance.player_right.user.display_name
-		else:
-			usernameRight = instance.player_right.user.username
-
-		player_left_statistic = await get_user_statistic(instance.player_left.user)
-		player_right_statistic = await get_user_statistic(instance.player_right.user) if instance.bot == 0 else None
-
-		if (instance.game_mode == "classic"):
-			player_left_elo = player_left_statistic.classic_elo
-			player_right_elo = player_right_statistic.classic_elo if player_right_statistic else instance.player_right.user.elo
-		elif (instance.game_mode == "rumble"):
-			player_left_elo = player_left_statistic.rumble_elo
-			player_right_elo = player_right_statistic.rumble_elo if player_right_statistic else instance.player_right.user.elo
-
-		init_response = {
-			"type": "init",
-			"data": {
-				"positions": {
-						"player_left": vars(instance.game.player_left.position),
-						"player_right": vars(instance.game.player_right.position),
-						"ball": vars(instance.game.ball.position),
-						"borders": {
-							"top": vars(instance.game.bounds.top),
-							"bottom": vars(instance.game.bounds.bottom),
-							"left": vars(instance.game.bounds.left),
-							"right": vars(instance.game.bounds.right),
-						}
-					},
-					"player": {
-						"left": {
-							"name": usernameLeft,
-							"elo": player_left_elo,
-							"score": instance.game.player_left.score,
-							"avatar" : avatarLeft,
-							"color": await self.get_color(instance.player_left.user)
-						},
-						"right": {
-							"name": usernameRight,
-							"elo": player_right_elo,
-							"score": instance.game.player_right.score,
-							"avatar" : avatarRight,
-							"color" : await self.get_color(instance.player_right.user)
-						}
-					}
+			await self.send(text_data=payload)
+
+	async def initial_game_state(self, instance):
+		if instance.profiles is None:
+			await instance.load_profiles()
+		left = instance.profiles["LEFT"]
+		right = instance.profiles["RIGHT"]
+
+		return {
+			"positions": {
+				"player_left": instance.game.player_left.position.to_dict(),
+				"player_right": instance.game.player_right.position.to_dict(),
+				"ball": instance.game.ball.position.to_dict(),
+				"borders": {
+					"top": instance.game.bounds.top.to_dict(),
+					"bottom": instance.game.bounds.bottom.to_dict(),
+					"left": instance.game.bounds.left.to_dict(),
+					"right": instance.game.bounds.right.to_dict(),
+				}
+			},
+			"player": {
+				"left": {
+					"name": left.display_name,
+					"elo": left.elo,
+					"score": instance.game.player_left.score,
+					"avatar" : left.avatar,
+					"color": left.color
+				},
+				"right": {
+					"name": right.display_name,
+					"elo": right.elo,
+					"score": instance.game.player_right.score,
+					"avatar" : right.avatar,
+					"color" : right.color
 				}
 			}
+		}
 
-			# Send the response to the group (or WebSocket connection)
+	async def send_initial_game_state(self, instance):
+		init_response = {
+			"type": "init",
+			"data": await self.initial_game_state(instance)
+		}
+		instance.request_keyframe()
 		await self.channel_layer.group_send(str(instance.game_id), init_response)
 
+	async def send_spectator_snapshot(self, instance):
+		"""The init only goes to the joining spectator, the players are not re-initialized."""
+		data = await self.initial_game_state(instance)
+		data["frame_interval"] = instance.SPECTATOR_FRAME_INTERVAL
+		instance.request_spectator_keyframe()
+		await self.init({"data": data})
+
 	async def init(self, event):
 		print(event, flush=True)
+		data = event["data"]
+		if self.game and not self.spectator:
+			# tells the client which acks in the frames are its own
+			data = dict(data, side=self.game.side_of(self.channel_name))
 		await self.send(text_data=json.dumps({
 			"message_type": "init",
-			"data": event["data"]}))
+			"data": data}))
 
 	@database_sync_to_async
 	def get_user(self, username):
@@ -0,0 +1,168 @@
+import json
+import struct
+
+POSITION_DECIMALS = 3
+
+def wire_position(vector):
+	"""Position rounded to what the client can render, so resting axes compare equal and encode short."""
+	return {
+		"x": round(vector.x, POSITION_DECIMALS),
+		"y": round(vector.y, POSITION_DECIMALS),
+		"z": round(vector.z, POSITION_DECIMALS),
+	}
+
+class JsonFrameCodec:
+	"""Encodes a game frame into the text message the client reads in Game.js."""
+	name = "json"
+	binary = False
+
+	def encode(self, message_type, data):
+		return json.dumps({"type": message_type, "data": data}, separators=(',', ':'))
+
+	def decode(self, payload):
+		return json.loads(payload)
+
+# Binary frame layout, little endian:
+#   u8 message type, u8 flags, u16 field mask, then the fields present in mask order:
+#   one f32 per coordinate, u8 key bits, u8 u8 scores, 3 bytes RGB ball color,
+#   u8 count + count * 3 f32 trajectory, u16 u16 last input seq acked per side,
+#   u16 frame number + u16 base frame of a delta (unused in keyframes),
+#   and the events as a UTF-8 JSON tail.
+MESSAGE_TYPES = {"game_update": 1}
+MESSAGE_NAMES = {value: name for name, value in MESSAGE_TYPES.items()}
+FLAG_KEYFRAME = 0x01
+
+ENTITIES = ("player_left", "player_right", "ball")
+AXES = ("x", "y", "z")
+MASK_KEYS = 1 << 9
+MASK_SCORES = 1 << 10
+MASK_BALL_COLOR = 1 << 11
+MASK_TRAJECTORY = 1 << 12
+MASK_EVENTS = 1 << 13
+MASK_ACKS = 1 << 14
+MASK_FRAME = 1 << 15
+
+KEY_BITS = (("player_left", "UP", 0x01), ("player_left", "DOWN", 0x02), ("player_right", "UP", 0x04), ("player_right", "DOWN", 0x08))
+
+HEADER = struct.Struct('<BBH')
+COORDINATE = struct.Struct('<f')
+SCORES = struct.Struct('<BB')
+POINT = struct.Struct('<fff')
+ACKS = struct.Struct('<HH')
+FRAME_NUMBERS = struct.Struct('<HH')
+
+class BinaryFrameCodec:
+	"""Fixed layout struct frames for positions, key state, scores and ball color.
+
+	Decoding gives back the same dict as the JSON frame, positions rounded to
+	float32, so the client merges both the same way.
+	"""
+	name = "binary"
+	binary = True
+
+	def encode(self, message_type, data):
+		mask = 0
+		body = bytearray()
+		positions = data.get("positions", {})
+		for index, (entity, axis) in enumerate((entity, axis) for entity in ENTITIES for axis in AXES):
+			value = positions.get(entity, {}).get(axis)
+			if value is not None:
+				mask |= 1 << index
+				body += COORDINATE.pack(value)
+		if "keys" in data:
+			mask |= MASK_KEYS
+			keys = data["keys"]
+			bits = 0
+			for side, key, bit in KEY_BITS:
+				if key in keys.get(side, ()):
+					bits |= bit
+			body.append(bits)
+		if "scores" in data:
+			mask |= MASK_SCORES
+			body += SCORES.pack(data["scores"]["left"], data["scores"]["right"])
+		if "ball_color" in data:
+			mask |= MASK_BALL_COLOR
+			body += bytes.fromhex(data["ball_color"].lstrip('#'))
+		if "trajectory" in data:
+			mask |= MASK_TRAJECTORY
+			points = data["trajectory"][:255]
+			body.append(len(points))
+			for point in points:
+				body += POINT.pack(point["x"], point["y"], point["z"])
+		if "acks" in data:
+			mask |= MASK_ACKS
+			body += ACKS.pack(data["acks"]["player_left"], data["acks"]["player_right"])
+		if "frame" in data:
+			mask |= MASK_FRAME
+			body += FRAME_NUMBERS.pack(data["frame"], data.get("base", 0))
+		if data.get("events"):
+			mask |= MASK_EVENTS
+			body += json.dumps(data["events"], separators=(',', ':')).encode()
+		flags = FLAG_KEYFRAME if data.get("keyframe") else 0
+		return HEADER.pack(MESSAGE_TYPES[message_type], flags, mask) + body
+
+	def decode(self, payload):
+		message_type, flags, mask = HEADER.unpack_from(payload)
+		offset = HEADER.size
+		data = {}
+		if flags & FLAG_KEYFRAME:
+			data["keyframe"] = True
+		for index, (entity, axis) in enumerate((entity, axis) for entity in ENTITIES for axis in AXES):
+			if mask & (1 << index):
+				value, = COORDINATE.unpack_from(payload, offset)
+				offset += COORDINATE.size
+				data.setdefault("positions", {}).setdefault(entity, {})[axis] = value
+		if mask & MASK_KEYS:
+			bits = payload[offset]
+			offset += 1
+			data["keys"] = {"player_left": [], "player_right": []}
+			for side, key, bit in KEY_BITS:
+				if bits & bit:
+					data["keys"][side].append(key)
+		if mask & MASK_SCORES:
+			left, right = SCORES.unpack_from(payload, offset)
+			offset += SCORES.size
+			data["scores"] = {"left": left, "right": right}
+		if mask & MASK_BALL_COLOR:
+			data["ball_color"] = '#' + payload[offset:offset + 3].hex().upper()
+			offset += 3
+		if mask & MASK_TRAJECTORY:
+			count = payload[offset]
+			offset += 1
+			data["trajectory"] = []
+			for _ in range(count):
+				x, y, z = POINT.unpack_from(payload, offset)
+				offset += POINT.size
+				data["trajectory"].append({"x": x, "y": y, "z": z})
+		if mask & MASK_ACKS:
+			left, right = ACKS.unpack_from(payload, offset)
+			offset += ACKS.size
+			data["acks"] = {"player_left": left, "player_right": right}
+		if mask & MASK_FRAME:
+			frame, base = FRAME_NUMBERS.unpack_from(payload, offset)
+			offset += FRAME_NUMBERS.size
+			data["frame"] = frame
+			if not flags & FLAG_KEYFRAME:
+				data["base"] = base
+		if mask & MASK_EVENTS:
+			data["events"] = json.loads(payload[offset:].decode())
+		return {"type": MESSAGE_NAMES[message_type], "data": data}
+
+FRAME_CODECS = {
+	JsonFrameCodec.name: JsonFrameCodec,
+	BinaryFrameCodec.name: BinaryFrameCodec,
+}
+
+# Binary input packet: u8 type, u8 key, u16 sequence number, u32 client time in ms.
+INPUT_PACKET = struct.Struct('<BBHI')
+INPUT_TYPES = {1: "keydown", 2: "keyup"}
+INPUT_KEYS = ("ArrowUp", "ArrowDown", "W", "S")
+
+def decode_input(payload):
+	"""Returns (type, key, seq, client_time) of a binary input packet."""
+	input_type, key, seq, client_time = INPUT_PACKET.unpack(payload)
+	return INPUT_TYPES[input_type], INPUT_KEYS[key], seq, client_time
+
+def encode_input(input_type, key, seq, client_time):
+	input_types = {name: value for value, name in INPUT_TYPES.items()}
+	return INPUT_PACKET.pack(input_types[input_type], INPUT_KEYS.index(key), seq & 0xFFFF, client_time & 0xFFFFFFFF)
@@ -0,0 +1,75 @@
+STATE_FIELDS = ("positions", "keys", "scores", "ball_color", "trajectory", "acks")
+# sent whole whenever any part changes, the binary layout packs them as one unit
+ATOMIC_FIELDS = ("keys", "scores", "acks")
+
+class DeltaEncoder:
+	"""Reduces game frames to the state fields that changed since the previous frame.
+
+	Frames are numbered (u16, wrapping) and a delta names the frame it was
+	computed against in base. The channel layer drops group messages to a
+	full channel without telling anyone, so a member that sees a base other
+	than the last frame it got asks for a keyframe (request_keyframe()),
+	which carries the full state. Keyframes also go out every
+	keyframe_interval frames and when someone joins with no baseline yet.
+	Events are never diffed.
+	"""
+	def __init__(self, keyframe_interval):
+		self.keyframe_interval = keyframe_interval
+		self.state = {}
+		self.frames_since_keyframe = 0
+		self.keyframe_requested = True
+		self.frame_number = 0
+
+	def request_keyframe(self):
+		self.keyframe_requested = True
+
+	@classmethod
+	def diff(cls, value, previous):
+		"""Changed part of value, nested dicts are diffed key by key. None when nothing changed."""
+		if not isinstance(value, dict) or not isinstance(previous, dict):
+			return None if value == previous else value
+		changed = {}
+		for key, item in value.items():
+			if key not in previous:
+				changed[key] = item
+				continue
+			item_changed = cls.diff(item, previous[key])
+			if item_changed is not None:
+				changed[key] = item_changed
+		return changed or None
+
+	def encode(self, data):
+		keyframe = self.keyframe_requested or self.frames_since_keyframe >= self.keyframe_interval
+		frame = {}
+		for field in STATE_FIELDS:
+			if field not in data:
+				continue
+			value = data[field]
+			previous = self.state.get(field)
+			self.state[field] = value
+			if keyframe or previous is None:
+				frame[field] = value
+			elif field in ATOMIC_FIELDS:
+				if value != previous:
+					frame[field] = value
+			else:
+				changed = self.diff(value, previous)
+				if changed is not None:
+					frame[field] = changed
+		if data.get("events"):
+			frame["events"] = data["events"]
+		if not frame:
+			# nothing changed, no frame goes out and the members' baseline is still the last one
+			return frame
+
+		base = self.frame_number
+		self.frame_number = (self.frame_number + 1) & 0xFFFF
+		frame["frame"] = self.frame_number
+		if keyframe:
+			frame["keyframe"] = True
+			self.keyframe_requested = False
+			self.frames_since_keyframe = 0
+		else:
+			frame["base"] = base
+			self.frames_since_keyframe += 1
+		return frame
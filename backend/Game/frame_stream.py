@@ -0,0 +1,57 @@
+from .frame_delta import DeltaEncoder
+
+class FrameStream:
+	"""One audience of a game's frames with its own delta baseline and members.
+
+	A stream with a decimation of n forwards every n-th frame, the frames in
+	between are folded into it by the delta encoder, which diffs against what
+	this stream last sent. Frames carrying events go out right away with the
+	state of that moment so nothing is announced late or lost at game end.
+	"""
+	def __init__(self, group, keyframe_interval, decimation=1):
+		self.group = group
+		self.decimation = decimation
+		self.delta = DeltaEncoder(keyframe_interval)
+		self.local_members = {}
+		self.layer_members = set()
+		self.frames_skipped = 0
+
+	def __len__(self):
+		return len(self.local_members) + len(self.layer_members)
+
+	def request_keyframe(self):
+		self.delta.request_keyframe()
+
+	def next_frame(self, data):
+		"""Delta frame to send for data, None when this stream skips it."""
+		if not self:
+			return None
+		self.frames_skipped += 1
+		if self.frames_skipped < self.decimation and not data.get("events"):
+			return None
+		self.frames_skipped = 0
+		return self.delta.encode(data) or None
+
+	async def deliver(self, message, channel_layer, logger):
+		for consumer in list(self.local_members.values()):
+			try:
+				await consumer.game_frame(message)
+			except Exception as e:
+				logger.info(f"Error delivering frame to {consumer.channel_name}: {e}")
+		if self.layer_members:
+			await channel_layer.group_send(self.group, message)
+
+	async def join(self, consumer, channel_layer, local):
+		# the joining member holds no baseline to apply deltas to
+		self.request_keyframe()
+		if local:
+			self.local_members[consumer.channel_name] = consumer
+		else:
+			self.layer_members.add(consumer.channel_name)
+			await channel_layer.group_add(self.group, consumer.channel_name)
+
+	async def leave(self, consumer, channel_layer):
+		self.local_members.pop(consumer.channel_name, None)
+		if consumer.channel_name in self.layer_members:
+			self.layer_members.discard(consumer.channel_name)
+			await channel_layer.group_discard(self.group, consumer.channel_name)
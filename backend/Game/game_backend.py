@@ -4,13 +4,19 @@ import logging
 import json
 from .normal_game_logic import ClassicGameInstance, GameBounds
 from .rumble_game_logic import RumbleGameInstance, GameBounds
-from channels.db import database_sync_to_async
 from .bot import Bot
-from api.db_utils import finish_game_history, user_update_game, delete_game_history, get_user_preference, get_user_statistic, unlock_achievement, update_achievement_progression, update_game_history_player_right
+from .frame_codec import JsonFrameCodec, FRAME_CODECS, wire_position
+from .frame_stream import FrameStream
+from .input_buffer import valid_seq, client_timestamp
+from .player_profile import load_player_profile, NEUTRAL_COLOR
+from .results import GameResult
+from .achievements import AchievementTracker
+from api.db_utils import update_game_history_player_right
 from datetime import datetime
 import redis
 import math
 from channels.layers import get_channel_layer
+from django.conf import settings
 from copy import deepcopy
 
 class User:
@@ -20,14 +26,19 @@ class User:
 		self.state = state
 
 class GameBackend:
-	def __init__(self, room_id, bot, manager, ranked, mode, tournament, local):
+	KEYFRAME_INTERVAL = 120
+	# spectators get every third frame, 20 Hz, and interpolate in between
+	SPECTATOR_DECIMATION = 3
+	SPECTATOR_FRAME_INTERVAL = SPECTATOR_DECIMATION / ClassicGameInstance.BROADCAST_RATE
+
+	def __init__(self, room_id, bot, manager, ranked, mode, tournament, local, seed=None):
 		self.logger = logging.getLogger('game')
 		self.logger.info(f"Creating game in GameBackend with id {room_id}")
 		self.game_id = room_id
 		self.game_mode = mode
 		self.tournament = tournament
 		self.local = True if local else False
-		self.game = self.get_game_instance(self.game_mode)
+		self.game = self.get_game_instance(self.game_mode, seed)
 		self.is_ranked = ranked
 		self.channel_layer = None
 		self.manager = manager
@@ -40,11 +51,14 @@ class GameBackend:
 		self.player_left = None
 		self.player_right = None
 		self.elo_change = 0
-		self.remontada = None
-		self.bigRemontada = None
+		self.profiles = None
+		self.frame_codecs = {JsonFrameCodec.name: JsonFrameCodec()}
+		self.players_stream = FrameStream(f"{room_id}_frames", self.KEYFRAME_INTERVAL)
+		self.spectators_stream = FrameStream(f"{room_id}_spectators", self.KEYFRAME_INTERVAL // self.SPECTATOR_DECIMATION, self.SPECTATOR_DECIMATION)
 		self.elo_k_factor = 40
 
 
+		self.achievements = AchievementTracker(mode, (ranked or tournament) and not self.bot_game)
 		if (self.bot_game):
 			self.logger.info(f'Creating a game with a bot, difficulty : {bot}')
 		else:
@@ -58,29 +72,52 @@ class GameBackend:
 		from Chat.consumer import ChatConsumer
 		self.chat_consumer = ChatConsumer
 
-	def handle_key_event(self, websocket, key, is_down):
+	def handle_key_event(self, websocket, key, is_down, seq=None, client_time=None):
+		"""Queues the input for the next tick, the frames then ack seq for the sending side."""
+		if not valid_seq(seq):
+			self.logger.info(f"Dropped input with invalid sequence number {seq!r}")
+			return
+		# only feeds the jitter estimate, a malformed one is ignored rather than the key
+		client_time = client_timestamp(client_time)
 		if websocket == self.player_left.channel:
 			if (self.local):
-				self.logger.info(f"Received key input for player left : {key} is down {is_down}")
 				if key == "W" or key == "S":
-					self.game.player_left.keys[key] = is_down
-					self.logger.info(f"Key assigned to player left")
+					player = self.game.player_left
 				else:
-					self.game.player_right.keys[key] = is_down
-					self.logger.info(f"Key assigned to player right")
+					player = self.game.player_right
 			else:
-				self.game.player_left.keys[key] = is_down
+				player = self.game.player_left
+			self.game.inputs.push("player_left", player, key, is_down, seq, client_time)
 		elif websocket == self.player_right.channel:
-			self.game.player_right.keys[key] = is_down
+			self.game.inputs.push("player_right", self.game.player_right, key, is_down, seq, client_time)
+
+	def side_of(self, channel):
+		if self.player_left and self.player_left.channel == channel:
+			return "player_left"
+		if self.player_right and self.player_right.channel == channel:
+			return "player_right"
+		return None
+
+	def input_stats(self):
+		return self.game.inputs.snapshot()
 
-	def get_game_instance(self, mode):
+	def get_game_instance(self, mode, seed=None):
 		if (mode == "classic"):
-			return ClassicGameInstance(self.broadcast_state, self.on_game_end, self.check_classic_achievement, self.tournament, self.local)
+			return ClassicGameInstance(self.broadcast_state, self.handle_game_events, self.tournament, self.local, seed)
 		elif (mode == "rumble"):
-			return RumbleGameInstance(self.rumble_broadcast_state, self.rumble_revert_event_broadcast, self.on_game_end, self.check_rumble_achievement, self.tournament, self.local)
+			return RumbleGameInstance(self.rumble_broadcast_state, self.handle_game_events, self.tournament, self.local, seed)
 		else:
 			self.logger.error("Game mode not found")
 
+	async def handle_game_events(self, events):
+		for event in events:
+			if event["type"] == "score":
+				self.achievements.on_score(self.game)
+			elif event["type"] == "event_revert":
+				await self.rumble_revert_event_broadcast(event["event"])
+			elif event["type"] == "game_end":
+				await self.on_game_end()
+
 	def is_full(self):
 		return (self.player_left is not None and self.player_right is not None)
 
@@ -88,19 +125,23 @@ class GameBackend:
 		if self.is_full() and not self.game.is_running:
 			self.player_left.state = "Playing"
 			self.player_right.state = "Playing"
+			bot = None
 			if (self.bot > 0):
 				self.logger.info("started game with a bot")
 				if not self.local:
-					self.player_right.start_bot()
+					bot = self.player_right
+					bot.start_bot()
 			else:
 				await update_game_history_player_right(self.game_id, self.player_right.user)
 				self.logger.info("started game with a player")
 			self.game.start()
+			self.manager.scheduler.add(self.game_id, self.game, bot)
 		else:
 			self.logger.warning("start game caleld but game is not full")
 
 	def stop_game(self):
 		self.game.stop()
+		self.manager.scheduler.remove(self.game_id)
 
 	async def player_disc(self, user):
 		if (self.player_left and self.player_left.user.id == user.id and not self.game.ended):
@@ -144,6 +185,7 @@ class GameBackend:
 
 	async def set_player_init(self, channel):
 			self.logger.info('init called')
+			self.request_keyframe()
 			if (self.player_left.channel == channel):
 				self.logger.info('inisaddsat calasddasled')
 				self.logger.info(f"is bot game {self.bot > 0}")
@@ -171,50 +213,30 @@ class GameBackend:
 
 	async def on_game_end(self):
 		try:
+			if self.profiles is None:
+				await self.load_profiles()
+			winner = self.game.winner
 			if (self.is_ranked):
-				await self.update_elo(self.game.winner)
-				player_right_statistic = await get_user_statistic(self.player_right.user)
-				player_left_statistic = await get_user_statistic(self.player_left.user)
-				self.logger.info(f"player_left_statistic {player_left_statistic.classic_wins}")
-				self.logger.info(f"player_right_statistic {player_right_statistic.classic_wins}")
+				self.elo_change = self.compute_elo_change(winner)
 
-			if self.game.winner == "LEFT":
+			if winner == "LEFT":
 				self.game.winner = self.player_left.user
-				if (self.is_ranked and self.game_mode == "classic"):
-					await self.update_user_statistic_classic_wins(player_left_statistic)
-				elif (self.is_ranked and self.game_mode == "rumble"):
-					await self.update_user_statistic_rumble_wins(player_left_statistic)
-			elif self.game.winner == "RIGHT":
+			elif winner == "RIGHT":
 				self.game.winner = self.player_right.user
-				if (self.is_ranked and self.game_mode == "classic"):
-					await self.update_user_statistic_classic_wins(player_right_statistic)
-				elif (self.is_ranked and self.game_mode == "rumble"):
-					await self.update_user_statistic_rumble_wins(player_right_statistic)
-
-			if (self.is_ranked and self.game_mode == "classic"):
-				await self.update_user_statistic_classic_total_played(player_left_statistic)
-				await self.update_user_statistic_classic_total_played(player_right_statistic)
-			elif (self.is_ranked and self.game_mode == "rumble"):
-				await self.update_user_statistic_rumble_total_played(player_left_statistic)
-				await self.update_user_statistic_rumble_total_played(player_right_statistic)
-
-			if (self.bot > 0 ):
-				await delete_game_history(self.game_id)
-			else:
-				await finish_game_history(self.game_id, self.game.player_left.score, self.game.player_right.score, self.elo_change, self.game.winner)
+
+			# a single insert, the manager's result writer applies it to history, statistics and achievements
+			await self.manager.results.submit(await self.game_result(winner))
 
 			if self.game_mode == "classic":
 				await self.broadcast_state()
 			else:
 				await self.rumble_broadcast_state()
 
-			if self.player_left:
-				self.logger.info(f"Resetting left player: {self.player_left.user.username}")
-				await user_update_game(self.player_left.user, False, game_id=-1)
-
-			if self.player_right and self.bot == 0:
-				self.logger.info(f"Resetting right player: {self.player_right.user.username}")
-				await user_update_game(self.player_right.user, False, game_id=-1)
+			for player in (self.player_left, self.player_right if self.bot == 0 else None):
+				if player:
+					self.logger.info(f"Resetting player: {player.user.username}")
+					player.user.playing = False
+					player.user.current_game_id = -1
 
 			if self.tournament:
 				from .tournament import Tournament
@@ -223,24 +245,39 @@ class GameBackend:
 				await tournament.gameEnded(self.game_id, self.game.player_left.score, self.game.player_right.score, self.game.winner)
 			else:
 				self.manager.remove_game(self.game_id)
-				game_history_db = await self.manager.get_game_by_id(self.game_id)
-				await self.manager.set_game_state(game_history_db, 'finished', self.game.player_left.score, self.game.player_right.score)
 
 		except Exception as e:
 			self.logger.error(f"Error in on_game_end: {str(e)}")
 			import traceback
 			self.logger.error(traceback.format_exc())
 
-	async def update_elo(self, winner):
-		player_left_statistic = await get_user_statistic(self.player_left.user)
-		player_right_statistic = await get_user_statistic(self.player_right.user)
-
-		if (self.game_mode == "classic"):
-			elo_pleft = player_left_statistic.classic_elo
-			elo_pright = player_right_statistic.classic_elo
-		elif (self.game_mode == "rumble"):
-			elo_pleft = player_left_statistic.rumble_elo
-			elo_pright = player_right_statistic.rumble_elo
+	async def game_result(self, winner_side):
+		human_game = self.bot == 0
+		winner = None
+		if human_game and self.game.winner in (self.player_left.user, self.player_right.user):
+			winner = self.game.winner.id
+		achievements = await self.achievements.results(self.game, winner_side, self.profiles)
+		return GameResult(
+			game_id=self.game_id,
+			game_mode=self.game_mode,
+			ranked=bool(self.is_ranked) and human_game,
+			discard=not human_game,
+			player_left=self.player_left.user.id,
+			player_right=self.player_right.user.id if human_game else None,
+			score_left=self.game.player_left.score,
+			score_right=self.game.player_right.score,
+			winner=winner,
+			elo_change=self.elo_change,
+			seed=self.game.seed,
+			achievements_left=achievements["LEFT"],
+			achievements_right=achievements["RIGHT"] if human_game else [],
+			replay=self.game.recorder.to_bytes(),
+		)
+
+	def compute_elo_change(self, winner):
+		"""Elo the winner takes from the loser, from the ratings loaded with the profiles when the game filled up."""
+		elo_pleft = self.profiles["LEFT"].elo
+		elo_pright = self.profiles["RIGHT"].elo
 
 		expected_score_pleft = 1 / (1 + 10 ** ((elo_pright - elo_pleft) / 400))
 		expected_score_pright = 1 - expected_score_pleft
@@ -261,200 +298,111 @@ class GameBackend:
 		left_change = abs(new_elo_pleft - elo_pleft)
 		right_change = abs(new_elo_pright - elo_pright)
 
-		self.elo_change = math.ceil((left_change + right_change) / 2)
+		return math.ceil((left_change + right_change) / 2)
 
-		if (winner == "LEFT"):
-			new_elo_pleft = elo_pleft + self.elo_change
-			new_elo_pright = elo_pright - self.elo_change
+	async def load_profiles(self):
+		self.profiles = {
+			"LEFT": await load_player_profile(self.player_left.user, self.game_mode),
+			"RIGHT": await load_player_profile(self.player_right.user, self.game_mode),
+		}
+
+	async def refresh_profile(self, user):
+		"""Rebuilds the snapshot of a player whose settings changed during the game."""
+		if self.profiles is None:
+			return
+		for side, player in (("LEFT", self.player_left), ("RIGHT", self.player_right)):
+			if player and player.user.id == user.id:
+				self.profiles = {**self.profiles, side: await load_player_profile(user, self.game_mode)}
+
+	def side_color(self, side):
+		if self.profiles is None or side not in self.profiles:
+			return NEUTRAL_COLOR
+		return self.profiles[side].color
+
+	def game_end_event(self):
+		if self.game.winner is self.player_left.user:
+			side = "LEFT"
+		elif self.game.winner is self.player_right.user:
+			side = "RIGHT"
 		else:
-			new_elo_pleft = elo_pleft - self.elo_change
-			new_elo_pright = elo_pright + self.elo_change
-
-		if (self.game_mode == "classic"):
-			await self.update_user_statistic_classic_elo(player_left_statistic, new_elo_pleft)
-			await self.update_user_statistic_classic_elo(player_right_statistic, new_elo_pright)
-		elif (self.game_mode == "rumble"):
-			await self.update_user_statistic_rumble_elo(player_left_statistic, new_elo_pleft)
-			await self.update_user_statistic_rumble_elo(player_right_statistic, new_elo_pright)
-
-	async def get_color(self, user):
-		color_map = {
-			0: '#447AFF',
-			1: "#00BDD1",
-			2: "#00AD06",
-			3: "#E67E00",
-			4: "#E6008F",
-			5: "#6900CC",
-			6: "#E71200",
-			7: "#0EC384",
-			8: "#E6E3E1",
-			9: "#D5DA2B"
+			self.logger.info("Unknown winner")
+			side = None
+		left = self.profiles["LEFT"]
+		right = self.profiles["RIGHT"]
+		winner = self.profiles.get(side)
+		return {
+			"type": "game_end",
+			"winnerName": winner.display_name if winner else None,
+			"winner" : side,
+			"winnerUser" : self.game.winner.username,
+			"winnerAvatar": winner.avatar if winner else None,
+			"playerLeftUsername" : left.username,
+			"playerLeftName" : left.display_name,
+			"playerLeftAvatar" : left.avatar,
+			"scoreLeft": self.game.player_left.score,
+			"playerRightUsername" : right.username,
+			"playerRightName" : right.display_name,
+			"playerRightAvatar" : right.avatar,
+			"scoreRight": self.game.player_right.score,
+			"eloChange": self.elo_change,
+			"tournament": self.tournament,
+			"gameMode": self.game_mode,
+			"ranked": self.is_ranked,
+			"bot": self.bot > 0
 		}
-		try:
-			user_preference = await get_user_preference(user)
-			color = color_map.get(user_preference.color)
-			if (color is None):
-				return "#00BDD1"
-			else:
-				return color
-		except:
-			return "#00BDD1"
 
 	async def broadcast_state(self):
 		events = []
 		if self.game.scored:
-			if self.game.scorer is not None:
-				if (self.game.scorer == "LEFT"):
-					color = await self.get_color(self.player_left.user)
-				elif self.game.scorer == "RIGHT":
-					color = await self.get_color(self.player_right.user)
-				else:
-					self.logger.info(f"color defaulted to grey cause winner is not left or right")
-					color = '#676a6e'
-				self.game.scorer = None
-			else:
-				self.logger.info(f"color defaulted to grey cause winner is none")
-				color = '#676a6e'
+			color = self.side_color(self.game.scorer)
+			self.game.scorer = None
 			events.append({
 			"type": "score",
-			"position": vars(self.game.scorePos),
+			"position": wire_position(self.game.scorePos),
 			"score_left": self.game.player_left.score,
 			"score_right": self.game.player_right.score,
 			"color" : color
 			})
 			self.game.scored = False
 		if self.game.ended:
-			avatar = self.getUserAvatar(self.game.winner)
-			username = self.getUserName(self.game.winner)
-			if self.game.winner is self.player_left.user:
-				side = "LEFT"
-			elif self.game.winner is self.player_right.user:
-				side = "RIGHT"
-			else:
-				self.logger.info("Unknown winner")
-			
-			events.append({
-				"type": "game_end",
-				"winnerName": username,
-				"winner" : side,
-				"winnerUser" : self.game.winner.username,
-				"winnerAvatar": avatar,
-				"playerLeftUsername" : self.player_left.user.username,
-				"playerLeftName" : self.getUserName(self.player_left.user),
-				"playerLeftAvatar" : self.getUserAvatar(self.player_left.user),
-				"scoreLeft": self.game.player_left.score,
-				"playerRightUsername" : self.player_right.user.username,
-				"playerRightName" : self.getUserName(self.player_right.user),
-				"playerRightAvatar" : self.getUserAvatar(self.player_right.user),
-				"scoreRight": self.game.player_right.score,
-				"eloChange": self.elo_change,
-				"tournament": self.tournament,
-				"gameMode": self.game_mode,
-				"ranked": self.is_ranked,
-				"bot": self.bot > 0
-		})
-		if self.game.ball.lastHitter is not None:
-			if (self.game.ball.lastHitter == "LEFT"):
-				color = await self.get_color(self.player_left.user)
-			elif self.game.ball.lastHitter == "RIGHT":
-				color = await self.get_color(self.player_right.user)
-			else:
-				color = '#676a6e'
-			events.append({"type": "ball_last_hitter", "color": color})
-
-		trajectory_data = []
-
-		ballX = self.game.ball.position.x
-		ball_pos = vars(self.game.ball.position)
-		state = {
-			"type": "game.update",
-			"data": {
-				"positions": {
-					"player_left": vars(self.game.player_left.position),
-					"player_right": vars(self.game.player_right.position),
-					"ball": ball_pos,
-				},
-				"keys": {
-                "player_left": self.map_key_state(self.game.player_left.keys),
-                "player_right": self.map_key_state(self.game.player_right.keys)
-           		 },
-				"trajectory": trajectory_data,
-				"events": events
-			}
+			events.append(self.game_end_event())
+
+		ball_pos = wire_position(self.game.ball.position)
+		data = {
+			"positions": {
+				"player_left": wire_position(self.game.player_left.position),
+				"player_right": wire_position(self.game.player_right.position),
+				"ball": ball_pos,
+			},
+			"keys": {
+				"player_left": self.map_key_state(self.game.player_left.keys),
+				"player_right": self.map_key_state(self.game.player_right.keys)
+			},
+			"scores": {"left": self.game.player_left.score, "right": self.game.player_right.score},
+			"acks": dict(self.game.inputs.acks),
+			"ball_color": self.side_color(self.game.ball.lastHitter),
+			"events": events
 		}
 		try:
-			await self.channel_layer.group_send(str(self.game_id), state)
+			await self.send_frame(data)
 		except Exception as e:
 			self.logger.info(f"Error {e}")
 
-	def getUserAvatar(self, user):
-		if (user.avatar_42):
-			return user.avatar_42
-		elif (user.avatar):
-			return user.avatar.url
-		else:
-			return '/imgs/default_avatar.png'
-	
-	def getUserName(self, user):
-		if (user.display_name):
-			return user.display_name
-		else:
-			return user.username
-
 	async def rumble_broadcast_state(self):
 		events = []
 		if self.game.scored:
-			if self.game.scorer is not None:
-				if (self.game.scorer == "LEFT"):
-					color = await self.get_color(self.player_left.user)
-				elif self.game.scorer == "RIGHT":
-					color = await self.get_color(self.player_right.user)
-				else:
-					self.logger.info(f"color defaulted to grey cause winner is not left or right")
-					color = '#676a6e'
-				self.game.scorer = None
-			else:
-				self.logger.info(f"color defaulted to grey cause winner is none")
-				color = '#676a6e'
+			color = self.side_color(self.game.scorer)
+			self.game.scorer = None
 			events.append({
 			"type": "score",
-			"position": vars(self.game.scorePos),
+			"position": wire_position(self.game.scorePos),
 			"score_left": self.game.player_left.score,
 			"score_right": self.game.player_right.score,
 			"color" : color
 			})
 			self.game.scored = False
 		if self.game.ended:
-			avatar = self.getUserAvatar(self.game.winner)
-			username = self.getUserName(self.game.winner)
-			if self.game.winner is self.player_left.user:
-				side = "LEFT"
-			elif self.game.winner is self.player_right.user:
-				side = "RIGHT"
-			else:
-				self.logger.info("Unknown winner")
-
-			events.append({
-				"type": "game_end",
-				"winnerName": username,
-				"winner" : side,
-				"winnerUser" : self.game.winner.username,
-				"winnerAvatar": avatar,
-				"playerLeftUsername" : self.player_left.user.username,
-				"playerLeftName" : self.getUserName(self.player_left.user),
-				"playerLeftAvatar" : self.getUserAvatar(self.player_left.user),
-				"scoreLeft": self.game.player_left.score,
-				"playerRightUsername" : self.player_right.user.username,
-				"playerRightName" : self.getUserName(self.player_right.user),
-				"playerRightAvatar" : self.getUserAvatar(self.player_right.user),
-				"scoreRight": self.game.player_right.score,
-				"eloChange": self.elo_change,
-				"tournament": self.tournament,
-				"gameMode": self.game_mode,
-				"ranked": self.is_ranked,
-				"bot": self.bot > 0
-
-		})
+			events.append(self.game_end_event())
 		if self.game.announceEvent or self.game.event.action != 'none':
 			self.logger.info(f"Announcing event {self.game.event.name} and {self.game.event.description}")
 			events.append({
@@ -468,18 +416,10 @@ class GameBackend:
 		self.game.event.action = 'none'
 		if (self.game.announceEvent):
 			self.game.announceEvent = False
-		if self.game.ball.lastHitter is not None:
-			if (self.game.ball.lastHitter == "LEFT"):
-				color = await self.get_color(self.player_left.user)
-			elif self.game.ball.lastHitter == "RIGHT":
-				color = await self.get_color(self.player_right.user)
-			else:
-				color = '#676a6e'
-			events.append({"type": "ball_last_hitter", "color": color})
 
-		if (self.game.event.name == 'Visible Trajectory'):
-			trajectory_points = self.game.ball.predict_trajectory()
-			trajectory_data = [vars(point) for point in trajectory_points]
+		if (self.game.event.name == 'Visible Trajectory' and self.game.ball.is_moving):
+			# only the bounce vertices ahead, the client draws the path from the ball
+			trajectory_data = [wire_position(point) for point in self.game.ball.trajectory.ahead()]
 		else:
 			trajectory_data = []
 
@@ -492,49 +432,86 @@ class GameBackend:
 				"z": 1000
 			}
 		else:
-			ball_pos = vars(self.game.ball.position)
-		state = {
-			"type": "game.update",
-			"data": {
-				"positions": {
-					"player_left": vars(self.game.player_left.position),
-					"player_right": vars(self.game.player_right.position),
-					"ball": ball_pos,
-				},
-				 "keys": {
-                "player_left": self.map_key_state(self.game.player_left.keys),
-                "player_right": self.map_key_state(self.game.player_right.keys)
-            		},
-				"trajectory": trajectory_data,
-				"events": events
-			}
+			ball_pos = wire_position(self.game.ball.position)
+		data = {
+			"positions": {
+				"player_left": wire_position(self.game.player_left.position),
+				"player_right": wire_position(self.game.player_right.position),
+				"ball": ball_pos,
+			},
+			"keys": {
+				"player_left": self.map_key_state(self.game.player_left.keys),
+				"player_right": self.map_key_state(self.game.player_right.keys)
+			},
+			"scores": {"left": self.game.player_left.score, "right": self.game.player_right.score},
+			"acks": dict(self.game.inputs.acks),
+			"ball_color": self.side_color(self.game.ball.lastHitter),
+			"trajectory": trajectory_data,
+			"events": events
 		}
 		try:
-			await self.channel_layer.group_send(str(self.game_id), state)
+			await self.send_frame(data)
 		except Exception as e:
 			self.logger.info(f"Error {e}")
 
-	async def rumble_revert_event_broadcast(self):
-		events = []
-		if (self.game.event.action != 'none'):
-			action = self.game.event.action
-			self.game.event.action = 'none'
-			events.append({
+	def request_keyframe(self):
+		self.players_stream.request_keyframe()
+
+	def request_spectator_keyframe(self):
+		self.spectators_stream.request_keyframe()
+
+	async def send_frame(self, data):
+		"""Encodes the frame once per codec in use and stream, and fans the payloads out to its members."""
+		for stream in (self.players_stream, self.spectators_stream):
+			frame = stream.next_frame(data)
+			if not frame:
+				continue
+			payloads = {name: codec.encode("game_update", frame) for name, codec in self.frame_codecs.items()}
+			await stream.deliver({"type": "game.frame", "payloads": payloads, "data": frame}, self.channel_layer, self.logger)
+
+	def frame_stream(self, consumer):
+		return self.spectators_stream if consumer.spectator else self.players_stream
+
+	def spectator_slots(self):
+		return max(0, settings.GAME_MAX_SPECTATORS - len(self.spectators_stream))
+
+	async def join_frames(self, consumer):
+		"""Frames go straight to consumers of this process, through the channel layer stream group otherwise."""
+		await self.frame_stream(consumer).join(consumer, self.channel_layer, settings.GAME_LOCAL_DELIVERY)
+
+	async def leave_frames(self, consumer):
+		await self.frame_stream(consumer).leave(consumer, self.channel_layer)
+
+	def connection_stats(self):
+		"""Outbox depth, coalesced frames and send lag of each consumer of this process."""
+		members = {**self.players_stream.local_members, **self.spectators_stream.local_members}
+		return {channel_name: consumer.outbox.stats() for channel_name, consumer in members.items() if consumer.outbox}
+
+	def use_frame_codec(self, name):
+		"""Makes send_frame also encode with the codec a joining member asked for, json if unknown."""
+		if name not in FRAME_CODECS:
+			name = JsonFrameCodec.name
+		if name not in self.frame_codecs:
+			self.frame_codecs[name] = FRAME_CODECS[name]()
+		return self.frame_codecs[name]
+
+	async def rumble_revert_event_broadcast(self, event):
+		if (event.action == 'none'):
+			return
+		action = event.action
+		event.action = 'none'
+		data = {
+			"events": [{
 				"type": "event",
-				"icon": self.game.event.icon,
-				"name": self.game.event.name,
+				"icon": event.icon,
+				"name": event.name,
 				"announce" : False,
-				"description": self.game.event.description,
+				"description": event.description,
 				"action": action,
-			})
-			state = {
-				"type": "game.update",
-				"data": {
-					"events": events
-				}
-			}
+			}]
+		}
 		try:
-			await self.channel_layer.group_send(str(self.game_id), state)
+			await self.send_frame(data)
 		except Exception as e:
 			self.logger.info(f"Error {e}")
 
@@ -545,148 +522,3 @@ class GameBackend:
 		if keys.get("ArrowDown", False) or keys.get("S", False):
 			key_states.append("DOWN")
 		return key_states
-
-	async def check_classic_achievement(self):
-		if (self.is_ranked or self.tournament):
-			await self.check_remontada()
-			await self.check_big_remontada()
-			await self.check_flawless_victory()
-			await self.check_classic_win()
-			await self.check_wins()
-	
-	async def check_rumble_achievement(self):
-		if (self.is_ranked or self.tournament):
-			await self.check_remontada()
-			await self.check_big_remontada()
-			await self.check_flawless_victory()
-			await self.check_rumble_win()
-			await self.check_wins()
-			await self.check_speed_of_light()
-			await self.check_killer_survivor()
-			await self.check_shrinking_paddle()
-	
-	async def check_remontada(self):
-		if (self.remontada is None):
-			if (self.game.ended is False and self.game.player_left.score + 3 < self.game.player_right.score):
-				self.remontada = self.player_left.user
-				self.logger.info("Player left elligible for Clutch")
-			elif (self.game.ended is False and self.game.player_right.score + 3 < self.game.player_left.score):
-				self.remontada = self.player_right.user
-				self.logger.info("Player right elligible for Clutch")
-		elif self.game.ended and self.remontada:
-			if (self.game.winner == 'LEFT' and self.remontada == self.player_left.user):
-				await unlock_achievement(self.remontada, "Clutch")
-			elif (self.game.winner == 'RIGHT' and self.remontada == self.player_right.user):
-				await unlock_achievement(self.remontada, "Clutch")
-	
-	async def check_big_remontada(self):
-		if (self.bigRemontada is None):
-			if (self.game.ended is False and self.game.player_left.score + 6 < self.game.player_right.score):
-				self.bigRemontada = self.player_left.user
-				self.logger.info("Player left elligible for God's Clutch")
-			elif (self.game.ended is False and self.game.player_right.score + 6 < self.game.player_left.score):
-				self.bigRemontada = self.player_right.user
-				self.logger.info("Player left elligible for God's Clutch")
-		elif self.game.ended and self.bigRemontada:
-			if (self.game.winner == 'LEFT' and self.bigRemontada == self.player_left.user):
-				await unlock_achievement(self.bigRemontada, "God's Clutch")
-			elif (self.game.winner == 'RIGHT' and self.bigRemontada == self.player_right.user):
-				await unlock_achievement(self.bigRemontada, "God's Clutch")
-
-	async def check_flawless_victory(self):
-		if (self.game.ended):
-			if (self.game.winner == 'LEFT' and self.game.player_left.score == 10 and self.game.player_right.score == 0):
-				await unlock_achievement(self.player_left.user, "Flawless")
-			elif (self.game.winner == 'RIGHT' and self.game.player_right.score == 10 and self.game.player_left.score == 0):
-				await unlock_achievement(self.player_right.user, "Flawless")
-	
-	async def check_speed_of_light(self):
-		if (self.game.ended and self.game.ball.highestSpeed < 60 and math.floor(self.game.ball.highestSpeed) > 0):
-			await update_achievement_progression(self.player_right.user, 'Speed Of Light', math.floor(self.game.ball.highestSpeed))
-			await update_achievement_progression(self.player_left.user, 'Speed Of Light', math.floor(self.game.ball.highestSpeed))
-		elif (self.game.ended and self.game.ball.highestSpeed >= 60):
-			await unlock_achievement(self.player_right.user, "Speed Of Light")
-			await unlock_achievement(self.player_right.user, "Speed Of Light")
-	
-	async def check_killer_survivor(self):
-		if (self.game.ended and self.game.highestKillerSurvive < 42 and math.floor(self.game.highestKillerSurvive)> 0):
-			await update_achievement_progression(self.player_right.user, 'Survivor', math.floor(self.game.highestKillerSurvive))
-			await update_achievement_progression(self.player_left.user, 'Survivor', math.floor(self.game.highestKillerSurvive))
-		elif (self.game.ended and self.game.highestKillerSurvive >= 42):
-			await unlock_achievement(self.player_left.user, "Survivor")
-			await unlock_achievement(self.player_right.user, "Survivor")
-
-	async def check_shrinking_paddle(self):
-		if (self.game.ended and self.game.player_right.highestShrinkPaddle < 8 and self.game.player_right.highestShrinkPaddle > 0):
-			await update_achievement_progression(self.player_right.user, 'Honey, I Shrunk the Paddles', self.game.player_right.highestShrinkPaddle)
-		if (self.game.ended and self.game.player_left.highestShrinkPaddle < 8 and self.game.player_left.highestShrinkPaddle > 0):
-			await update_achievement_progression(self.player_left.user, 'Honey, I Shrunk the Paddles', self.game.player_left.highestShrinkPaddle)
-		if (self.game.ended and self.game.player_right.highestShrinkPaddle >= 8):
-			await unlock_achievement(self.player_right.user, 'Honey, I Shrunk the Paddles')
-		if (self.game.ended and self.game.player_left.highestShrinkPaddle >= 8):
-			await unlock_achievement(self.player_left.user, 'Honey, I Shrunk the Paddles')
-			
-	async def check_rumble_win(self):
-		if (self.game.ended and self.game.winner =='LEFT'):
-			await unlock_achievement(self.player_left.user, 'Rumbler')
-		elif (self.game.ended and self.game.winner == 'RIGHT'):
-			await unlock_achievement(self.player_right.user, 'Rumbler')
-		else:
-			self.logger.info("Rubmble game not won by anyone or not ended")
-
-	async def check_classic_win(self):
-		if (self.game.ended and self.game.winner =='LEFT'):
-			await unlock_achievement(self.player_left.user, 'Vanilla')
-		elif (self.game.ended and self.game.winner == 'RIGHT'):
-			await unlock_achievement(self.player_right.user, 'Vanilla')
-	
-	async def check_wins(self):
-		if (self.game.ended and self.game.winner =='LEFT'):
-			user_stat = await get_user_statistic(self.player_left.user)
-			if (user_stat.classic_wins + user_stat.rumble_wins + 1 < 10):
-				await update_achievement_progression(self.player_left.user, 'Challenger', user_stat.classic_wins + user_stat.rumble_wins + 1)
-			else:
-				await unlock_achievement(self.player_right.user, 'Challenger')
-		elif (self.game.ended and self.game.winner =='RIGHT'):
-			user_stat = await get_user_statistic(self.player_right .user)
-			if (user_stat.classic_wins + user_stat.rumble_wins + 1 < 10):
-				await update_achievement_progression(self.player_right.user, 'Challenger', user_stat.classic_wins + user_stat.rumble_wins + 1)
-			else:
-				await unlock_achievement(self.player_right.user, 'Challenger')
-
-
-	@database_sync_to_async
-	def update_user_statistic_classic_elo(self, user_statistic, elo):
-		from api.models import UserStatistic
-		user_statistic.classic_elo = elo
-		user_statistic.save()
-
-	@database_sync_to_async
-	def update_user_statistic_rumble_elo(self, user_statistic, elo):
-		from api.models import UserStatistic
-		user_statistic.rumble_elo = elo
-		user_statistic.save()
-
-	@database_sync_to_async
-	def update_user_statistic_classic_wins(self, user_statistic):
-		from api.models import UserStatistic
-		user_statistic.classic_wins += 1
-		user_statistic.save()
-
-	@database_sync_to_async
-	def update_user_statistic_rumble_wins(self, user_statistic):
-		from api.models import UserStatistic
-		user_statistic.rumble_wins += 1
-		user_statistic.save()
-
-	@database_sync_to_async
-	def update_user_statistic_classic_total_played(self, user_statistic):
-		from api.models import UserStatistic
-		user_statistic.classic_total_played += 1
-		user_statistic.save()
-
-	@database_sync_to_async
-	def update_user_statistic_rumble_total_played(self, user_statistic):
-		from api.models import UserStatistic
-		user_statistic.rumble_total_played += 1
-		user_statistic.save()
\ No newline at end of file
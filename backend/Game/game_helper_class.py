@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import math
-import random
+import time
 
 class BounceMethods(ABC):
 	@abstractmethod
@@ -8,7 +8,7 @@ class BounceMethods(ABC):
 		pass
 
 	@abstractmethod
-	async def BouncePaddle(self, ball, paddle_x, paddle_y):
+	def BouncePaddle(self, ball, paddle_x, paddle_y):
 		pass
 
 class MovementMethod(ABC):
@@ -17,11 +17,32 @@ class MovementMethod(ABC):
 		pass
 
 class Vector2D:
+	"""Slotted 3D vector. Game entities mutate their vectors in place instead of replacing them."""
+	__slots__ = ('x', 'y', 'z')
+
 	def __init__(self, x=0.0, y=0.0, z=0.0):
 		self.x = x
 		self.y = y
 		self.z = z
 
+	def copy(self):
+		return Vector2D(self.x, self.y, self.z)
+
+	def set(self, x, y, z):
+		self.x = x
+		self.y = y
+		self.z = z
+
+	def copy_from(self, other):
+		self.x = other.x
+		self.y = other.y
+		self.z = other.z
+
+	def add_scaled(self, other, factor):
+		self.x += other.x * factor
+		self.y += other.y * factor
+		self.z += other.z * factor
+
 	def get_magnitude(self):
 		return math.sqrt(self.x**2 + self.y**2 + self.z**2)
 
@@ -31,8 +52,143 @@ class Vector2D:
 		self.y /= magnitude
 		self.z /= magnitude
 
+	def to_dict(self):
+		return {"x": self.x, "y": self.y, "z": self.z}
+
+class TrajectoryPredictor:
+	"""Closed-form ball path: straight segments reflected on the walls up to a goal line.
+
+	The polyline is kept as its bounce vertices and is only recomputed when the
+	velocity changes, or after invalidate() when the ball is moved without
+	changing its velocity.
+	"""
+	__slots__ = ('position', 'velocity', 'radius', 'bounds', 'key', 'vertices')
+	MAX_BOUNCES = 32
+
+	def __init__(self, position, velocity, radius, bounds):
+		self.position = position
+		self.velocity = velocity
+		self.radius = radius
+		self.bounds = bounds
+		self.key = None
+		self.vertices = []
+
+	def invalidate(self):
+		self.key = None
+
+	def compute(self):
+		vx = self.velocity.x
+		vy = self.velocity.y
+		vertices = []
+		if vx == 0:
+			return vertices
+		x, y, z = self.position.x, self.position.y, self.position.z
+		top = self.bounds.top.y - self.radius
+		bottom = self.bounds.bottom.y + self.radius
+		goal_x = self.bounds.right.x if vx > 0 else self.bounds.left.x
+		for _ in range(self.MAX_BOUNCES):
+			goal_time = (goal_x - x) / vx
+			if vy > 0:
+				wall_y = top
+			elif vy < 0:
+				wall_y = bottom
+			else:
+				wall_y = None
+			wall_time = math.inf if wall_y is None else max(0.0, (wall_y - y) / vy)
+			if wall_time >= goal_time:
+				vertices.append(Vector2D(goal_x, y + vy * goal_time, z))
+				break
+			x += vx * wall_time
+			y = wall_y
+			vertices.append(Vector2D(x, y, z))
+			vy = -vy
+		return vertices
+
+	def ahead(self):
+		"""Cached vertices the ball has not reached yet."""
+		key = (self.velocity.x, self.velocity.y)
+		if key != self.key:
+			self.key = key
+			self.vertices = self.compute()
+		direction = 1 if self.velocity.x > 0 else -1
+		x = self.position.x
+		vertices = self.vertices
+		for i, vertex in enumerate(vertices):
+			if (vertex.x - x) * direction > 0:
+				return vertices[i:]
+		return []
+
+	def path(self):
+		vertices = self.ahead()
+		if not vertices:
+			return []
+		return [self.position.copy()] + vertices
+
+	def y_at(self, target_x):
+		"""Height of the path when it crosses target_x, None if it never does."""
+		direction = 1 if self.velocity.x > 0 else -1
+		prev_x, prev_y = self.position.x, self.position.y
+		if (target_x - prev_x) * direction < 0:
+			return None
+		for vertex in self.ahead():
+			if (vertex.x - target_x) * direction >= 0:
+				span = vertex.x - prev_x
+				if span == 0:
+					return vertex.y
+				return prev_y + (vertex.y - prev_y) * (target_x - prev_x) / span
+			prev_x, prev_y = vertex.x, vertex.y
+		return None
+
+class FixedTimestep:
+	"""Accumulator clock that turns wall time into a bounded number of fixed physics steps.
+
+	Physics and broadcast run at independent rates. When the loop stalls, at most
+	max_catchup_steps are simulated and the rest of the backlog is dropped, so a
+	slow frame never turns into an unbounded burst of substeps.
+	"""
+	def __init__(self, physics_rate, broadcast_rate, max_catchup_steps):
+		self.step = 1 / physics_rate
+		self.broadcast_interval = 1 / broadcast_rate
+		self.max_catchup_steps = max_catchup_steps
+		self.accumulator = 0.0
+		self.broadcast_accumulator = 0.0
+		self.dropped_time = 0.0
+		self.last_time = time.monotonic()
+
+	def reset(self, now=None):
+		self.last_time = time.monotonic() if now is None else now
+		self.accumulator = 0.0
+		self.broadcast_accumulator = 0.0
+
+	def advance(self, now=None):
+		if now is None:
+			now = time.monotonic()
+		frame_time = max(0.0, now - self.last_time)
+		self.last_time = now
+		self.accumulator += frame_time
+		self.broadcast_accumulator += frame_time
+
+		steps = int(self.accumulator / self.step)
+		if steps > self.max_catchup_steps:
+			steps = self.max_catchup_steps
+		self.accumulator -= steps * self.step
+		if self.accumulator >= self.step:
+			remainder = self.accumulator % self.step
+			self.dropped_time += self.accumulator - remainder
+			self.accumulator = remainder
+		return steps
+
+	def should_broadcast(self):
+		if self.broadcast_accumulator < self.broadcast_interval:
+			return False
+		self.broadcast_accumulator = min(self.broadcast_accumulator - self.broadcast_interval, self.broadcast_interval)
+		return True
+
+	def time_until_broadcast(self):
+		return max(0.0, self.broadcast_interval - self.broadcast_accumulator)
+
 def random_angle(ball):
-	random_angle = random.uniform(-40, 40)
+	random_angle = ball.rng.uniform(-40, 40)
 	random_angle_rad = math.radians(random_angle)
 	ball.velocity.x *= -1
 	directionY = (ball.velocity.y > 0) * 2 - 1
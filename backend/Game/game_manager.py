@@ -1,5 +1,7 @@
 from typing_extensions import List
 from .game_backend import GameBackend
+from .game_scheduler import GameScheduler
+from .results import GameResultWriter
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.db.models import Q
@@ -24,6 +26,8 @@ class GameManager:
 			self.games = {}
 			self.logger = logging.getLogger('game')
 			self.tournament_count = 0
+			self.scheduler = GameScheduler()
+			self.results = GameResultWriter()
 
 	def _get_game_history_model(self):
 		if self.game_history is None:
@@ -36,6 +40,7 @@ class GameManager:
 		if game_id in self.games:
 			game = self.games[game_id]
 			del self.games[game_id]
+		self.scheduler.remove(game_id)
 
 	async def get_game(self, user, bot, mode, ranked=True, local=False):
 		self._get_game_history_model()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+import logging
+
+class GameScheduler:
+	"""Drives every live game of this worker from a single loop.
+
+	One timer wakeup per frame ticks all registered games (and their bots)
+	instead of each game owning its own asyncio task and sleep timer.
+	Stepping is synchronous, whatever a game then has to await (its events
+	reaching GameBackend, the frame broadcast) runs in a task of its own, so
+	a slow database write or send of one game never holds the next frame of
+	the others. A game whose previous task is still running keeps its events
+	queued and skips the frame until it is done.
+	"""
+	def __init__(self, frame_rate=60):
+		self.frame_time = 1 / frame_rate
+		self.games = {}
+		self.io_tasks = {}
+		self.loop_task = None
+		self.logger = logging.getLogger('game')
+		self.tick_count = 0
+		self.overrun_count = 0
+		self.last_tick_duration = 0.0
+		self.max_tick_duration = 0.0
+		self.avg_tick_duration = 0.0
+		self.last_overrun_log = 0.0
+
+	def add(self, game_id, game, bot=None):
+		self.games[game_id] = (game, bot)
+		if self.loop_task is None or self.loop_task.done():
+			self.loop_task = asyncio.create_task(self.run())
+
+	def remove(self, game_id):
+		self.games.pop(game_id, None)
+
+	def stats(self):
+		return {
+			"games": len(self.games),
+			"ticks": self.tick_count,
+			"overruns": self.overrun_count,
+			"budget": self.frame_time,
+			"last_tick": self.last_tick_duration,
+			"avg_tick": self.avg_tick_duration,
+			"max_tick": self.max_tick_duration,
+		}
+
+	async def run(self):
+		try:
+			while self.games:
+				start = time.monotonic()
+				self.tick(start)
+				elapsed = time.monotonic() - start
+				self.account(elapsed, start)
+				await asyncio.sleep(max(0, self.frame_time - elapsed))
+		except asyncio.CancelledError:
+			self.logger.info("Game scheduler stopped")
+		except Exception as e:
+			self.logger.error(f"Error in game scheduler: {e}")
+		finally:
+			self.loop_task = None
+
+	def tick(self, now):
+		for game_id, (game, bot) in list(self.games.items()):
+			broadcast = False
+			if game.is_running:
+				try:
+					game.inputs.apply()
+					if bot is not None:
+						bot.tick(now)
+					game.advance(now)
+					broadcast = game.broadcast_due()
+				except Exception as e:
+					self.logger.error(f"Error in game tick: {e}")
+			if game_id in self.io_tasks:
+				continue
+			if game.pending_events or broadcast:
+				self.io_tasks[game_id] = asyncio.create_task(self.flush(game_id, game, broadcast))
+			elif not game.is_running:
+				self.remove(game_id)
+
+	async def flush(self, game_id, game, broadcast):
+		try:
+			await game.dispatch_events()
+			if broadcast:
+				await game.broadcast()
+		except Exception as e:
+			self.logger.error(f"Error in game {game_id} events: {e}")
+		finally:
+			self.io_tasks.pop(game_id, None)
+
+	def account(self, elapsed, now):
+		self.tick_count += 1
+		self.last_tick_duration = elapsed
+		self.avg_tick_duration += (elapsed - self.avg_tick_duration) * 0.05
+		if elapsed > self.max_tick_duration:
+			self.max_tick_duration = elapsed
+		if elapsed > self.frame_time:
+			self.overrun_count += 1
+			if now - self.last_overrun_log >= 5:
+				self.last_overrun_log = now
+				self.logger.warning(f"Game tick over budget: {elapsed * 1000:.2f}ms for {len(self.games)} games (budget {self.frame_time * 1000:.2f}ms, {self.overrun_count} overruns)")
@@ -0,0 +1,93 @@
+import math
+import time
+
+SIDES = ("player_left", "player_right")
+
+def valid_seq(seq):
+	"""A client sequence number, when sent, must fit the u16 the frames echo it in."""
+	return seq is None or (type(seq) is int and 0 <= seq <= 0xFFFF)
+
+def client_timestamp(client_time):
+	"""The client clock in ms as the u32 binary packets carry it, None when it is not a number."""
+	if type(client_time) not in (int, float) or not math.isfinite(client_time):
+		return None
+	return int(client_time) & 0xFFFFFFFF
+
+def seq_newer(seq, last):
+	"""Serial number comparison for the u16 input sequence, which wraps at 65536."""
+	return last is None or 0 < (seq - last) & 0xFFFF < 0x8000
+
+class InputStats:
+	__slots__ = ('inputs', 'dropped', 'last_delay', 'avg_delay', 'max_delay', 'jitter', 'last_received', 'last_client_time')
+
+	def __init__(self):
+		self.inputs = 0
+		self.dropped = 0
+		self.last_delay = 0.0
+		self.avg_delay = 0.0
+		self.max_delay = 0.0
+		self.jitter = 0.0
+		self.last_received = None
+		self.last_client_time = None
+
+	def to_dict(self):
+		return {
+			"inputs": self.inputs,
+			"dropped": self.dropped,
+			"last_delay": self.last_delay,
+			"avg_delay": self.avg_delay,
+			"max_delay": self.max_delay,
+			"jitter": self.jitter,
+		}
+
+class InputBuffer:
+	"""Key inputs received since the last tick, applied together at the start of the next one.
+
+	Inputs are recorded per connection side: the last applied sequence number
+	of each side is echoed in every frame (acks), so a client can match what
+	the server simulated against what it sent. Each side also keeps how long
+	inputs waited for their tick and the arrival jitter measured against the
+	client timestamps.
+	"""
+	def __init__(self):
+		self.pending = []
+		self.acks = {side: 0 for side in SIDES}
+		self.last_seq = {side: None for side in SIDES}
+		self.stats = {side: InputStats() for side in SIDES}
+
+	def push(self, side, player, key, is_down, seq=None, client_time=None):
+		received = time.monotonic()
+		stats = self.stats[side]
+		if seq is not None:
+			if not seq_newer(seq, self.last_seq[side]):
+				stats.dropped += 1
+				return
+			self.last_seq[side] = seq
+		if client_time is not None:
+			if stats.last_client_time is not None:
+				client_gap = (client_time - stats.last_client_time) & 0xFFFFFFFF
+				server_gap = (received - stats.last_received) * 1000
+				stats.jitter += (abs(server_gap - client_gap) - stats.jitter) / 16
+			stats.last_client_time = client_time
+			stats.last_received = received
+		self.pending.append((side, player, key, is_down, seq, received))
+
+	def apply(self):
+		if not self.pending:
+			return
+		now = time.monotonic()
+		for side, player, key, is_down, seq, received in self.pending:
+			player.keys[key] = is_down
+			if seq is not None:
+				self.acks[side] = seq
+			stats = self.stats[side]
+			delay = now - received
+			stats.inputs += 1
+			stats.last_delay = delay
+			stats.avg_delay += (delay - stats.avg_delay) * 0.05
+			if delay > stats.max_delay:
+				stats.max_delay = delay
+		self.pending = []
+
+	def snapshot(self):
+		return {side: stats.to_dict() for side, stats in self.stats.items()}
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import logging
+from collections import deque
+
+def merge_frames(older, newer):
+	"""One frame with the effect of both: newer state wins, events of both are kept in order."""
+	merged = dict(older)
+	for field, value in newer.items():
+		if field == "events":
+			merged["events"] = older.get("events", []) + value
+		elif field == "keyframe":
+			merged["keyframe"] = True
+			merged.pop("base", None)
+		elif field == "base":
+			# the merged delta applies on top of what the older one applied to
+			continue
+		elif isinstance(value, dict) and isinstance(older.get(field), dict):
+			merged[field] = merge_frames(older[field], value)
+		else:
+			merged[field] = value
+	return merged
+
+class FrameOutbox:
+	"""Bounded latest-wins queue of frames between the game loop and one socket.
+
+	The game loop only pushes, a writer task does the sends. When the socket
+	falls behind and the outbox is full, the newest waiting frame is merged
+	with the incoming one instead of queueing it, so state changes collapse
+	into one frame while events (score, game_end, rumble events) are carried
+	along. Only frames of slow connections are ever re-encoded.
+	"""
+	CAPACITY = 4
+	LAG_WARNING = 0.5
+	WARNING_INTERVAL = 5.0
+
+	def __init__(self, name, send, codec):
+		self.name = name
+		self.send = send
+		self.codec = codec
+		self.pending = deque()
+		self.ready = asyncio.Event()
+		self.task = None
+		self.logger = logging.getLogger('game')
+		self.sent = 0
+		self.coalesced = 0
+		self.last_lag = 0.0
+		self.max_lag = 0.0
+		self.last_warning = 0.0
+
+	def push(self, data, payload):
+		now = time.monotonic()
+		if len(self.pending) >= self.CAPACITY:
+			older, _, queued_at = self.pending.pop()
+			data = merge_frames(older, data)
+			payload = self.codec.encode("game_update", data)
+			self.coalesced += 1
+			self.pending.append((data, payload, queued_at))
+		else:
+			self.pending.append((data, payload, now))
+		self.ready.set()
+		if self.task is None:
+			self.task = asyncio.create_task(self.run())
+
+	async def run(self):
+		try:
+			while True:
+				await self.ready.wait()
+				self.ready.clear()
+				while self.pending:
+					_, payload, queued_at = self.pending.popleft()
+					await self.send(payload)
+					self.sent += 1
+					self.record_lag(time.monotonic() - queued_at)
+		except asyncio.CancelledError:
+			pass
+		except Exception as e:
+			self.logger.info(f"Outbox of {self.name} stopped: {e}")
+
+	def record_lag(self, lag):
+		self.last_lag = lag
+		self.max_lag = max(self.max_lag, lag)
+		now = time.monotonic()
+		if lag >= self.LAG_WARNING and now - self.last_warning >= self.WARNING_INTERVAL:
+			self.last_warning = now
+			self.logger.warning(f"Connection {self.name} is {lag*1000:.0f}ms behind ({self.coalesced} frames coalesced)")
+
+	def stats(self):
+		return {
+			"depth": len(self.pending),
+			"sent": self.sent,
+			"coalesced": self.coalesced,
+			"last_lag": self.last_lag,
+			"max_lag": self.max_lag,
+		}
+
+	def close(self):
+		if self.task is not None:
+			self.task.cancel()
+			self.task = None
+		self.pending.clear()
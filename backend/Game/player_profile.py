@@ -0,0 +1,79 @@
+from typing import NamedTuple
+from channels.layers import get_channel_layer
+from api.db_utils import get_user_preference, get_user_statistic
+from .bot import BotUser
+
+COLOR_MAP = {
+	0: '#447AFF',
+	1: "#00BDD1",
+	2: "#00AD06",
+	3: "#E67E00",
+	4: "#E6008F",
+	5: "#6900CC",
+	6: "#E71200",
+	7: "#0EC384",
+	8: "#E6E3E1",
+	9: "#D5DA2B"
+}
+DEFAULT_COLOR = "#00BDD1"
+NEUTRAL_COLOR = '#676a6e'
+DEFAULT_AVATAR = '/imgs/default_avatar.png'
+
+class PlayerProfile(NamedTuple):
+	"""What the game broadcasts and scores about a player, read once from the database when the game fills up."""
+	username: str
+	display_name: str
+	avatar: str
+	color: str
+	elo: int
+	wins: int
+
+def get_avatar(user):
+	if (user.avatar_42 and getattr(user, 'is_42_avatar_used', True)):
+		return user.avatar_42
+	elif (user.avatar):
+		return user.avatar.url
+	return DEFAULT_AVATAR
+
+def get_display_name(user):
+	if (user.display_name):
+		return user.display_name
+	return user.username
+
+async def get_color(user):
+	if isinstance(user, BotUser):
+		return COLOR_MAP.get(user.color, DEFAULT_COLOR)
+	try:
+		user_preference = await get_user_preference(user)
+		return COLOR_MAP.get(user_preference.color, DEFAULT_COLOR)
+	except Exception:
+		return DEFAULT_COLOR
+
+async def get_rating(user, game_mode):
+	"""Elo in the game mode and ranked wins over both modes."""
+	if isinstance(user, BotUser):
+		return user.elo, 0
+	user_statistic = await get_user_statistic(user)
+	wins = user_statistic.classic_wins + user_statistic.rumble_wins
+	if (game_mode == "rumble"):
+		return user_statistic.rumble_elo, wins
+	return user_statistic.classic_elo, wins
+
+async def load_player_profile(user, game_mode):
+	elo, wins = await get_rating(user, game_mode)
+	return PlayerProfile(
+		username=user.username,
+		display_name=get_display_name(user),
+		avatar=get_avatar(user),
+		color=await get_color(user),
+		elo=elo,
+		wins=wins,
+	)
+
+def profile_group(user_id):
+	"""Group of a player's game connection, joined in whichever process runs the game."""
+	return f"game_player_{user_id}"
+
+async def notify_profile_changed(user):
+	"""Tells the game a player is in, if any, to reload the profile after a settings change."""
+	await get_channel_layer().group_send(profile_group(user.id), {"type": "player.profile_changed"})
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+import logging
+from urllib.parse import parse_qs
+from api.utils import jwt_to_user
+from api.db_utils import get_game_replay
+from .consumer import GameConsumer
+from .game_backend import GameBackend, User
+from .outbox import FrameOutbox
+from .replay_log import read_replay, apply_key_bits, KIND_KEYS, KIND_EVENT, KIND_FORFEIT, SIDES
+
+class ReplayBackend(GameBackend):
+	"""Re-simulates a finished game from its replay log and streams it like a live one.
+
+	Game events only produce frames here, nothing is written back to the
+	database. At speeds above 1x several physics steps run per frame, so the
+	viewer still gets frames at the broadcast rate.
+	"""
+	def __init__(self, history, log):
+		super().__init__(history.id, 0, None, False, log.mode, log.tournament, log.local, log.seed)
+		self.log = log
+		self.elo_change = history.elo_change
+		self.player_left = User(history.player_left, None, "Replay")
+		self.player_right = User(history.player_right, None, "Replay")
+
+	async def handle_game_events(self, events):
+		for event in events:
+			if event["type"] == "event_revert":
+				await self.rumble_revert_event_broadcast(event["event"])
+			elif event["type"] == "game_end":
+				self.game.winner = self.player_left.user if self.game.winner == "LEFT" else self.player_right.user
+				if self.game_mode == "classic":
+					await self.broadcast_state()
+				else:
+					await self.rumble_broadcast_state()
+
+	def apply_record(self, record):
+		if record.kind == KIND_KEYS:
+			apply_key_bits(record.value, self.game.player_left.keys, self.game.player_right.keys)
+		elif record.kind == KIND_FORFEIT:
+			self.game.on_game_end(SIDES[1 - record.value])
+
+	async def play(self, speed):
+		game = self.game
+		records = self.log.records
+		index = 0
+		frame_time = 1 / game.BROADCAST_RATE
+		# records count steps of the rate the game was played at, it is re-simulated at that rate
+		physics_rate = self.log.physics_rate
+		if physics_rate != game.PHYSICS_RATE:
+			self.logger.info(f"Replaying game {self.game_id} at its recorded physics rate {physics_rate}, not {game.PHYSICS_RATE}")
+		step = 1 / physics_rate
+		steps_per_frame = speed * physics_rate / game.BROADCAST_RATE
+		steps_due = 0.0
+		next_frame = time.monotonic()
+		game.start()
+		while game.is_running:
+			steps_due += steps_per_frame
+			while steps_due >= 1 and game.is_running:
+				steps_due -= 1
+				while index < len(records) and records[index].step <= game.step_count:
+					self.apply_record(records[index])
+					index += 1
+				if not game.is_running:
+					break
+				game.step(step)
+				game.step_count += 1
+				await game.dispatch_events()
+			if game.is_running:
+				await game.broadcast_function()
+			next_frame += frame_time
+			await asyncio.sleep(max(0.0, next_frame - time.monotonic()))
+		await game.dispatch_events()
+		if game.recorder.events() != [record.value for record in records if record.kind == KIND_EVENT]:
+			self.logger.warning(f"Replay of game {self.game_id} diverged from its recorded rumble events")
+
+class ReplayConsumer(GameConsumer):
+	"""ws/replay/?game=<id>&speed=<1-16>, plays a recorded game in the regular game view."""
+	MIN_SPEED = 1
+	MAX_SPEED = 16
+
+	async def connect(self):
+		self.logger = logging.getLogger('game')
+		self.game = None
+		self.spectator = False
+		self.outbox = None
+		self.playback = None
+		query_params = parse_qs(self.scope["query_string"].decode())
+		self.frame_protocol = query_params.get("protocol", ["json"])[0]
+		await self.accept()
+
+		self.user = await jwt_to_user(self.scope['headers'])
+		if not self.user:
+			await self.refuse("Invalid JWT")
+			return
+		try:
+			game_id = int(query_params.get("game", [None])[0])
+			self.speed = min(max(float(query_params.get("speed", [1])[0]), self.MIN_SPEED), self.MAX_SPEED)
+		except (TypeError, ValueError):
+			await self.refuse("Invalid replay request")
+			return
+		replay = await get_game_replay(game_id)
+		if replay is None or replay.game.player_left is None or replay.game.player_right is None:
+			await self.refuse("Replay not found.")
+			return
+
+		self.game = ReplayBackend(replay.game, read_replay(bytes(replay.data)))
+		self.game.channel_layer = self.channel_layer
+		await self.game.load_profiles()
+		codec = self.game.use_frame_codec(self.frame_protocol)
+		self.frame_protocol = codec.name
+		self.outbox = FrameOutbox(self.channel_name, self.send_payload, codec)
+		await self.game.join_frames(self)
+		self.logger.info(f"Replaying game {game_id} at {self.speed}x for {self.user.username}")
+		await self.init({"data": await self.initial_game_state(self.game)})
+
+	async def refuse(self, message):
+		await self.send(text_data=json.dumps({
+			"type": "handle_error",
+			"message": message
+		}))
+		await self.close()
+
+	async def receive(self, text_data=None, bytes_data=None):
+		if not text_data or not self.game:
+			return
+		try:
+			data = json.loads(text_data)
+		except json.JSONDecodeError:
+			return
+		message_type = data.get("type") if isinstance(data, dict) else None
+		if message_type == "resync":
+			self.game.request_keyframe()
+		elif message_type == "init_confirm" and not self.playback:
+			self.game.request_keyframe()
+			self.playback = asyncio.create_task(self.game.play(self.speed))
+
+	async def disconnect(self, close_code):
+		if self.playback:
+			self.playback.cancel()
+		if self.game:
+			await self.game.leave_frames(self)
+		if self.outbox:
+			self.outbox.close()
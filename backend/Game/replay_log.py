@@ -0,0 +1,111 @@
+import struct
+from typing import NamedTuple
+
+# Replay log layout, little endian:
+#   header: 4 byte magic, u8 mode, u8 flags, u32 seed, u16 physics rate
+#   records: u16 physics steps since the previous record, u8 kind << 4 | value
+# With the seed the simulation is deterministic, so the key state transitions
+# of both sides are all a game needs to be re-simulated. Rumble event picks
+# and forfeits are logged too, events to check a replay did not diverge.
+MAGIC = b'PGR1'
+HEADER = struct.Struct('<4sBBIH')
+RECORD = struct.Struct('<HB')
+MODES = ("classic", "rumble")
+FLAG_TOURNAMENT = 0x01
+FLAG_LOCAL = 0x02
+
+KIND_WAIT = 0
+KIND_KEYS = 1
+KIND_EVENT = 2
+KIND_FORFEIT = 3
+
+KEY_BITS = ((0, "UP", 0x01), (0, "DOWN", 0x02), (1, "UP", 0x04), (1, "DOWN", 0x08))
+SIDES = ("LEFT", "RIGHT")
+
+def key_bits(left_keys, right_keys):
+	bits = 0
+	for side, keys in enumerate((left_keys, right_keys)):
+		if keys["ArrowUp"] or keys["W"]:
+			bits |= KEY_BITS[side * 2][2]
+		if keys["ArrowDown"] or keys["S"]:
+			bits |= KEY_BITS[side * 2 + 1][2]
+	return bits
+
+def apply_key_bits(bits, left_keys, right_keys):
+	for side, keys in enumerate((left_keys, right_keys)):
+		keys["ArrowUp"] = bool(bits & KEY_BITS[side * 2][2])
+		keys["ArrowDown"] = bool(bits & KEY_BITS[side * 2 + 1][2])
+		keys["W"] = False
+		keys["S"] = False
+
+class ReplayRecorder:
+	"""Bounded in-memory log of one live game, read once when the game ends.
+
+	A replay missing its beginning cannot be re-simulated, so instead of
+	overwriting old records a full log stops recording and the game is
+	stored without a replay.
+	"""
+	MAX_BYTES = 64 * 1024
+
+	def __init__(self, mode, seed, physics_rate, tournament, local):
+		flags = (FLAG_TOURNAMENT if tournament else 0) | (FLAG_LOCAL if local else 0)
+		self.buffer = bytearray(HEADER.pack(MAGIC, MODES.index(mode), flags, seed, physics_rate))
+		self.last_step = 0
+		self.last_keys = 0
+		self.truncated = False
+
+	def record(self, step, kind, value=0):
+		if self.truncated:
+			return
+		delta = step - self.last_step
+		while delta > 0xFFFF:
+			self.append(0xFFFF, KIND_WAIT, 0)
+			delta -= 0xFFFF
+		self.append(delta, kind, value)
+		self.last_step = step
+
+	def append(self, delta, kind, value):
+		if len(self.buffer) + RECORD.size > self.MAX_BYTES:
+			self.truncated = True
+			return
+		self.buffer += RECORD.pack(delta, kind << 4 | value)
+
+	def record_keys(self, step, left_keys, right_keys):
+		bits = key_bits(left_keys, right_keys)
+		if bits != self.last_keys:
+			self.last_keys = bits
+			self.record(step, KIND_KEYS, bits)
+
+	def events(self):
+		return [record.value for record in read_replay(bytes(self.buffer)).records if record.kind == KIND_EVENT]
+
+	def to_bytes(self):
+		if self.truncated:
+			return None
+		return bytes(self.buffer)
+
+class ReplayRecord(NamedTuple):
+	step: int
+	kind: int
+	value: int
+
+class ReplayLog(NamedTuple):
+	mode: str
+	seed: int
+	physics_rate: int
+	tournament: bool
+	local: bool
+	records: list
+
+def read_replay(data):
+	magic, mode, flags, seed, physics_rate = HEADER.unpack_from(data)
+	if magic != MAGIC:
+		raise ValueError("Not a replay log")
+	records = []
+	step = 0
+	for delta, packed in RECORD.iter_unpack(data[HEADER.size:]):
+		step += delta
+		kind = packed >> 4
+		if kind != KIND_WAIT:
+			records.append(ReplayRecord(step, kind, packed & 0x0F))
+	return ReplayLog(MODES[mode], seed, physics_rate, bool(flags & FLAG_TOURNAMENT), bool(flags & FLAG_LOCAL), records)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+from api.db_utils import queue_game_result, persist_game_results
+
+class GameResult(NamedTuple):
+	"""Everything a finished game writes to the database, players as user ids."""
+	game_id: int
+	game_mode: str
+	ranked: bool
+	# bot games leave no history
+	discard: bool
+	player_left: Optional[int]
+	player_right: Optional[int]
+	score_left: int
+	score_right: int
+	winner: Optional[int]
+	elo_change: int
+	seed: Optional[int]
+	# [achievement id, progression, unlocked] rows, see AchievementTracker
+	achievements_left: list
+	achievements_right: list
+	replay: Optional[bytes]
+
+	def payload(self):
+		payload = self._asdict()
+		del payload["replay"]
+		return payload
+
+class GameResultWriter:
+	"""Write-behind persistence of finished games.
+
+	submit() stores the result in the QueuedGameResult table, a single insert,
+	and returns; a background task then applies it (history row, statistics,
+	achievements and the players' current game) in one transaction. A result that fails
+	stays queued and is retried with backoff. Results left queued by a
+	restarted worker are picked up by start(), called once the worker has an
+	event loop.
+	"""
+	BATCH_SIZE = 20
+	POLL_INTERVAL = 5.0
+	MAX_BACKOFF = 300
+
+	def __init__(self):
+		self.logger = logging.getLogger('game')
+		self.task = None
+		self.started = False
+		self.wakeup = asyncio.Event()
+
+	def start(self):
+		if self.started:
+			return
+		self.started = True
+		if self.task is None or self.task.done():
+			self.task = asyncio.create_task(self.run())
+
+	async def submit(self, result):
+		if not await queue_game_result(result.game_id, result.payload(), result.replay):
+			self.logger.warning(f"Result of game {result.game_id} was already queued, ignoring the new one")
+		self.wakeup.set()
+		if self.task is None or self.task.done():
+			self.task = asyncio.create_task(self.run())
+
+	async def run(self):
+		try:
+			while True:
+				self.wakeup.clear()
+				try:
+					due, pending = await persist_game_results(self.BATCH_SIZE, self.MAX_BACKOFF)
+				except Exception as e:
+					self.logger.error(f"Error in game result writer: {e}")
+					due, pending = 0, True
+				if due == self.BATCH_SIZE or self.wakeup.is_set():
+					continue
+				if not pending:
+					break
+				try:
+					await asyncio.wait_for(self.wakeup.wait(), self.POLL_INTERVAL)
+				except asyncio.TimeoutError:
+					pass
+		except asyncio.CancelledError:
+			self.logger.info("Game result writer stopped")
+		finally:
+			self.task = None
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from Game.consumer import GameConsumer
 from Game.tournament_consumer import TournamentConsumer
+from Game.replay_consumer import ReplayConsumer
 # the empty string routes to ChatConsumer, which manages the chat functionality.
 websocket_urlpatterns = [
     path('', GameConsumer.as_asgi()),
@@ -10,3 +11,7 @@ websocket_urlpatternsTournament = [
     path('', TournamentConsumer.as_asgi()),
 ]
 
+websocket_urlpatternsReplay = [
+    path('', ReplayConsumer.as_asgi()),
+]
+
@@ -1,4 +1,3 @@
-import random
 import math
 import logging
 from .game_helper_class import BounceMethods, MovementMethod, Vector2D
@@ -13,7 +12,7 @@ class NormalBounce(BounceMethods):
 		else:
 			ball.position.y = ball.bounds.bottom.y + ball.radius
 
-	async def BouncePaddle(self, ball, paddle_x, paddle_y):
+	def BouncePaddle(self, ball, paddle_x, paddle_y):
 		relative_intersect_y = paddle_y - ball.position.y
 		normalized_intersect = relative_intersect_y / (4.0/2)
 		bounce_angle = normalized_intersect * math.radians(45)
@@ -38,8 +37,9 @@ class MirrorBounce(BounceMethods):
 			ball.position.y = ball.bounds.bottom.y + ball.radius
 		else:
 			ball.position.y = ball.bounds.top.y - ball.radius
+		ball.trajectory.invalidate()
 
-	async def BouncePaddle(self, ball, paddle_x, paddle_y):
+	def BouncePaddle(self, ball, paddle_x, paddle_y):
 		relative_intersect_y = paddle_y - ball.position.y
 		normalized_intersect = relative_intersect_y / (4.0/2)
 		bounce_angle = normalized_intersect * math.radians(45)
@@ -56,7 +56,7 @@ class MirrorBounce(BounceMethods):
 
 class RandomBounce(BounceMethods):
 	def BounceWall(self, ball, is_top):
-		random_angle = random.uniform(-80, 80)
+		random_angle = ball.rng.uniform(-80, 80)
 		random_angle_rad = math.radians(random_angle)
 
 		ball.velocity.y *= -1
@@ -72,8 +72,8 @@ class RandomBounce(BounceMethods):
 		else:
 			ball.position.y = ball.bounds.bottom.y + ball.radius
 
-	async def BouncePaddle(self, ball, paddle_x, paddle_y):
-		random_angle = random.uniform(-80, 80)
+	def BouncePaddle(self, ball, paddle_x, paddle_y):
+		random_angle = ball.rng.uniform(-80, 80)
 		random_angle_rad = math.radians(random_angle)
 
 		if paddle_x < ball.position.x:
@@ -100,11 +100,11 @@ class KillerBall(BounceMethods):
 		else:
 			ball.position.y = ball.bounds.bottom.y + ball.radius
 
-	async def BouncePaddle(self, ball, paddle_x, paddle_y):
+	def BouncePaddle(self, ball, paddle_x, paddle_y):
 		if paddle_x < ball.position.x:
-			await self.game.on_score("RIGHT")
+			self.game.on_score("RIGHT")
 		else:  # Left paddle
-			await self.game.on_score("LEFT")
+			self.game.on_score("LEFT")
 
 ################### MOVEMENT METHOD ###################
 
@@ -125,7 +125,8 @@ class IcyMovement(MovementMethod):
 	r_speed = 0
 
 	def calculate_movement(self, input_direction: int, speed: float, delta_time: float) -> float:
-		drag = speed * 0.03
+		# drag was tuned per 60 Hz frame, scale it so it does not depend on the physics rate
+		drag = speed * 0.03 * delta_time * 60
 		logging.getLogger('game').info(f"dir : {input_direction}")
 		if (input_direction != 0):
 			self.r_speed = speed * input_direction
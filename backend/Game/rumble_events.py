@@ -1,9 +1,6 @@
-import asyncio
-import random
 import logging
 from abc import ABC, abstractmethod
 
-from asyncio.base_events import time
 from .game_helper_class import DEFAULT_BALL_ACCELERATION, DEFAULT_BALL_BASE_SPEED, DEFAULT_PLAYER_SPEED
 from .rumble_custom_method import MirrorBounce, RandomBounce, IcyMovement, InvertedMovements, NoStoppingMovements, NormalBounce, NormalMovements, KillerBall
 
@@ -35,6 +32,10 @@ class GameEvent(ABC):
 	def apply_specific(self):
 		pass
 
+	def update(self, delta_time):
+		"""Called every physics step while the event is active."""
+		pass
+
 	def revert(self):
 		self.revert_common()
 		self.revert_specific()
@@ -159,32 +160,33 @@ class ReverseBallEvent(GameEvent):
 		self.player_speed_mult = 1
 		self.ball_maxspeed_mult = 1
 
-		self.reverse_task = None
+		self.reverse_countdown = None
+		self.first_reverse_delay = 5
 		self.normal_reverse_interval = (3, 6)
 		self.fast_reverse_interval = (1, 3)
 		self.fast_chance = 0.2
 
-	async def reverse_ball_direction(self):
-		try:
-			await asyncio.sleep(5)
-			while True:
-				if (random.random() < self.fast_chance):
-					self.reverse_interval = random.uniform(*self.fast_reverse_interval)
-				else:
-					self.reverse_interval = random.uniform(*self.normal_reverse_interval)
-				await asyncio.sleep(self.reverse_interval)
-				self.game.ball.velocity.x *= -1.5
-				self.game.ball.velocity.y *= -1.5
-		except asyncio.CancelledError:
-			self.game.logger.info("Reverse ball direction task cancelled")
+	def next_reverse_interval(self):
+		rng = self.game.rng
+		if (rng.random() < self.fast_chance):
+			return rng.uniform(*self.fast_reverse_interval)
+		return rng.uniform(*self.normal_reverse_interval)
+
+	def update(self, delta_time):
+		if self.reverse_countdown is None:
+			return
+		self.reverse_countdown -= delta_time
+		if self.reverse_countdown <= 0:
+			self.game.ball.velocity.x *= -1.5
+			self.game.ball.velocity.y *= -1.5
+			self.game.ball.trajectory.invalidate()
+			self.reverse_countdown += self.next_reverse_interval()
 
 	def apply_specific(self):
-		self.reverse_task = asyncio.create_task(self.reverse_ball_direction())
+		self.reverse_countdown = self.first_reverse_delay + self.next_reverse_interval()
 
 	def revert_specific(self):
-		if self.reverse_task:
-			self.reverse_task.cancel()
-			self.reverse_task = None
+		self.reverse_countdown = None
 
 
 class ShrinkingPaddleEvent(GameEvent):
@@ -246,10 +248,10 @@ class KillerBallEvent(GameEvent):
 
 	def apply_specific(self):
 		self.game.ball.bounce_methods = KillerBall(self.game)
-		self.killer_ball_start_time = time.time() + 5
+		self.killer_ball_start_time = self.game.sim_time + 5
 
 	def revert_specific(self):
-		survived_time = time.time() - self.killer_ball_start_time
+		survived_time = self.game.sim_time - self.killer_ball_start_time
 		if (survived_time > self.game.highestKillerSurvive):
 			self.game.highestKillerSurvive = survived_time
 		self.game.ball.bounce_methods = NormalBounce()
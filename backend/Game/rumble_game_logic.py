@@ -3,23 +3,29 @@ import time
 import random
 import math
 import logging
-from .game_helper_class import BounceMethods, MovementMethod, Vector2D, DEFAULT_BALL_POS, RIGHT_SIDE_DIR, LEFT_SIDE_DIR, DEFAULT_BALL_ACCELERATION, DEFAULT_BALL_BASE_SPEED, DEFAULT_PLAYER_SPEED, random_angle
+from .game_helper_class import BounceMethods, MovementMethod, Vector2D, DEFAULT_BALL_POS, RIGHT_SIDE_DIR, LEFT_SIDE_DIR, DEFAULT_BALL_ACCELERATION, DEFAULT_BALL_BASE_SPEED, DEFAULT_PLAYER_SPEED, random_angle, FixedTimestep, TrajectoryPredictor
+from .input_buffer import InputBuffer
+from .replay_log import ReplayRecorder, KIND_EVENT, KIND_FORFEIT
+from .swept_collision import sweep_ball, WALL_TOP, WALL_BOTTOM, PADDLE_RIGHT, PADDLE_LEFT, GOAL_RIGHT, GOAL_LEFT
 from .rumble_custom_method import MirrorBounce, RandomBounce, IcyMovement, InvertedMovements, NoStoppingMovements, NormalBounce, NormalMovements, KillerBall
 from .rumble_events import InvertedControlsEvent, RandomBouncesEvent, MirrorBallEvent, LightsOutEvent, InvisibilityFieldEvent, ReverseBallEvent, ShrinkingPaddleEvent, IcyPaddlesEvent, NoStoppingEvent, VisibleTrajectoryEvent, KillerBallEvent, BreathingTimeEvent, SupersonicBallEvent, InfiniteSpeedEvent, RampingBallEvent
 
 
 
 class Ball:
-	def __init__(self):
-		self.position = DEFAULT_BALL_POS
+	__slots__ = ('position', 'velocity', 'trajectory', 'baseSpeed', 'speed', 'reaction_time', 'maxSpeed', 'baseMaxSpeed', 'radius', 'bounds', 'countdown', 'visible', 'is_moving', 'acceleration', 'rng', 'highestSpeed', 'bounce_methods', 'lastHitter')
+
+	def __init__(self, bounds=None, rng=None):
+		self.position = DEFAULT_BALL_POS.copy()
+		self.rng = rng if rng is not None else random.Random()
 		self.velocity = Vector2D()
+		self.bounds = bounds if bounds is not None else GameBounds()
 		self.baseSpeed = DEFAULT_BALL_BASE_SPEED
 		self.speed = self.baseSpeed
 		self.reaction_time = 0.2
 		self.maxSpeed = self.calculate_max_safe_speed()
 		self.baseMaxSpeed = self.calculate_max_safe_speed()
 		self.radius = 0.5
-		self.bounds = GameBounds()
 		self.countdown = 6
 		self.visible = False
 		self.is_moving = False
@@ -27,9 +33,10 @@ class Ball:
 		self.highestSpeed = 0
 		self.bounce_methods = NormalBounce()
 		self.lastHitter = "NONE"
+		self.trajectory = TrajectoryPredictor(self.position, self.velocity, self.radius, self.bounds)
 
 	def calculate_max_safe_speed(self, paddle_speed=35):
-		bounds = GameBounds()
+		bounds = self.bounds
 		court_height = bounds.top.y - bounds.bottom.y
 		court_width = bounds.right.x - bounds.left.x
 		max_paddle_travel = court_height - 5.006
@@ -42,32 +49,17 @@ class Ball:
 	def predict_trajectory(self):
 		if not self.is_moving:
 			return []
-		points = []
-		sim_pos = Vector2D(self.position.x, self.position.y, self.position.z)
-		sim_vel = Vector2D(self.velocity.x, self.velocity.y, self.velocity.z)
-
-		for _ in range(200):
-			points.append(Vector2D(sim_pos.x, sim_pos.y, sim_pos.z))
-			next_x = sim_pos.x + sim_vel.x * 0.016  # 0.016 is roughly 1 frame at 60fps
-			next_y = sim_pos.y + sim_vel.y * 0.016
-			if next_y >= self.bounds.top.y - self.radius or next_y <= self.bounds.bottom.y + self.radius:
-				sim_vel.y *= -1
-			sim_pos.x = next_x
-			sim_pos.y = next_y
-			if sim_pos.x <= self.bounds.left.x or sim_pos.x >= self.bounds.right.x:
-				break
-		return points
+		return self.trajectory.path()
 
 	def start(self, startDir, ballPos):
 		direction = startDir
-		angle = random.uniform(-5, 5)
+		angle = self.rng.uniform(-5, 5)
 		angle_rad = math.radians(angle)
 
-		self.velocity = Vector2D()
 		self.speed = self.baseSpeed
-		self.velocity.x = direction * self.speed * math.cos(angle_rad)
-		self.velocity.y = self.speed * math.sin(angle_rad)
-		self.position = Vector2D(ballPos.x, ballPos.y, ballPos.z)
+		self.velocity.set(direction * self.speed * math.cos(angle_rad), self.speed * math.sin(angle_rad), 0.0)
+		self.position.copy_from(ballPos)
+		self.trajectory.invalidate()
 
 	def start_movement(self):
 		self.is_moving = True
@@ -82,6 +74,8 @@ class Ball:
 
 
 class Player:
+	__slots__ = ('position', 'score', 'keys', 'paddle_speed', 'paddle_height', 'paddle_thickness', 'movable', 'game_bounds', 'movement_method', 'highestShrinkPaddle', 'currentShrinkPaddle')
+
 	def __init__(self, position, score, keys, game_bounds):
 		self.position = position
 		self.score = score
@@ -91,7 +85,6 @@ class Player:
 		self.paddle_thickness = 0.8
 		self.movable = False
 		self.game_bounds = game_bounds
-		self.startPos = Vector2D(0, 0, 0)
 		self.movement_method = NormalMovements()
 		self.highestShrinkPaddle = 0
 		self.currentShrinkPaddle = 0
@@ -111,6 +104,8 @@ class Player:
 								self.game_bounds.top.y - self.paddle_height/2 - 0.1)
 
 class GameBounds:
+	__slots__ = ('top', 'bottom', 'left', 'right')
+
 	def __init__(self):
 		self.top = Vector2D(0, 10.56+10.5, -15)
 		self.bottom = Vector2D(0, -17.89+10.5, -15)
@@ -118,7 +113,17 @@ class GameBounds:
 		self.right = Vector2D(20.42, -3.70+10.5, -15)
 
 class RumbleGameInstance:
-	def __init__(self, broadcast_fun, revert_event_fun, game_end_fun, achievement_checker_fun, tournament, local):
+	PHYSICS_RATE = 60
+	BROADCAST_RATE = 60
+	MAX_CATCHUP_STEPS = 15
+
+	def __init__(self, broadcast_fun, event_fun, tournament, local, seed=None):
+		# every random draw of the game comes from its own generator, the seed is stored with the game history
+		self.seed = seed if seed is not None else random.getrandbits(32)
+		self.rng = random.Random(self.seed)
+		# physics steps since start, the replay log is indexed on them
+		self.step_count = 0
+		self.recorder = ReplayRecorder("rumble", self.seed, self.PHYSICS_RATE, tournament, local)
 		self.bounds = GameBounds()
 		self.local = local
 		self.event_weights = {
@@ -140,11 +145,13 @@ class RumbleGameInstance:
 		}
 		self.player_left = Player(Vector2D(self.bounds.left.x + 2, -3+10.5, -15), 0,{"ArrowUp": False, "ArrowDown": False, "W" : False, "S" : False}, self.bounds)
 		self.player_right = Player(Vector2D(self.bounds.right.x - 2, -3+10.5, -15), 0,{"ArrowUp": False, "ArrowDown": False, "W" : False, "S" : False}, self.bounds)
-		self.ball = Ball()
+		self.ball = Ball(self.bounds, self.rng)
 		self.tournament = tournament
 		self.original_ball_acceleration = self.ball.acceleration
 		self.original_ball_base_speed = self.ball.baseSpeed
 		self.original_player_speed = DEFAULT_PLAYER_SPEED
+		# simulated seconds, events time themselves on it instead of the wall clock
+		self.sim_time = 0.0
 		self.event = self.get_event()
 		self.event.apply()
 		self.paused = False
@@ -152,115 +159,100 @@ class RumbleGameInstance:
 		self.scorer = None
 		self.winner = None
 		self.is_running = False
-		self.last_update_time = time.time()
-		self.loop_task = None
+		self.clock = FixedTimestep(self.PHYSICS_RATE, self.BROADCAST_RATE, self.MAX_CATCHUP_STEPS)
 		self.scored = False
 		self.scorePos = Vector2D(0,0,0)
 		self.maxScore = 10
 		self.maxScoreLimit = 50
 		self.broadcast_function = broadcast_fun
-		self.game_end_fun = game_end_fun
 		self.logger = logging.getLogger('game')
 		self.announceEvent = True
 		self.highestKillerSurvive = 0
-		self.revert_event_fun = revert_event_fun
-		self.achievement_checker_fun = achievement_checker_fun
+		self.event_fun = event_fun
+		self.pending_events = []
+		# key inputs wait here for the next tick boundary, the game scheduler applies them
+		self.inputs = InputBuffer()
 
-	async def check_collisions(self):
+	def on_contact(self, contact):
 		ball = self.ball
-		ball_pos = ball.position
-		paddle_hit = False
 
-		if ball_pos.y >= self.bounds.top.y - ball.radius:
+		if contact == WALL_TOP:
 			ball.bounce_methods.BounceWall(ball, True)
 			self.logger.info(f"Ball speed : {ball.speed}")
-		elif ball_pos.y <= self.bounds.bottom.y + ball.radius:
+		elif contact == WALL_BOTTOM:
 			ball.bounce_methods.BounceWall(ball, False)
 			self.logger.info(f"Ball speed : {ball.speed}")
+		elif contact == PADDLE_RIGHT:
+			right_paddle = self.player_right
+			ball.position.x = right_paddle.position.x - right_paddle.paddle_thickness/2 - ball.radius
+			ball.bounce_methods.BouncePaddle(ball, right_paddle.position.x, right_paddle.position.y)
+			if (self.ball.highestSpeed < ball.speed):
+				self.ball.highestSpeed = ball.speed
+			self.logger.info(f"Ball speed : {ball.speed}")
 
-		right_paddle = self.player_right
-		if (ball_pos.x <= right_paddle.position.x + right_paddle.paddle_thickness/2 + ball.radius and
-			ball_pos.x >= right_paddle.position.x - right_paddle.paddle_thickness/2 - ball.radius):
-			if (abs(ball_pos.y - right_paddle.position.y) <=
-				right_paddle.paddle_height/2 + ball.radius):
-					if ball.velocity.x > 0:
-						ball.position.x = right_paddle.position.x - right_paddle.paddle_thickness/2 - ball.radius
-						await ball.bounce_methods.BouncePaddle(ball, right_paddle.position.x, right_paddle.position.y)
-						if (self.ball.highestSpeed < ball.speed):
-							self.ball.highestSpeed = ball.speed
-						self.logger.info(f"Ball speed : {ball.speed}")
-
-						if (self.event.name == 'Shrinking Paddles' and self.player_right.paddle_height > 2.25):
-							self.player_right.paddle_height *= 0.9
-							self.player_right.currentShrinkPaddle += 1
-							if (self.player_right.highestShrinkPaddle < self.player_right.currentShrinkPaddle):
-								self.player_right.highestShrinkPaddle = self.player_right.currentShrinkPaddle
-							self.event.action = 'shrinkRight'
-						ball.lastHitter = "RIGHT"  # Add this line
-						paddle_hit = True
-
-		left_paddle = self.player_left
-		if (ball_pos.x >= left_paddle.position.x - left_paddle.paddle_thickness/2 - ball.radius and
-			ball_pos.x <= left_paddle.position.x + left_paddle.paddle_thickness/2 + ball.radius):
-				if (abs(ball_pos.y - left_paddle.position.y) <=
-				left_paddle.paddle_height/2 + ball.radius):
-					if ball.velocity.x < 0:
-						ball.position.x = left_paddle.position.x + left_paddle.paddle_thickness/2 + ball.radius
-						await ball.bounce_methods.BouncePaddle(ball, left_paddle.position.x, left_paddle.position.y)
-						if (self.ball.highestSpeed < ball.speed):
-							self.ball.highestSpeed = ball.speed
-						self.logger.info(f"Ball speed : {ball.speed}")
-
-						if (self.event.name == 'Shrinking Paddles' and self.player_left.paddle_height > 2.25):
-							self.player_left.paddle_height *= 0.9
-							self.player_left.currentShrinkPaddle += 1
-							if (self.player_left.highestShrinkPaddle < self.player_left.currentShrinkPaddle):
-								self.player_left.highestShrinkPaddle = self.player_left.currentShrinkPaddle
-							self.event.action = 'shrinkLeft'
-						ball.lastHitter = "LEFT"  # Add this line
-						paddle_hit = True
-
-		if not paddle_hit:
-			if ball_pos.x >= self.bounds.right.x:
-				if (self.event.name == 'Killer Ball'):
-					random_angle(ball)
-					ball.position.x = ball.bounds.right.x - ball.radius
-					if (self.ball.highestSpeed < ball.speed):
-						self.ball.highestSpeed = ball.speed
-					self.ball.lastHitter = "RIGHT"
-					self.logger.info(f"Ball speed : {ball.speed}")
-				else:
-					await self.on_score("LEFT")
-			elif ball_pos.x <= self.bounds.left.x:
-				if (self.event.name == 'Killer Ball'):
-					random_angle(ball)
-					if (self.ball.highestSpeed < ball.speed):
-						self.ball.highestSpeed = ball.speed
-					ball.position.x = ball.bounds.left.x + ball.radius
-					self.ball.lastHitter = "LEFT"
-					self.logger.info(f"Ball speed : {ball.speed}")
-				else:
-					await self.on_score("RIGHT")
+			if (self.event.name == 'Shrinking Paddles' and self.player_right.paddle_height > 2.25):
+				self.player_right.paddle_height *= 0.9
+				self.player_right.currentShrinkPaddle += 1
+				if (self.player_right.highestShrinkPaddle < self.player_right.currentShrinkPaddle):
+					self.player_right.highestShrinkPaddle = self.player_right.currentShrinkPaddle
+				self.event.action = 'shrinkRight'
+			ball.lastHitter = "RIGHT"
+			self.pending_events.append({"type": "paddle_hit", "side": "RIGHT"})
+		elif contact == PADDLE_LEFT:
+			left_paddle = self.player_left
+			ball.position.x = left_paddle.position.x + left_paddle.paddle_thickness/2 + ball.radius
+			ball.bounce_methods.BouncePaddle(ball, left_paddle.position.x, left_paddle.position.y)
+			if (self.ball.highestSpeed < ball.speed):
+				self.ball.highestSpeed = ball.speed
+			self.logger.info(f"Ball speed : {ball.speed}")
 
-	async def on_score(self, winner):
+			if (self.event.name == 'Shrinking Paddles' and self.player_left.paddle_height > 2.25):
+				self.player_left.paddle_height *= 0.9
+				self.player_left.currentShrinkPaddle += 1
+				if (self.player_left.highestShrinkPaddle < self.player_left.currentShrinkPaddle):
+					self.player_left.highestShrinkPaddle = self.player_left.currentShrinkPaddle
+				self.event.action = 'shrinkLeft'
+			ball.lastHitter = "LEFT"
+			self.pending_events.append({"type": "paddle_hit", "side": "LEFT"})
+		elif contact == GOAL_RIGHT:
+			if (self.event.name == 'Killer Ball'):
+				random_angle(ball)
+				ball.position.x = ball.bounds.right.x - ball.radius
+				if (self.ball.highestSpeed < ball.speed):
+					self.ball.highestSpeed = ball.speed
+				self.ball.lastHitter = "RIGHT"
+				self.logger.info(f"Ball speed : {ball.speed}")
+			else:
+				self.on_score("LEFT")
+		elif contact == GOAL_LEFT:
+			if (self.event.name == 'Killer Ball'):
+				random_angle(ball)
+				if (self.ball.highestSpeed < ball.speed):
+					self.ball.highestSpeed = ball.speed
+				ball.position.x = ball.bounds.left.x + ball.radius
+				self.ball.lastHitter = "LEFT"
+				self.logger.info(f"Ball speed : {ball.speed}")
+			else:
+				self.on_score("RIGHT")
+
+	def on_score(self, winner):
 		self.logger.info('on score called')
 		self.event.revert()
 		self.logger.info('on score event after revert')
-		await self.revert_event_fun()
-		self.logger.info('on score event after async revert')
+		self.pending_events.append({"type": "event_revert", "event": self.event})
 		self.event = self.get_event()
 		self.event.apply()
 		self.logger.info('on score event after')
 
 		if winner == "LEFT":
 			self.player_left.score += 1
-			self.scorePos = Vector2D(self.ball.position.x, self.ball.position.y, self.ball.position.z)
+			self.scorePos.copy_from(self.ball.position)
 			self.ball.start(LEFT_SIDE_DIR, DEFAULT_BALL_POS)
 			self.ball.lastHitter = "RIGHT"
 			self.scorer = "LEFT"
 		elif winner == "RIGHT":
 			self.player_right.score += 1
-			self.scorePos = Vector2D(self.ball.position.x, self.ball.position.y, self.ball.position.z)
+			self.scorePos.copy_from(self.ball.position)
 			self.ball.start(RIGHT_SIDE_DIR, DEFAULT_BALL_POS)
 			self.ball.lastHitter = "LEFT"
 			self.scorer = "RIGHT"
@@ -275,10 +267,10 @@ class RumbleGameInstance:
 		self.ball.is_moving = False
 		self.ball.countdown = 5
 		self.scored = True
-		await self.achievement_checker_fun()
+		self.pending_events.append({"type": "score", "side": winner})
 
 		if (self.check_winner(winner)):
-			await self.on_game_end(winner)
+			self.on_game_end(winner)
 
 	def check_winner(self, winner):
 		score_left = self.player_left.score
@@ -296,74 +288,78 @@ class RumbleGameInstance:
 		return False
 
 	async def forfeit(self, side):
+		self.recorder.record(self.step_count, KIND_FORFEIT, 0 if side == "LEFT" else 1)
 		if (side == "LEFT"):
 			self.logger.info("Player left forfeited")
-			await self.on_game_end("RIGHT")
+			self.on_game_end("RIGHT")
 		else:
 			self.logger.info("Player right forfeited")
-			await self.on_game_end("LEFT")
+			self.on_game_end("LEFT")
+		await self.dispatch_events()
 
-	async def on_game_end(self, winner):
+	def on_game_end(self, winner):
 		self.logger.info("Game ended")
 		self.stop()
 		self.winner = winner
 		self.ended = True
-		await self.achievement_checker_fun()
-		await self.game_end_fun()
+		self.pending_events.append({"type": "game_end", "winner": winner})
+
+	async def dispatch_events(self):
+		if not self.pending_events:
+			return
+		events = self.pending_events
+		self.pending_events = []
+		await self.event_fun(events)
 
 	def start(self):
 		self.is_running = True
-		self.last_update_time = time.time()
-		self.ball.start(random.choice([LEFT_SIDE_DIR, RIGHT_SIDE_DIR]), DEFAULT_BALL_POS)
-		self.loop_task = asyncio.create_task(self.game_loop())
+		self.clock.reset()
+		self.ball.start(self.rng.choice([LEFT_SIDE_DIR, RIGHT_SIDE_DIR]), DEFAULT_BALL_POS)
 
 	def stop(self):
 		self.is_running = False
 
-	async def game_loop(self):
+	def step(self, delta_time):
+		if (self.ball.countdown >= 0.3):
+			self.player_left.movable = False
+			self.player_right.movable = False
+		else:
+			self.player_left.movable = True
+			self.player_right.movable = True
+		self.sim_time += delta_time
+		self.event.update(delta_time)
+		self.player_left.update(delta_time)
+		self.player_right.update(delta_time)
+		self.ball.update(delta_time)
+
+		if self.ball.is_moving:
+			sweep_ball(self, delta_time)
+
+	def advance_clock(self, now):
+		steps = self.clock.advance(now)
+		if self.paused:
+			self.clock.reset(now)
+			return 0
+		# inputs and bot moves of this tick are in, log the key state the steps will run with
+		self.recorder.record_keys(self.step_count, self.player_left.keys, self.player_right.keys)
+		self.step_count += steps
+		return steps
+
+	def advance(self, now):
+		"""Runs the physics steps due at now, their events wait in pending_events."""
+		for _ in range(self.advance_clock(now)):
+			self.step(self.clock.step)
+			if not self.is_running:
+				break
+
+	def broadcast_due(self):
+		return not self.paused and self.clock.should_broadcast() and self.is_running
+
+	async def broadcast(self):
 		try:
-			while self.is_running:
-				current_time = time.time()
-				delta_time = current_time - self.last_update_time
-				self.last_update_time = current_time
-				if (self.ball.countdown >= 0.3):
-					self.player_left.movable = False
-					self.player_right.movable = False
-				else:
-					self.player_left.movable = True
-					self.player_right.movable = True
-
-				if not self.paused:
-					self.player_left.update(delta_time)
-					self.player_right.update(delta_time)
-					self.ball.update(delta_time)
-
-					remaining_time = delta_time
-					step_size = 1/240
-					#accumulated_step = 0
-					while remaining_time > 0:
-						current_step = min(step_size, remaining_time)
-						#accumulated_step += current_step
-
-						if self.ball.is_moving:
-							self.ball.position.x += self.ball.velocity.x * current_step
-							self.ball.position.y += self.ball.velocity.y * current_step
-
-						await (self.check_collisions())
-
-						remaining_time -= current_step
-					try:
-						if (self.is_running):
-							await (self.broadcast_function())
-					except Exception as e:
-						logging.getLogger('game').info(f"Error Broadcast : {e}")
-						pass
-				await asyncio.sleep(max(0, 1/60 - (time.time() - current_time)))  # 60 FPS
-
-		except asyncio.CancelledError:
-			print(f"Game stopped")
+			await (self.broadcast_function())
 		except Exception as e:
-			print(f"Error in game loop: {e}")
+			logging.getLogger('game').info(f"Error Broadcast : {e}")
 
 	def get_event(self):
 		events = [
@@ -392,10 +388,11 @@ class RumbleGameInstance:
 			cumulative_sum += weight
 			cumulative_weights.append((cumulative_sum, event))
 		
-		random_choice = random.uniform(0, total_weight)
+		random_choice = self.rng.uniform(0, total_weight)
 
-		for cumulative_weight, event in cumulative_weights:
+		for index, (cumulative_weight, event) in enumerate(cumulative_weights):
 			if random_choice <= cumulative_weight:
+				self.recorder.record(self.step_count, KIND_EVENT, index)
 				if (self.event_weights[self.get_event_name(event)] / 2 <= 1):
 					self.event_weights[self.get_event_name(event)] = 1
 				else:
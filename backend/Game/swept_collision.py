@@ -0,0 +1,97 @@
+import logging
+import math
+
+WALL_TOP = 0
+WALL_BOTTOM = 1
+PADDLE_RIGHT = 2
+PADDLE_LEFT = 3
+GOAL_RIGHT = 4
+GOAL_LEFT = 5
+
+MAX_CONTACTS = 8
+
+def slab_interval(pos, vel, low, high):
+	if vel == 0:
+		if low <= pos <= high:
+			return -math.inf, math.inf
+		return math.inf, -math.inf
+	t0 = (low - pos) / vel
+	t1 = (high - pos) / vel
+	if t0 > t1:
+		return t1, t0
+	return t0, t1
+
+def wall_time(ball, bounds, is_top):
+	if is_top:
+		if ball.velocity.y <= 0:
+			return math.inf
+		return max(0.0, (bounds.top.y - ball.radius - ball.position.y) / ball.velocity.y)
+	if ball.velocity.y >= 0:
+		return math.inf
+	return max(0.0, (bounds.bottom.y + ball.radius - ball.position.y) / ball.velocity.y)
+
+def paddle_time(ball, player, direction):
+	"""Time at which the ball enters the paddle rectangle grown by the ball radius, inf if it does not."""
+	if ball.velocity.x * direction <= 0:
+		return math.inf
+	reach_x = player.paddle_thickness/2 + ball.radius
+	reach_y = player.paddle_height/2 + ball.radius
+	tx0, tx1 = slab_interval(ball.position.x, ball.velocity.x, player.position.x - reach_x, player.position.x + reach_x)
+	ty0, ty1 = slab_interval(ball.position.y, ball.velocity.y, player.position.y - reach_y, player.position.y + reach_y)
+	enter = max(tx0, ty0, 0.0)
+	if enter > min(tx1, ty1):
+		return math.inf
+	return enter
+
+def goal_time(ball, bounds, is_right):
+	if is_right:
+		if ball.velocity.x <= 0:
+			return math.inf
+		return max(0.0, (bounds.right.x - ball.position.x) / ball.velocity.x)
+	if ball.velocity.x >= 0:
+		return math.inf
+	return max(0.0, (bounds.left.x - ball.position.x) / ball.velocity.x)
+
+def next_contact(game, remaining):
+	ball = game.ball
+	bounds = game.bounds
+	times = (
+		wall_time(ball, bounds, True),
+		wall_time(ball, bounds, False),
+		paddle_time(ball, game.player_right, 1),
+		paddle_time(ball, game.player_left, -1),
+		goal_time(ball, bounds, True),
+		goal_time(ball, bounds, False),
+	)
+	best_time = remaining
+	best_contact = None
+	for contact, toi in enumerate(times):
+		if toi <= best_time and (best_contact is None or toi < times[best_contact]):
+			best_time = toi
+			best_contact = contact
+	return best_time, best_contact
+
+def sweep_ball(game, delta_time):
+	"""Moves the ball through delta_time, stopping at every contact on the way.
+
+	Each contact is resolved by game.on_contact before the ball continues
+	with its new velocity, so a fast ball can never skip over a paddle.
+	Past MAX_CONTACTS the rest of the step is dropped: the ball stays where
+	its last contact left it, inside the court, and moves on next step.
+	Returns the dropped time, 0 when the whole step was run.
+	"""
+	ball = game.ball
+	remaining = delta_time
+	for _ in range(MAX_CONTACTS):
+		toi, contact = next_contact(game, remaining)
+		ball.position.x += ball.velocity.x * toi
+		ball.position.y += ball.velocity.y * toi
+		if contact is None:
+			return 0.0
+		remaining -= toi
+		game.on_contact(contact)
+		if not ball.is_moving or not game.is_running:
+			return 0.0
+	if remaining > 0:
+		logging.getLogger('game').warning(f"Ball made {MAX_CONTACTS} contacts in one step, dropping the last {remaining:.6f}s of it")
+	return remaining
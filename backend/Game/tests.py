@@ -1,3 +1,716 @@
-from django.test import TestCase
+import asyncio
+import math
+import random
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from api.models import GameHistory, User
+from api.consumers.game_history import history_page, encode_cursor, decode_cursor
+from .achievements import AchievementTracker
+from .consumer import GameConsumer
+from .frame_codec import BinaryFrameCodec
+from .frame_delta import ATOMIC_FIELDS, STATE_FIELDS, DeltaEncoder
+from .game_backend import GameBackend
+from .game_helper_class import DEFAULT_BALL_POS, TrajectoryPredictor
+from .game_scheduler import GameScheduler
+from .normal_game_logic import ClassicGameInstance
+from .outbox import FrameOutbox, merge_frames
+from .replay_consumer import ReplayBackend, ReplayConsumer
+from .replay_log import read_replay
+from .results import GameResultWriter
+from .rumble_events import InfiniteSpeedEvent, MirrorBallEvent, ReverseBallEvent
+from .rumble_game_logic import RumbleGameInstance
+from .swept_collision import GOAL_LEFT, GOAL_RIGHT, MAX_CONTACTS, PADDLE_LEFT, PADDLE_RIGHT, WALL_BOTTOM, WALL_TOP, sweep_ball
 
-# Create your tests here.
+SEEDED_PLAYERS = 10000
+SEEDED_GAMES = 1000000
+
+@skipUnless(connection.vendor == 'postgresql', "query plans are only meaningful on PostgreSQL")
+class GameHistoryQueryPlanTests(TestCase):
+	"""Every hot GameHistory query must be an index scan over a 1M row table.
+
+	The table is seeded the way production fills it, almost only finished
+	games and about one waiting game in two thousand, then analyzed so the planner
+	sees its real statistics.
+	"""
+
+	@classmethod
+	def setUpTestData(cls):
+		players = User.objects.bulk_create([User(username=f"player{index}") for index in range(SEEDED_PLAYERS)])
+		with connection.cursor() as cursor:
+			cursor.execute(f"""
+				INSERT INTO {GameHistory._meta.db_table} (game_mode, game_type, game_state, elo_change, score_left, score_right,
+					player_left_id, player_right_id, winner_id, created_at, updated_at,
+					tournament_count, tournament_round2_game_id, tournament_round2_place, seed)
+				SELECT (ARRAY['classic', 'rumble'])[1 + i %% 2],
+					(ARRAY['ranked', 'ranked', 'AI', 'Invite', 'Tournament1', 'tournament'])[1 + i %% 6],
+					CASE WHEN i %% 1999 = 0 THEN 'waiting' ELSE 'finished' END,
+					0, 10, 3,
+					(%(players)s::bigint[])[1 + (i * 7919) %% %(count)s],
+					(%(players)s::bigint[])[1 + (i * 104729 + 1) %% %(count)s],
+					NULL,
+					now() - (%(games)s - i) * interval '1 second',
+					now() - (%(games)s - i) * interval '1 second',
+					0, -1, -1, i
+				FROM generate_series(1::bigint, %(games)s) AS i
+			""", {'players': [player.id for player in players], 'count': SEEDED_PLAYERS, 'games': SEEDED_GAMES})
+			cursor.execute(f"ANALYZE {GameHistory._meta.db_table}")
+		cls.waiting = GameHistory.objects.filter(game_state='waiting', game_type='tournament').select_related('player_left', 'player_right').first()
+		cls.player = cls.waiting.player_left
+
+	def assertIndexScan(self, queryset, *indexes):
+		plan = queryset.explain()
+		self.assertNotIn("Seq Scan", plan)
+		for index in indexes:
+			self.assertRegex(plan, rf"(Index (Only )?Scan (Backward )?using|Bitmap Index Scan on) {index} ", plan)
+
+	def test_waiting_game(self):
+		# GameManager.get_waiting_game, then its first()
+		self.assertIndexScan(GameHistory.objects.filter(game_state='waiting', game_mode='classic').order_by('pk')[:1], 'gamehistory_waiting_mode')
+
+	def test_invite_and_tournament_game(self):
+		# GameManager.get_invite_game and get_tournament_game
+		for game_type in ('Invite', 'Tournament1'):
+			with self.subTest(game_type=game_type):
+				self.assertIndexScan(GameHistory.objects.filter(player_left=self.waiting.player_left, player_right=self.waiting.player_right,
+					game_state='waiting', game_type=game_type).order_by('pk')[:1], 'gamehistory_waiting_players')
+
+	def test_tournament_player(self):
+		# GameManager.tournament_player, the right side is served by the right history index
+		for side, index in (('player_left', 'gamehistory_waiting_players'), ('player_right', 'gamehistory_right_history')):
+			with self.subTest(side=side):
+				self.assertIndexScan(GameHistory.objects.filter(game_state='waiting', game_type='tournament',
+					**{side: self.player}).values_list('id', flat=True).order_by('pk')[:1], index)
+
+	def test_history_page(self):
+		# GameHistoryConsumer, the first page and one behind a cursor
+		last = list(history_page(self.player, None, 20))[-1]
+		for after in (None, decode_cursor(encode_cursor(last))):
+			with self.subTest(after=after):
+				self.assertIndexScan(history_page(self.player, after, 20), 'gamehistory_left_history', 'gamehistory_right_history')
+
+class GameSchedulerTests(SimpleTestCase):
+	"""Games ticked by the scheduler play to the end and hand every event to their backend."""
+
+	def classic_game(self, event_fun):
+		async def broadcast_fun():
+			pass
+
+		game = ClassicGameInstance(broadcast_fun, event_fun, tournament=True, local=False, seed=1)
+		# both paddles parked at the top, every serve is a goal
+		game.player_left.keys["ArrowUp"] = game.player_right.keys["ArrowUp"] = True
+		game.start()
+		game.clock.reset(0.0)
+		return game
+
+	async def run_frames(self, scheduler, until, seconds=600):
+		now = 0.0
+		while not until() and now < seconds:
+			now += scheduler.frame_time
+			scheduler.tick(now)
+			# a frame of the real loop sleeps here, letting the game tasks run
+			await asyncio.sleep(0)
+
+	def assertPlayedToEnd(self, game, events):
+		self.assertFalse(game.is_running)
+		self.assertEqual(max(game.player_left.score, game.player_right.score), game.maxScore)
+		self.assertEqual(game.pending_events, [])
+		self.assertEqual(sum(event["type"] == "score" for event in events), game.player_left.score + game.player_right.score)
+		self.assertEqual(events[-1], {"type": "game_end", "winner": game.winner})
+
+	async def test_game_end_reaches_backend(self):
+		events = []
+
+		async def event_fun(batch):
+			events.extend(batch)
+
+		scheduler = GameScheduler()
+		game = self.classic_game(event_fun)
+		scheduler.games[1] = (game, None)
+		await self.run_frames(scheduler, lambda: not scheduler.games)
+		self.assertPlayedToEnd(game, events)
+
+	async def test_slow_events_do_not_hold_other_games(self):
+		release = asyncio.Event()
+		slow_events = []
+		events = []
+
+		async def slow_event_fun(batch):
+			slow_events.extend(batch)
+			await release.wait()
+
+		async def event_fun(batch):
+			events.extend(batch)
+
+		scheduler = GameScheduler()
+		slow = self.classic_game(slow_event_fun)
+		game = self.classic_game(event_fun)
+		scheduler.games[1] = (slow, None)
+		scheduler.games[2] = (game, None)
+		await self.run_frames(scheduler, lambda: 2 not in scheduler.games)
+		self.assertPlayedToEnd(game, events)
+		# the slow game kept stepping, its events waited for the first batch to be handled
+		self.assertEqual(len(slow_events), 1)
+		self.assertFalse(slow.is_running)
+		self.assertTrue(slow.pending_events)
+		release.set()
+		await self.run_frames(scheduler, lambda: not scheduler.games)
+		self.assertPlayedToEnd(slow, slow_events)
+
+async def ignore(*args):
+	pass
+
+def rumble_game(event_class):
+	"""A rumble game running event_class in place of the event it drew."""
+	game = RumbleGameInstance(ignore, ignore, tournament=True, local=False, seed=1)
+	game.event.revert()
+	game.event = event_class(game)
+	game.event.apply()
+	return game
+
+class SweptCollisionTests(SimpleTestCase):
+	"""A ball at any speed stops at every paddle and wall on its way, it never tunnels through them."""
+
+	def games(self):
+		classic = ClassicGameInstance(ignore, ignore, tournament=True, local=False, seed=1)
+		rumble = rumble_game(InfiniteSpeedEvent)
+		# the top speed Infinite Speed allows, about 12 units a step against a paddle 1.8 units deep for the ball
+		speed = rumble.ball.maxSpeed
+		for game in (classic, rumble):
+			game.is_running = True
+			game.ball.countdown = 0
+			game.ball.start_movement()
+			game.ball.speed = game.ball.maxSpeed = speed
+		return {"classic": classic, "rumble": rumble}
+
+	def launch(self, game, velocity_x, velocity_y):
+		game.ball.position.copy_from(DEFAULT_BALL_POS)
+		game.ball.velocity.set(velocity_x, velocity_y, 0.0)
+		# both paddles facing the ball, a horizontal ball bounces straight back
+		game.player_left.position.y = game.player_right.position.y = DEFAULT_BALL_POS.y
+
+	def run_steps(self, game, steps):
+		"""Steps the game, checking the ball is inside the court after each step. Returns the contacts made."""
+		ball = game.ball
+		left_face = game.player_left.position.x + game.player_left.paddle_thickness/2 + ball.radius
+		right_face = game.player_right.position.x - game.player_right.paddle_thickness/2 - ball.radius
+		with patch.object(game, "on_contact", wraps=game.on_contact) as on_contact:
+			for _ in range(steps):
+				game.step(1 / game.PHYSICS_RATE)
+				self.assertTrue(left_face <= ball.position.x <= right_face, ball.position.x)
+				self.assertTrue(game.bounds.bottom.y + ball.radius <= ball.position.y <= game.bounds.top.y - ball.radius, ball.position.y)
+		return [call.args[0] for call in on_contact.call_args_list]
+
+	def test_fast_ball_bounces_off_both_paddles(self):
+		for name, game in self.games().items():
+			with self.subTest(game=name), self.assertNoLogs("game", "WARNING"):
+				self.launch(game, game.ball.speed, 0.0)
+				contacts = self.run_steps(game, 120)
+				# across the court in under three steps, each paddle in turn and never a goal
+				self.assertGreater(len(contacts), 40)
+				self.assertEqual(contacts, [PADDLE_RIGHT, PADDLE_LEFT] * (len(contacts) // 2) + [PADDLE_RIGHT] * (len(contacts) % 2))
+				self.assertEqual((game.player_left.score, game.player_right.score), (0, 0))
+				self.assertEqual(game.pending_events[0], {"type": "paddle_hit", "side": "RIGHT"})
+
+	def test_fast_ball_bounces_off_both_walls(self):
+		for name, game in self.games().items():
+			with self.subTest(game=name), self.assertNoLogs("game", "WARNING"):
+				self.launch(game, 0.0, -game.ball.speed)
+				contacts = self.run_steps(game, 120)
+				self.assertGreater(len(contacts), 40)
+				self.assertEqual(contacts, [WALL_BOTTOM, WALL_TOP] * (len(contacts) // 2) + [WALL_BOTTOM] * (len(contacts) % 2))
+
+	def test_contacts_past_the_cap_drop_the_rest_of_the_step(self):
+		game = self.games()["classic"]
+		# far beyond any event, enough to cross the court more than MAX_CONTACTS times in a step
+		game.ball.speed = game.ball.maxSpeed = (game.bounds.right.x - game.bounds.left.x) * game.PHYSICS_RATE * MAX_CONTACTS * 2
+		self.launch(game, game.ball.speed, 0.0)
+		with patch.object(game, "on_contact", wraps=game.on_contact) as on_contact, self.assertLogs("game", "WARNING") as logs:
+			dropped = sweep_ball(game, 1 / game.PHYSICS_RATE)
+		self.assertEqual(on_contact.call_count, MAX_CONTACTS)
+		self.assertGreater(dropped, 0)
+		self.assertIn(f"{MAX_CONTACTS} contacts", logs.output[0])
+		# the ball stays where the last contact left it, against the left paddle and heading right
+		left_paddle = game.player_left
+		self.assertAlmostEqual(game.ball.position.x, left_paddle.position.x + left_paddle.paddle_thickness/2 + game.ball.radius)
+		self.assertGreater(game.ball.velocity.x, 0)
+
+class TrajectoryPredictorTests(SimpleTestCase):
+	"""The closed-form path is the one the stepped ball follows, and never outlives a change of the ball."""
+
+	def serve(self, game, angle):
+		ball = game.ball
+		game.is_running = True
+		ball.countdown = 0
+		ball.start_movement()
+		ball.position.copy_from(DEFAULT_BALL_POS)
+		ball.velocity.set(ball.speed * math.cos(math.radians(angle)), ball.speed * math.sin(math.radians(angle)), 0.0)
+
+	def test_path_matches_stepped_ball(self):
+		for angle in (-40, -15, 0, 25, 40, 140, 180, 205):
+			with self.subTest(angle=angle):
+				game = ClassicGameInstance(ignore, ignore, tournament=True, local=False, seed=1)
+				ball = game.ball
+				self.serve(game, angle)
+				predictor = TrajectoryPredictor(ball.position.copy(), ball.velocity.copy(), ball.radius, game.bounds)
+				vertices = predictor.compute()
+				positions = []
+				contacts = []
+				on_contact = game.on_contact
+
+				def record_contact(contact):
+					contacts.append((ball.position.x, ball.position.y))
+					if contact in (GOAL_LEFT, GOAL_RIGHT):
+						ball.is_moving = False
+					else:
+						on_contact(contact)
+
+				# the paddles out of the way, the ball runs from wall to wall up to a goal line
+				with patch("Game.swept_collision.paddle_time", return_value=math.inf), patch.object(game, "on_contact", record_contact):
+					while ball.is_moving:
+						game.step(1 / game.PHYSICS_RATE)
+						positions.append((ball.position.x, ball.position.y))
+				self.assertEqual(len(vertices), len(contacts))
+				for vertex, contact in zip(vertices, contacts):
+					self.assertAlmostEqual(vertex.x, contact[0])
+					self.assertAlmostEqual(vertex.y, contact[1])
+				for x, y in positions:
+					self.assertAlmostEqual(predictor.y_at(x), y)
+				# behind the ball or beyond the goal line the path does not cross
+				self.assertIsNone(predictor.y_at(DEFAULT_BALL_POS.x - math.copysign(1, ball.velocity.x)))
+				self.assertIsNone(predictor.y_at(positions[-1][0] + math.copysign(1, ball.velocity.x)))
+
+	def assertPathUpToDate(self, ball):
+		fresh = TrajectoryPredictor(ball.position.copy(), ball.velocity.copy(), ball.radius, ball.bounds)
+		path = ball.trajectory.path()
+		expected = fresh.path()
+		self.assertEqual(len(path), len(expected))
+		for point, expected_point in zip(path, expected):
+			self.assertAlmostEqual(point.x, expected_point.x)
+			self.assertAlmostEqual(point.y, expected_point.y)
+
+	def run_steps(self, game, steps):
+		for _ in range(steps):
+			# the path is read every step, as the broadcasts and the bot do
+			self.assertPathUpToDate(game.ball)
+			game.step(1 / game.PHYSICS_RATE)
+
+	def test_paddle_bounce_recomputes_path(self):
+		game = ClassicGameInstance(ignore, ignore, tournament=True, local=False, seed=1)
+		self.serve(game, 10)
+		# the right paddle waits where the path meets it, as the bot does
+		game.player_right.position.y = game.ball.trajectory.y_at(game.player_right.position.x)
+		with patch.object(game, "on_contact", wraps=game.on_contact) as on_contact:
+			self.run_steps(game, 120)
+		self.assertIn(PADDLE_RIGHT, [call.args[0] for call in on_contact.call_args_list])
+
+	def test_reversed_ball_recomputes_path(self):
+		game = rumble_game(ReverseBallEvent)
+		game.event.reverse_countdown = 0.2
+		self.serve(game, 30)
+		with patch.object(game.event, "next_reverse_interval", return_value=0.3) as next_reverse_interval:
+			self.run_steps(game, 60)
+		self.assertTrue(next_reverse_interval.called)
+
+	def test_mirror_bounce_recomputes_path(self):
+		# a mirror bounce moves the ball to the opposite wall and keeps its velocity, the cache key
+		game = rumble_game(MirrorBallEvent)
+		self.serve(game, 40)
+		with patch.object(game, "on_contact", wraps=game.on_contact) as on_contact:
+			self.run_steps(game, 60)
+		self.assertIn(WALL_TOP, [call.args[0] for call in on_contact.call_args_list])
+
+def apply_frame(state, frame):
+	"""What the client's mergeState does with a frame: a keyframe replaces the state, a delta is merged into it."""
+	if frame.get("keyframe"):
+		state.clear()
+	for field in STATE_FIELDS:
+		if field in frame:
+			state[field] = merge_into(state.get(field), frame[field])
+	return state
+
+def merge_into(target, patch):
+	if not isinstance(patch, dict) or not isinstance(target, dict):
+		return patch
+	merged = dict(target)
+	for key, value in patch.items():
+		merged[key] = merge_into(target.get(key), value)
+	return merged
+
+def game_state(ball_x, left_y=7.5, score_left=0, up=False, trajectory=()):
+	return {
+		"positions": {"player_left": {"x": -18.45, "y": left_y, "z": -15}, "player_right": {"x": 18.42, "y": 7.5, "z": -15}, "ball": {"x": ball_x, "y": 7.8, "z": -15}},
+		"keys": {"player_left": {"up": up, "down": False}, "player_right": {"up": False, "down": False}},
+		"scores": {"left": score_left, "right": 0},
+		"acks": {"left": 0, "right": 0},
+		"ball_color": "white",
+		"trajectory": list(trajectory),
+	}
+
+class DeltaEncoderTests(SimpleTestCase):
+	"""Frames carry what changed since the frame they name as base, and keyframes the whole state."""
+
+	def test_diff(self):
+		self.assertIsNone(DeltaEncoder.diff({"a": {"x": 1, "y": 2}}, {"a": {"x": 1, "y": 2}}))
+		self.assertEqual(DeltaEncoder.diff({"a": {"x": 1, "y": 3}, "b": 4}, {"a": {"x": 1, "y": 2}}), {"a": {"y": 3}, "b": 4})
+		self.assertEqual(DeltaEncoder.diff([1, 2], [1]), [1, 2])
+		self.assertEqual(DeltaEncoder.diff({"x": 1}, None), {"x": 1})
+		self.assertIsNone(DeltaEncoder.diff(5, 5))
+
+	def test_deltas_carry_changed_fields(self):
+		encoder = DeltaEncoder(keyframe_interval=100)
+		first = encoder.encode(game_state(0.0))
+		self.assertEqual(first, {**game_state(0.0), "frame": 1, "keyframe": True})
+		self.assertEqual(encoder.encode(game_state(0.5)), {"positions": {"ball": {"x": 0.5}}, "frame": 2, "base": 1})
+		# nothing changed, nothing goes out and the numbering stays
+		self.assertEqual(encoder.encode(game_state(0.5)), {})
+		# events go out whole, even without a state change
+		events = [{"type": "paddle_hit", "side": "LEFT"}]
+		self.assertEqual(encoder.encode({**game_state(0.5), "events": events}), {"events": events, "frame": 3, "base": 2})
+
+	def test_atomic_fields_are_sent_whole(self):
+		encoder = DeltaEncoder(keyframe_interval=100)
+		encoder.encode(game_state(0.0))
+		frame = encoder.encode(game_state(0.0, score_left=1, up=True))
+		self.assertEqual(set(ATOMIC_FIELDS), {"keys", "scores", "acks"})
+		self.assertEqual(frame["scores"], {"left": 1, "right": 0})
+		self.assertEqual(frame["keys"], game_state(0.0, up=True)["keys"])
+		self.assertNotIn("acks", frame)
+		self.assertNotIn("positions", frame)
+
+	def test_keyframe_interval(self):
+		encoder = DeltaEncoder(keyframe_interval=3)
+		frames = [encoder.encode(game_state(index / 10)) for index in range(9)]
+		self.assertEqual([frame.get("keyframe", False) for frame in frames], [True, False, False, False, True, False, False, False, True])
+		self.assertEqual([frame["frame"] for frame in frames], list(range(1, 10)))
+		for index, frame in enumerate(frames):
+			if frame.get("keyframe"):
+				self.assertNotIn("base", frame)
+				self.assertEqual(frame["positions"], game_state(index / 10)["positions"])
+			else:
+				self.assertEqual(frame["base"], frames[index - 1]["frame"])
+
+	def test_frame_numbers_wrap(self):
+		encoder = DeltaEncoder(keyframe_interval=100)
+		encoder.encode(game_state(0.0))
+		encoder.frame_number = 0xFFFF
+		self.assertEqual(encoder.encode(game_state(0.5)), {"positions": {"ball": {"x": 0.5}}, "frame": 0, "base": 0xFFFF})
+		self.assertEqual(encoder.encode(game_state(1.0))["base"], 0)
+
+	def test_requested_keyframe_resends_the_state(self):
+		encoder = DeltaEncoder(keyframe_interval=100)
+		encoder.encode(game_state(0.0))
+		encoder.encode(game_state(0.5))
+		encoder.request_keyframe()
+		self.assertEqual(encoder.encode(game_state(0.5)), {**game_state(0.5), "frame": 3, "keyframe": True})
+		self.assertEqual(encoder.encode(game_state(0.5)), {})
+
+	def test_client_rebuilds_every_state(self):
+		encoder = DeltaEncoder(keyframe_interval=5)
+		client = {}
+		states = [game_state(index * 0.25, left_y=7.5 + index % 3, score_left=index // 4, up=index % 2 == 0, trajectory=[{"x": index, "y": 0}] * (index % 2))
+			for index in range(20)]
+		for state in states:
+			apply_frame(client, encoder.encode(state))
+			self.assertEqual(client, state)
+
+class FrameOutboxTests(SimpleTestCase):
+	"""Frames merged for a slow socket lose no event and apply like the frames they replace."""
+
+	def test_merge_keeps_the_older_base(self):
+		older = {"positions": {"ball": {"x": 1.0, "y": 2.0}, "player_left": {"y": 3.0}}, "scores": {"left": 1, "right": 0},
+			"events": [{"type": "score", "side": "LEFT"}], "frame": 6, "base": 5}
+		newer = {"positions": {"ball": {"x": 1.5}}, "ball_color": "red",
+			"events": [{"type": "game_end", "winner": "LEFT"}], "frame": 7, "base": 6}
+		self.assertEqual(merge_frames(older, newer), {
+			"positions": {"ball": {"x": 1.5, "y": 2.0}, "player_left": {"y": 3.0}},
+			"scores": {"left": 1, "right": 0},
+			"ball_color": "red",
+			"events": [{"type": "score", "side": "LEFT"}, {"type": "game_end", "winner": "LEFT"}],
+			"frame": 7,
+			"base": 5,
+		})
+		# the frames themselves are left alone, the older one may still be queued elsewhere
+		self.assertEqual(older["events"], [{"type": "score", "side": "LEFT"}])
+
+	def test_merge_with_a_keyframe(self):
+		delta = {"positions": {"ball": {"x": 1.0}}, "frame": 3, "base": 2}
+		keyframe = {**game_state(0.5), "frame": 2, "keyframe": True}
+		self.assertEqual(merge_frames(keyframe, delta), {**game_state(1.0), "frame": 3, "keyframe": True})
+		merged = merge_frames({**delta, "events": [{"type": "score", "side": "RIGHT"}]}, {**game_state(0.5), "frame": 4, "keyframe": True})
+		self.assertEqual(merged, {**game_state(0.5), "events": [{"type": "score", "side": "RIGHT"}], "frame": 4, "keyframe": True})
+
+	def test_merged_frames_apply_like_the_originals(self):
+		encoder = DeltaEncoder(keyframe_interval=4)
+		states = [game_state(index * 0.25, left_y=7.5 + index % 3, score_left=index // 3, up=index % 2 == 0) for index in range(12)]
+		frames = [encoder.encode(state) for state in states]
+		merged = frames[0]
+		for frame in frames[1:]:
+			merged = merge_frames(merged, frame)
+		self.assertEqual(apply_frame({}, merged), states[-1])
+		# a client at the first frame takes the merge of the rest as a delta against it
+		merged = merge_frames(frames[1], frames[2])
+		self.assertEqual(merged["base"], frames[0]["frame"])
+		self.assertEqual(apply_frame(apply_frame({}, frames[0]), merged), states[2])
+
+	async def test_full_outbox_coalesces_without_losing_events(self):
+		sent = []
+		release = asyncio.Event()
+
+		async def send(payload):
+			await release.wait()
+			sent.append(payload)
+
+		outbox = FrameOutbox("test", send, SimpleNamespace(encode=lambda message_type, data: data))
+		pushed = [{"positions": {"ball": {"x": index}}, "events": [{"type": "score", "side": "LEFT", "index": index}], "frame": index + 1, "base": index}
+			for index in range(10)]
+		for frame in pushed:
+			outbox.push(frame, frame)
+			# the writer task takes the first frame and waits on the socket
+			await asyncio.sleep(0)
+		self.assertEqual(len(outbox.pending), FrameOutbox.CAPACITY)
+		self.assertEqual(outbox.coalesced, len(pushed) - FrameOutbox.CAPACITY - 1)
+		release.set()
+		while outbox.pending:
+			await asyncio.sleep(0)
+		outbox.close()
+		self.assertEqual([event for payload in sent for event in payload["events"]], [event for frame in pushed for event in frame["events"]])
+		self.assertEqual(sent[-1]["positions"], {"ball": {"x": 9}})
+		self.assertEqual(sent[-1]["base"], sent[-2]["frame"])
+		self.assertEqual(sent[-1]["frame"], pushed[-1]["frame"])
+
+def play_scripted_game(game_class, seed, ticks=7200):
+	"""Plays a game on a virtual clock with the same pseudo-random key presses whatever the seed.
+
+	Returns the game and the state of the ball and paddles after every physics step.
+	"""
+	game = game_class(ignore, ignore, tournament=True, local=False, seed=seed)
+	trace = trace_steps(game)
+	keys = random.Random(0)
+	game.start()
+	game.clock.reset(0.0)
+	for tick in range(1, ticks + 1):
+		if tick % 15 == 0:
+			for player in (game.player_left, game.player_right):
+				player.keys["ArrowUp"] = keys.random() < 0.4
+				player.keys["ArrowDown"] = not player.keys["ArrowUp"] and keys.random() < 0.6
+		game.advance(tick / game.PHYSICS_RATE)
+		game.pending_events.clear()
+		if not game.is_running:
+			break
+	return game, trace
+
+def trace_steps(game):
+	trace = []
+	step = game.step
+
+	def traced_step(delta_time):
+		step(delta_time)
+		trace.append((game.ball.position.x, game.ball.position.y, game.ball.velocity.x, game.ball.velocity.y,
+			game.player_left.position.y, game.player_right.position.y, game.player_left.score, game.player_right.score,
+			getattr(getattr(game, "event", None), "name", None)))
+
+	game.step = traced_step
+	return trace
+
+class DeterminismTests(SimpleTestCase):
+	"""The seed and the key inputs decide the whole game."""
+
+	def test_same_seed_same_game(self):
+		for game_class in (ClassicGameInstance, RumbleGameInstance):
+			with self.subTest(game=game_class.__name__):
+				_, trace = play_scripted_game(game_class, seed=7)
+				_, again = play_scripted_game(game_class, seed=7)
+				_, other = play_scripted_game(game_class, seed=8)
+				# long enough for points to be scored
+				self.assertGreater(trace[-1][6] + trace[-1][7], 2)
+				self.assertEqual(trace, again)
+				self.assertNotEqual(trace, other)
+
+class ReplayTests(SimpleTestCase):
+	"""A recorded game re-simulates step for step from its replay log."""
+
+	async def replay(self, game):
+		if game.is_running:
+			await game.forfeit("LEFT")
+		log = read_replay(game.recorder.to_bytes())
+		self.assertEqual(log.seed, game.seed)
+		history = SimpleNamespace(id=1, elo_change=0, player_left=None, player_right=None)
+		backend = ReplayBackend(history, log)
+		# nobody watches, and the end frame would need the player profiles from the database
+		backend.send_frame = backend.broadcast_state = backend.rumble_broadcast_state = ignore
+		trace = trace_steps(backend.game)
+		with self.assertNoLogs("game", "WARNING"):
+			await backend.play(speed=1000)
+		return backend.game, trace
+
+	async def test_replay_matches_the_game(self):
+		for game_class in (ClassicGameInstance, RumbleGameInstance):
+			with self.subTest(game=game_class.__name__):
+				game, trace = play_scripted_game(game_class, seed=3)
+				replayed, replay_trace = await self.replay(game)
+				self.assertEqual(replay_trace, trace)
+				self.assertFalse(replayed.is_running)
+
+	async def test_replay_runs_at_the_recorded_physics_rate(self):
+		with patch.object(ClassicGameInstance, "PHYSICS_RATE", 30):
+			game, trace = play_scripted_game(ClassicGameInstance, seed=3, ticks=1800)
+		self.assertEqual(read_replay(game.recorder.to_bytes()).physics_rate, 30)
+		replayed, replay_trace = await self.replay(game)
+		self.assertEqual(replayed.PHYSICS_RATE, 60)
+		self.assertEqual(replay_trace, trace)
+
+	async def test_malformed_messages_are_ignored(self):
+		consumer = ReplayConsumer()
+		keyframes = []
+		consumer.game = SimpleNamespace(request_keyframe=lambda: keyframes.append(True))
+		consumer.playback = True
+		for text_data in ("not json", "[1, 2]", "5", '{"type": "resync"}'):
+			await consumer.receive(text_data=text_data)
+		self.assertEqual(len(keyframes), 1)
+
+class AchievementTrackerTests(SimpleTestCase):
+	"""Every achievement goes to the player who earned it, and only once."""
+
+	RULES = {
+		"Clutch": (1, 1),
+		"God's Clutch": (2, 1),
+		"Flawless": (3, 1),
+		"Challenger": (4, 10),
+		"Vanilla": (5, 1),
+		"Rumbler": (6, 1),
+		"Speed Of Light": (7, 100),
+		"Survivor": (8, 10),
+		"Honey, I Shrunk the Paddles": (9, 5),
+	}
+	PROFILES = {"LEFT": SimpleNamespace(wins=4), "RIGHT": SimpleNamespace(wins=9)}
+
+	def setUp(self):
+		patcher = patch.object(AchievementTracker, "rules", self.RULES)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def game(self, left=0, right=0):
+		return SimpleNamespace(ended=False, player_left=SimpleNamespace(score=left, highestShrinkPaddle=2), player_right=SimpleNamespace(score=right, highestShrinkPaddle=3),
+			ball=SimpleNamespace(highestSpeed=63.7), highestKillerSurvive=4.2)
+
+	def play(self, tracker, scores):
+		game = self.game()
+		for left, right in scores:
+			game.player_left.score, game.player_right.score = left, right
+			tracker.on_score(game)
+		return game
+
+	def test_clutch_margins(self):
+		tracker = AchievementTracker("classic", True)
+		self.play(tracker, [(0, 1), (0, 2), (0, 3)])
+		self.assertEqual((tracker.clutch, tracker.gods_clutch), (None, None))
+		self.play(tracker, [(0, 4)])
+		self.assertEqual((tracker.clutch, tracker.gods_clutch), ("LEFT", None))
+		self.play(tracker, [(0, 5), (0, 6)])
+		self.assertIsNone(tracker.gods_clutch)
+		self.play(tracker, [(0, 7)])
+		self.assertEqual(tracker.gods_clutch, "LEFT")
+		# the first side to trail keeps it, whatever happens next
+		game = self.play(tracker, [(12, 7)])
+		self.assertEqual((tracker.clutch, tracker.gods_clutch), ("LEFT", "LEFT"))
+		won = tracker.progress(game, "LEFT", self.PROFILES)["LEFT"]
+		self.assertEqual((won["Clutch"], won["God's Clutch"]), (1, 1))
+		self.assertNotIn("Clutch", tracker.progress(game, "RIGHT", self.PROFILES)["RIGHT"])
+
+	def test_comeback_is_not_counted_once_the_game_ended(self):
+		tracker = AchievementTracker("classic", True)
+		game = self.game(0, 10)
+		game.ended = True
+		tracker.on_score(game)
+		self.assertIsNone(tracker.clutch)
+		ineligible = AchievementTracker("classic", False)
+		self.play(ineligible, [(0, 8)])
+		self.assertIsNone(ineligible.clutch)
+		self.assertEqual(ineligible.progress(game, "RIGHT", self.PROFILES), {"LEFT": {}, "RIGHT": {}})
+
+	def test_challenger_goes_to_the_winner(self):
+		tracker = AchievementTracker("classic", True)
+		game = self.game(10, 0)
+		progress = tracker.progress(game, "LEFT", self.PROFILES)
+		self.assertEqual(progress, {"LEFT": {"Flawless": 1, "Challenger": 5, "Vanilla": 1}, "RIGHT": {}})
+		progress = tracker.progress(self.game(8, 10), "RIGHT", self.PROFILES)
+		self.assertEqual(progress, {"LEFT": {}, "RIGHT": {"Challenger": 10, "Vanilla": 1}})
+
+	async def test_rumble_progress_once_per_side(self):
+		tracker = AchievementTracker("rumble", True)
+		results = await tracker.results(self.game(10, 7), "LEFT", self.PROFILES)
+		self.assertCountEqual(results["LEFT"], [[4, 5, False], [6, 1, True], [7, 63, False], [8, 4, False], [9, 2, False]])
+		self.assertCountEqual(results["RIGHT"], [[7, 63, False], [8, 4, False], [9, 3, False]])
+
+class KeyInputTests(SimpleTestCase):
+	"""The seq and t of a JSON input come straight from the client and are checked on receipt."""
+
+	def setUp(self):
+		self.backend = GameBackend(1, 0, None, False, "classic", False, False)
+		self.backend.assign_player(SimpleNamespace(id=1, username="left"), "left")
+		self.backend.assign_player(SimpleNamespace(id=2, username="right"), "right")
+		self.inputs = self.backend.game.inputs
+
+	def test_malformed_seq_is_dropped(self):
+		for seq in (65536, -1, "7", 1.0, True, [1]):
+			with self.subTest(seq=seq):
+				self.backend.handle_key_event("left", "ArrowUp", True, seq, 1000)
+				self.assertEqual(self.inputs.pending, [])
+		self.backend.handle_key_event("left", "ArrowUp", True, 65535, 1000)
+		self.inputs.apply()
+		self.assertTrue(self.backend.game.player_left.keys["ArrowUp"])
+		self.assertEqual(self.inputs.acks["player_left"], 65535)
+		frame = BinaryFrameCodec().encode("game_update", {"acks": dict(self.inputs.acks)})
+		self.assertEqual(BinaryFrameCodec().decode(frame)["data"]["acks"], {"player_left": 65535, "player_right": 0})
+
+	def test_malformed_client_time_keeps_the_key(self):
+		for seq, client_time in enumerate(("soon", float("nan"), [1], None), start=1):
+			with self.subTest(client_time=client_time):
+				self.backend.handle_key_event("right", "ArrowDown", seq % 2 == 1, seq, client_time)
+				self.assertEqual(self.inputs.stats["player_right"].last_client_time, None)
+		self.backend.handle_key_event("right", "ArrowUp", True, 5, 1000.7)
+		self.backend.handle_key_event("right", "ArrowUp", False, 6, 2 ** 32 + 1016.2)
+		self.assertEqual(self.inputs.stats["player_right"].last_client_time, 1016)
+		self.inputs.apply()
+		self.assertEqual(self.inputs.stats["player_right"].inputs, 6)
+		self.assertEqual(self.inputs.acks["player_right"], 6)
+
+class SpectatorInputTests(SimpleTestCase):
+	"""Whatever a spectator sends, the socket stays up and only init_confirm and resync are acted on."""
+
+	async def test_malformed_messages_are_ignored(self):
+		consumer = GameConsumer()
+		consumer.spectator = True
+		keyframes = []
+		consumer.game = SimpleNamespace(request_spectator_keyframe=lambda: keyframes.append(True))
+		for text_data in ("not json", "[1, 2]", "5", "null", '"resync"', '{"type": "keydown", "key": "ArrowUp"}', None):
+			with self.subTest(text_data=text_data):
+				await consumer.receive(text_data=text_data)
+		self.assertEqual(keyframes, [])
+		await consumer.receive(text_data='{"type": "resync"}')
+		await consumer.receive(text_data='{"type": "init_confirm"}')
+		self.assertEqual(len(keyframes), 2)
+
+class GameResultWriterTests(SimpleTestCase):
+	"""Results a previous worker left queued are written without waiting for a new game to end."""
+
+	async def test_start_drains_leftover_results(self):
+		batches = [(GameResultWriter.BATCH_SIZE, True), (3, False)]
+		calls = []
+
+		async def persist_game_results(batch_size, max_backoff):
+			calls.append(batch_size)
+			return batches.pop(0)
+
+		writer = GameResultWriter()
+		with patch("Game.results.persist_game_results", persist_game_results):
+			writer.start()
+			writer.start()
+			await writer.task
+		self.assertEqual(calls, [GameResultWriter.BATCH_SIZE] * 2)
+		self.assertIsNone(writer.task)
+		writer.start()
+		self.assertIsNone(writer.task)
@@ -0,0 +1,82 @@
+"""Profile rank lookup latency against the number of ranked players.
+
+Run from the backend directory, with a Redis server reachable:
+
+	python -m api.benchmarks.rank_lookup [--redis-url redis://redis:6379/15] [--sizes 100,1000,10000,100000]
+
+For each size the leaderboards of the Redis database given by --redis-url
+are filled with that many synthetic players (the database is meant for the
+benchmark only, its leaderboard keys are overwritten and then deleted).
+Reports the latency of the rank lookup a profile view makes, both modes in
+one round trip, and for comparison what the previous lookup spent sorting
+every player in Python, not counting its queries.
+"""
+import argparse
+import random
+import statistics
+import time
+import redis
+from .. import leaderboard
+from ..leaderboard import MODES, leaderboard_key, ready_key, leaderboard_member, leaderboard_score, user_ranks
+
+def synthetic_players(count, rng):
+	for user_id in range(1, count + 1):
+		games = rng.choice((0, rng.randint(1, 50), rng.randint(1, 2000)))
+		yield user_id, f"player{user_id}", rng.randint(600, 1600), games, rng.randint(0, games)
+
+def fill(client, count, seed):
+	client.delete(*[leaderboard_key(mode) for mode in MODES])
+	players = list(synthetic_players(count, random.Random(seed)))
+	for mode in MODES:
+		for start in range(0, count, leaderboard.REBUILD_CHUNK):
+			chunk = players[start:start + leaderboard.REBUILD_CHUNK]
+			client.zadd(leaderboard_key(mode), {leaderboard_member(user_id, username): leaderboard_score(elo, games, wins) for user_id, username, elo, games, wins in chunk})
+		client.set(ready_key(mode), 1)
+	return players
+
+def winrate(wins, games):
+	return f"{(wins / games) * 100:.2f}%" if games else 'No games'
+
+def full_sort_rank(players, username):
+	"""The previous lookup: every player with its winrate string, sorted, then searched."""
+	rows = [{'username': name, 'elo': elo, 'winrate': winrate(wins, games)} for _, name, elo, games, wins in players]
+	rows.sort(key=lambda x: (-x['elo'], x['winrate'] == 'No games', -float(x['winrate'].rstrip('%')) if x['winrate'] != 'No games' else 0, x['username'].lower()))
+	return next(index + 1 for index, row in enumerate(rows) if row['username'] == username)
+
+def percentile(samples, fraction):
+	return sorted(samples)[min(int(len(samples) * fraction), len(samples) - 1)]
+
+def run(args):
+	client = redis.Redis.from_url(args.redis_url)
+	leaderboard._client = client
+	rng = random.Random(args.seed)
+	print(f"{'players':>8} {'p50':>9} {'p99':>9} {'mean':>9} {'full sort':>10}")
+	try:
+		for count in args.sizes:
+			players = fill(client, count, args.seed)
+			lookups = [rng.choice(players) for _ in range(args.lookups)]
+			for user_id, username, *_ in lookups[:args.warmup]:
+				user_ranks(user_id, username)
+			samples = []
+			for user_id, username, *_ in lookups:
+				started = time.perf_counter()
+				user_ranks(user_id, username)
+				samples.append(time.perf_counter() - started)
+			started = time.perf_counter()
+			full_sort_rank(players, lookups[0][1])
+			full_sort = (time.perf_counter() - started) * len(MODES)
+			print(f"{count:8} {percentile(samples, 0.5) * 1e6:7.0f}us {percentile(samples, 0.99) * 1e6:7.0f}us {statistics.mean(samples) * 1e6:7.0f}us {full_sort * 1e3:8.1f}ms")
+	finally:
+		client.delete(*[leaderboard_key(mode) for mode in MODES], *[ready_key(mode) for mode in MODES])
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--redis-url", default="redis://redis:6379/15")
+	parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[100, 1000, 10000, 100000])
+	parser.add_argument("--lookups", type=int, default=2000)
+	parser.add_argument("--warmup", type=int, default=100)
+	parser.add_argument("--seed", type=int, default=42)
+	run(parser.parse_args())
+
+if __name__ == "__main__":
+	main()
@@ -1,6 +1,7 @@
 from channels.generic.http import AsyncHttpConsumer
 from channels.db import database_sync_to_async
 from api.utils import jwt_to_user
+from Game.player_profile import notify_profile_changed
 from api.db_utils import get_user_preference, is_color_unlocked, sendResponse, sendBadJWT
 import json
 import logging
@@ -44,6 +45,7 @@ class SetCustomizeConsumer(AsyncHttpConsumer):
 
 			await self.update_user_preferences_color(user, color)
 			await self.update_user_preferences_quality(user, quality)
+			await notify_profile_changed(user)
 
 			return await sendResponse(self, True, "Updated successfully", 200)
 
@@ -2,7 +2,9 @@ from channels.generic.http import AsyncHttpConsumer
 from api.utils import jwt_to_user
 from django.contrib.auth import get_user_model
 from channels.db import database_sync_to_async
+from django.db import transaction
 from api.db_utils import get_user_exists, sendResponse, sendBadJWT
+from api.leaderboard import remove_from_leaderboards
 import json
 
 class DeleteUserConsumer(AsyncHttpConsumer):
@@ -30,7 +32,11 @@ class DeleteUserConsumer(AsyncHttpConsumer):
 	def delete_user(self, user_id):
 		try:
 			User = get_user_model()
-			User.objects.get(id=user_id).delete()
+			user = User.objects.get(id=user_id)
+			username = user.username
+			user.delete()
+			# delete() clears user.id, the members are built from the values read before
+			transaction.on_commit(lambda: remove_from_leaderboards(user_id, username), robust=True)
 			return True
 		except Exception:
 			return False
@@ -1,14 +1,58 @@
 from channels.generic.http import AsyncHttpConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import parse_qs
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.timesince import timesince
 from api.utils import jwt_to_user, get_user_avatar_url
-from api.db_utils import get_user, get_user_by_name, sendResponse, sendBadJWT
+from api.db_utils import get_user_by_name, sendResponse, sendBadJWT
 import json
 
+PLAYER_FIELDS = ('id', 'username', 'display_name', 'avatar', 'avatar_42', 'is_42_avatar_used')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def encode_cursor(game_history):
+	# microseconds since the epoch, exact and safe in a query string
+	return f"{(game_history.created_at - EPOCH) // timedelta(microseconds=1)}_{game_history.id}"
+
+def decode_cursor(cursor):
+	created_at, game_id = cursor.split("_")
+	return EPOCH + timedelta(microseconds=int(created_at)), int(game_id)
+
+def finished_games(after=None):
+	"""Finished games, newest first, older than the (created_at, id) cursor if given."""
+	from api.models import GameHistory
+	games = GameHistory.objects.filter(game_state='finished')
+	if after is not None:
+		created_at, game_id = after
+		# created_at__lte is the index range start, the rest only skips the rows sharing the cursor's timestamp
+		games = games.filter(Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=game_id)))
+	return games.order_by('-created_at', '-id')
+
+def history_page(user, after, limit):
+	"""One page of a player's games in a single query.
+
+	Each side is an index range scan of its (player, game_state, created_at,
+	id) index that stops after limit rows, the page is the newest rows of
+	both with the players joined in (the winner is only compared by id). The cost of a page does
+	not depend on how many games the player has or how deep the page is.
+	"""
+	from api.models import GameHistory
+	games = finished_games(after).filter(player_left__isnull=False, player_right__isnull=False).exclude(game_type='tournament')
+	page_ids = games.filter(player_left=user).values('id')[:limit].union(games.filter(player_right=user).values('id')[:limit], all=True)
+	return (GameHistory.objects.filter(id__in=page_ids)
+		.select_related('player_left', 'player_right')
+		.only('id', 'game_type', 'game_mode', 'score_left', 'score_right', 'elo_change', 'updated_at', 'created_at',
+			*[f"{player}__{field}" for player in ('player_left', 'player_right') for field in PLAYER_FIELDS], 'winner')
+		.order_by('-created_at', '-id')[:limit])
+
 class GameHistoryConsumer(AsyncHttpConsumer):
+	"""api/profiles/<username>/history/?cursor=<next_cursor>&limit=20, a player's games newest first."""
+	DEFAULT_LIMIT = 20
+	MAX_LIMIT = 50
+
 	async def handle(self, body):
 		try:
 			user = await jwt_to_user(self.scope['headers'])
@@ -19,45 +63,21 @@ class GameHistoryConsumer(AsyncHttpConsumer):
 			if not profile_user:
 				return await sendResponse(self, False, "User not found", 404)
 
-			game_histories = await self.get_game_histories(profile_user)
+			query_params = parse_qs(self.scope['query_string'].decode())
+			try:
+				cursor = query_params.get('cursor', [None])[0]
+				after = decode_cursor(cursor) if cursor else None
+				limit = min(max(int(query_params.get('limit', [self.DEFAULT_LIMIT])[0]), 1), self.MAX_LIMIT)
+			except (ValueError, OverflowError):
+				return await sendResponse(self, False, "Invalid cursor", 400)
+
+			game_histories = await self.get_game_histories(profile_user, after, limit)
 
 			response_data = {
 				'success': True,
+				'games': [self.game_history_entry(game_history, profile_user) for game_history in game_histories],
+				'next_cursor': encode_cursor(game_histories[-1]) if len(game_histories) == limit else None,
 			}
-			for index, game_history in enumerate(game_histories):
-				player_left =  await self.get_player_left(game_history)
-				player_right =  await self.get_player_right(game_history)
-				winner = await self.get_winner(game_history)
-				time_since_game = timesince(game_history.updated_at, timezone.now())
-				if "," in time_since_game:
-					time_since_game = time_since_game.split(",")[0]
-				if "hours" in time_since_game or "hour" in time_since_game:
-					time_since_game = time_since_game.split()[0] + " " + time_since_game.split()[1]
-				time_since_game = time_since_game.strip() + " ago"
-
-				response_data[f"game_history_{index}"] = {
-					'id': game_history.id,
-					'game_type': game_history.game_type,
-					'game_mode': game_history.game_mode,
-					'score_left': game_history.score_left,
-					'score_right': game_history.score_right,
-					'elo_change': game_history.elo_change,
-					'time_since_game': time_since_game,
-					'player_left': {
-						'username': player_left.username,
-						'name': player_left.display_name if player_left.display_name is not None else player_left.username,
-						'avatar_url': get_user_avatar_url(player_left, self.scope['headers']),
-						'is_winner': player_left.id == winner.id,
-						'is_opponent': player_left.username != self.scope['url_route']['kwargs']['username'],
-					},
-					'player_right': {
-						'username': player_right.username,
-						'name': player_right.display_name if player_right.display_name is not None else player_right.username,
-						'avatar_url': get_user_avatar_url(player_right, self.scope['headers']),
-						'is_winner': player_right.id == winner.id,
-						'is_opponent': player_right.username != self.scope['url_route']['kwargs']['username'],
-					},
-				}
 			return await self.send_response(200, json.dumps(response_data).encode(),
 				headers=[(b"Content-Type", b"application/json")])
 
@@ -65,24 +85,35 @@ class GameHistoryConsumer(AsyncHttpConsumer):
 			import traceback
 			return await sendResponse(self, False, str(traceback.format_exc()), 500)
 
-	@database_sync_to_async
-	def get_player_left(self, game_history):
-		User = get_user_model()
-		return User.objects.get(id=game_history.player_left.id)
+	def game_history_entry(self, game_history, profile_user):
+		time_since_game = timesince(game_history.updated_at, timezone.now())
+		if "," in time_since_game:
+			time_since_game = time_since_game.split(",")[0]
+		if "hours" in time_since_game or "hour" in time_since_game:
+			time_since_game = time_since_game.split()[0] + " " + time_since_game.split()[1]
+		time_since_game = time_since_game.strip() + " ago"
 
-	@database_sync_to_async
-	def get_player_right(self, game_history):
-		User = get_user_model()
-		return User.objects.get(id=game_history.player_right.id)
+		return {
+			'id': game_history.id,
+			'game_type': game_history.game_type,
+			'game_mode': game_history.game_mode,
+			'score_left': game_history.score_left,
+			'score_right': game_history.score_right,
+			'elo_change': game_history.elo_change,
+			'time_since_game': time_since_game,
+			'player_left': self.player_entry(game_history.player_left, game_history, profile_user),
+			'player_right': self.player_entry(game_history.player_right, game_history, profile_user),
+		}
 
-	@database_sync_to_async
-	def get_winner(self, game_history):
-		User = get_user_model()
-		return User.objects.get(id=game_history.winner.id)
+	def player_entry(self, player, game_history, profile_user):
+		return {
+			'username': player.username,
+			'name': player.display_name if player.display_name is not None else player.username,
+			'avatar_url': get_user_avatar_url(player, self.scope['headers']),
+			'is_winner': player.id == game_history.winner_id,
+			'is_opponent': player.id != profile_user.id,
+		}
 
 	@database_sync_to_async
-	def get_game_histories(self, user):
-		from api.models import GameHistory
-		return list(GameHistory.objects.filter((Q(player_left=user) | Q(player_right=user)) & Q(game_state='finished') & ~Q(game_type='tournament'))
-			.order_by('-created_at')[:20])
-
+	def get_game_histories(self, user, after, limit):
+		return list(history_page(user, after, limit))
@@ -0,0 +1,92 @@
+from channels.generic.http import AsyncHttpConsumer
+from channels.db import database_sync_to_async
+from asgiref.sync import async_to_sync
+from urllib.parse import parse_qs
+from django.db.models import Q
+from api.utils import jwt_to_user
+from api.db_utils import get_user_by_name, sendResponse, sendBadJWT
+from api.consumers.game_history import finished_games, encode_cursor, decode_cursor
+import json
+import logging
+
+def player_name(player):
+	return player.username if player else None
+
+def export_entry(game_history):
+	return {
+		'id': game_history.id,
+		'created_at': game_history.created_at.isoformat(),
+		'game_mode': game_history.game_mode,
+		'game_type': game_history.game_type,
+		'player_left': player_name(game_history.player_left),
+		'player_right': player_name(game_history.player_right),
+		'winner': player_name(game_history.winner),
+		'score_left': game_history.score_left,
+		'score_right': game_history.score_right,
+		'elo_change': game_history.elo_change,
+		'seed': game_history.seed,
+		'cursor': encode_cursor(game_history),
+	}
+
+class GameHistoryExportConsumer(AsyncHttpConsumer):
+	"""api/profiles/<username>/history/export/?cursor=<cursor>, every finished game of a player as NDJSON.
+
+	Newest game first, one JSON object per line, each carrying the cursor
+	that resumes an interrupted export right after it. Rows are read from a
+	server-side cursor and sent chunk by chunk as they are read, so the
+	consumer itself never holds more than one chunk. send_body returns once
+	daphne has queued the chunk on its transport, not once the client read
+	it, and ASGI gives no way to wait for the socket to drain: a client
+	reading slower than the database is served from daphne's write buffer.
+	Behind nginx, which buffers proxied responses and spills them to disk,
+	that buffer drains as fast as the chunks are produced.
+	"""
+	CHUNK_SIZE = 500
+
+	async def handle(self, body):
+		self.logger = logging.getLogger('game')
+		try:
+			user = await jwt_to_user(self.scope['headers'])
+			if not user:
+				return await sendBadJWT(self)
+
+			profile_user = await get_user_by_name(self.scope['url_route']['kwargs']['username'])
+			if not profile_user:
+				return await sendResponse(self, False, "User not found", 404)
+
+			cursor = parse_qs(self.scope['query_string'].decode()).get('cursor', [None])[0]
+			try:
+				after = decode_cursor(cursor) if cursor else None
+			except (ValueError, OverflowError):
+				return await sendResponse(self, False, "Invalid cursor", 400)
+
+		except Exception as e:
+			return await sendResponse(self, False, str(e), 500)
+
+		await self.send_headers(headers=[
+			(b"Content-Type", b"application/x-ndjson"),
+			(b"Content-Disposition", f'attachment; filename="{profile_user.username}-history.ndjson"'.encode()),
+		])
+		try:
+			# a thread of its own, the export holds its connection for as long as the client reads
+			await database_sync_to_async(self.write_history, thread_sensitive=False)(profile_user, after)
+		except Exception as e:
+			# the status line is already sent, the client sees the stream end and resumes from its last cursor
+			self.logger.error(f"History export of {profile_user.username} stopped: {e}")
+		await self.send_body(b"")
+
+	def write_history(self, user, after):
+		send_body = async_to_sync(self.send_body)
+		games = (finished_games(after)
+			.filter(Q(player_left=user) | Q(player_right=user))
+			.select_related('player_left', 'player_right', 'winner')
+			.only('id', 'created_at', 'game_mode', 'game_type', 'score_left', 'score_right', 'elo_change', 'seed',
+				'player_left__username', 'player_right__username', 'winner__username'))
+		lines = []
+		for game_history in games.iterator(chunk_size=self.CHUNK_SIZE):
+			lines.append(json.dumps(export_entry(game_history)))
+			if len(lines) == self.CHUNK_SIZE:
+				send_body(("\n".join(lines) + "\n").encode(), more_body=True)
+				lines = []
+		if lines:
+			send_body(("\n".join(lines) + "\n").encode(), more_body=True)
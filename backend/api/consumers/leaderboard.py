@@ -1,11 +1,15 @@
 from channels.generic.http import AsyncHttpConsumer
-from django.contrib.auth import get_user_model
-from channels.db import database_sync_to_async
-from api.utils import jwt_to_user, get_user_avatar_url, get_users_with_stats, sort_leaderboard
+from urllib.parse import parse_qs
+from api.utils import jwt_to_user, get_user_avatar_url, get_winrate
 from api.db_utils import sendResponse, sendBadJWT
+from api.leaderboard import MODES, leaderboard_page
 import json
 
 class LeaderboardConsumer(AsyncHttpConsumer):
+	"""api/leaderboard/<mode>/?offset=0&limit=50, one page of the ranking."""
+	DEFAULT_LIMIT = 50
+	MAX_LIMIT = 100
+
 	async def handle(self, body):
 		try:
 			user = await jwt_to_user(self.scope['headers'])
@@ -13,14 +17,39 @@ class LeaderboardConsumer(AsyncHttpConsumer):
 				return await sendBadJWT(self)
 
 			game_mode = self.scope['url_route']['kwargs']['game_mode']
-			users = await get_users_with_stats(game_mode, self.scope['headers'])
+			if game_mode not in MODES:
+				return await sendResponse(self, False, "Unknown game mode", 400)
+			query_params = parse_qs(self.scope['query_string'].decode())
+			try:
+				offset = max(int(query_params.get('offset', [0])[0]), 0)
+				limit = min(max(int(query_params.get('limit', [self.DEFAULT_LIMIT])[0]), 1), self.MAX_LIMIT)
+			except ValueError:
+				return await sendResponse(self, False, "Invalid page", 400)
+
+			page, total = await leaderboard_page(game_mode, offset, limit)
+			leaderboard = []
+			for rank, statistic in page:
+				player = statistic.user
+				games = getattr(statistic, f"{game_mode}_total_played")
+				leaderboard.append({
+					'rank': rank,
+					'username': player.username,
+					'display_name': player.display_name,
+					'is_42_user': player.is_42_user,
+					'avatar': get_user_avatar_url(player, self.scope['headers']),
+					'elo': getattr(statistic, f"{game_mode}_elo"),
+					'games': games,
+					'winrate': get_winrate(getattr(statistic, f"{game_mode}_wins"), games),
+				})
 
 			response_data = {
 				'success': True,
-				'leaderboard': sort_leaderboard(users)  
+				'leaderboard': leaderboard,
+				'total': total,
+				'next_offset': offset + limit if offset + limit < total else None,
 			}
 			return await self.send_response(200, json.dumps(response_data).encode(),
 				headers=[(b"Content-Type", b"application/json")])
 
 		except Exception as e:
-			return await sendResponse(self, False, str(e), 500)
\ No newline at end of file
+			return await sendResponse(self, False, str(e), 500)
@@ -1,6 +1,7 @@
 from channels.generic.http import AsyncHttpConsumer
-from api.utils import jwt_to_user, get_user_avatar_url, get_users_with_stats, get_winrate, sort_leaderboard
+from api.utils import jwt_to_user, get_user_avatar_url, get_winrate
 from api.db_utils import get_user_by_name, get_user_statistic, sendResponse, sendBadJWT
+from api.leaderboard import get_user_ranks
 import json
 
 class ProfileConsumer(AsyncHttpConsumer):
@@ -15,6 +16,7 @@ class ProfileConsumer(AsyncHttpConsumer):
 				return await sendResponse(self, False, "User not found", 404)
 
 			user_statistic = await get_user_statistic(profile_user)
+			ranks = await get_user_ranks(profile_user.id, profile_user.username)
 
 			response_data = {
 				'success': True,
@@ -27,14 +29,14 @@ class ProfileConsumer(AsyncHttpConsumer):
 					'wins': user_statistic.classic_wins,
 					'winrate': get_winrate(user_statistic.classic_wins, user_statistic.classic_total_played),
 					'elo': user_statistic.classic_elo,
-					'rank': await self.get_user_rank(profile_user, "classic"),
+					'rank': ranks["classic"],
 				},
 				'rumble': {
 					'total_played': user_statistic.rumble_total_played,
 					'wins': user_statistic.rumble_wins,
 					'winrate': get_winrate(user_statistic.rumble_wins, user_statistic.rumble_total_played),
 					'elo': user_statistic.rumble_elo,
-					'rank': await self.get_user_rank(profile_user, "rumble"),
+					'rank': ranks["rumble"],
 				},
 				'tournament': {
 					'total_participated': user_statistic.tournament_total_participated,
@@ -48,12 +50,3 @@ class ProfileConsumer(AsyncHttpConsumer):
 
 		except Exception as e:
 			return await sendResponse(self, False, str(e), 500)
-
-	async def get_user_rank(self, user, game_mode):
-		users = await get_users_with_stats(game_mode, self.scope['headers'])
-		sorted_users = sort_leaderboard(users)
-		for i, u in enumerate(sorted_users):
-			if u['username'] == user.username:
-				return i + 1
-		return None
-
@@ -4,6 +4,7 @@ from channels.generic.http import AsyncHttpConsumer
 from channels.db import database_sync_to_async
 from api.utils import jwt_to_user, is_valid_password, sha256_hash, parse_multipart_form_data
 from api.db_utils import sendResponse, sendBadJWT
+from Game.player_profile import notify_profile_changed
 import json
 import re
 import io
@@ -60,6 +61,9 @@ class SetSettingsConsumer(AsyncHttpConsumer):
 				await self.update_avatar(user, avatar)
 				settings_updated = True
 
+			if settings_updated:
+				await notify_profile_changed(user)
+
 			if (password or confirm_password) and user.is_42_user:
 				return await sendResponse(self, False, "Password cannot be modified for oauth", 403)
 
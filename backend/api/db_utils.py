@@ -2,7 +2,11 @@ from django.contrib.auth import get_user_model
 from channels.db import database_sync_to_async
 import logging
 import json
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
+from .leaderboard import update_leaderboard, statistic_fields
 
 @database_sync_to_async
 def user_update_game(user, playing, game_id):
@@ -59,19 +63,111 @@ def update_game_history_player_right(game_id, player_right):
 		logging.getLogger('game').error(f"Game {game_id} not found")
 
 @database_sync_to_async
-def finish_game_history(game_id, score_left, score_right, elo_change, winner):
-	from .models import GameHistory
-	game = GameHistory.objects.get(id=game_id)
-	if (game):
-		game.score_left = score_left
-		game.score_right = score_right
-		game.status = "finished"
-		game.elo_change = elo_change
-		game.winner = winner
-		game.save()
-		logging.getLogger('game').info(f"Game {game_id} finished with score {score_left} - {score_right} and elo change {elo_change} for player A : {game.player_left} and player B : {game.player_right} state is now {game.status} for the mode {game.game_mode} the winner is {game.winner}")
+def queue_game_result(game_id, payload, replay=None):
+	from .models import QueuedGameResult
+	_, created = QueuedGameResult.objects.get_or_create(game_id=game_id, defaults={"payload": payload, "replay": replay})
+	return created
+
+def apply_game_result(job):
+	"""Every database write of one finished game, run inside the caller's transaction."""
+	from .models import GameHistory, GameReplay, UserStatistic
+	User = get_user_model()
+	result = job.payload
+	if result["discard"]:
+		GameHistory.objects.filter(id=job.game_id).delete()
 	else:
-		logging.getLogger('game').error(f"Game {game_id} not found")
+		GameHistory.objects.filter(id=job.game_id).update(
+			game_state='finished',
+			score_left=result["score_left"],
+			score_right=result["score_right"],
+			elo_change=result["elo_change"],
+			winner_id=result["winner"],
+			seed=result["seed"],
+			updated_at=timezone.now(),
+		)
+		if job.replay is not None:
+			GameReplay.objects.update_or_create(game_id=job.game_id, defaults={"data": job.replay})
+	players = [player for player in (result["player_left"], result["player_right"]) if player is not None]
+	if result["ranked"]:
+		mode = result["game_mode"]
+		for player in players:
+			won = result["winner"] == player
+			elo = result["elo_change"] if won else -result["elo_change"]
+			UserStatistic.objects.filter(user_id=player).update(**{
+				f"{mode}_total_played": F(f"{mode}_total_played") + 1,
+				f"{mode}_wins": F(f"{mode}_wins") + (1 if won else 0),
+				f"{mode}_elo": F(f"{mode}_elo") + (elo if result["winner"] is not None else 0),
+			})
+		rows = list(UserStatistic.objects.filter(user_id__in=players).values_list('user_id', 'user__username', *statistic_fields(mode)))
+		transaction.on_commit(lambda: update_leaderboard(mode, rows), robust=True)
+	flush_achievements(result["player_left"], result["achievements_left"])
+	flush_achievements(result["player_right"], result["achievements_right"])
+	# a player who already joined another game keeps it
+	User.objects.filter(id__in=players, current_game_id=job.game_id).update(playing=False, current_game_id=-1)
+	logging.getLogger('game').info(f"Game {job.game_id} finished with score {result['score_left']} - {result['score_right']} and elo change {result['elo_change']} for the mode {result['game_mode']} the winner is {result['winner']}")
+
+@database_sync_to_async
+def load_achievement_rules():
+	from .models import Achievement
+	return {name: (achievement_id, unlock_value) for achievement_id, name, unlock_value in Achievement.objects.values_list('id', 'name', 'unlock_value')}
+
+def flush_achievements(user_id, rows):
+	"""Applies [achievement id, progression, unlocked] rows of one player with a single bulk_update."""
+	from .models import UserAchievement
+	if user_id is None or not rows:
+		return
+	reached = {achievement_id: (progression, unlocked) for achievement_id, progression, unlocked in rows}
+	now = timezone.now()
+	changed = []
+	for user_achievement in UserAchievement.objects.filter(user_id=user_id, achievement_id__in=reached, unlocked=False):
+		progression, unlocked = reached[user_achievement.achievement_id]
+		if progression <= user_achievement.progression and not unlocked:
+			continue
+		user_achievement.progression = max(progression, user_achievement.progression)
+		if unlocked:
+			user_achievement.unlocked = True
+			user_achievement.date_earned = now
+		changed.append(user_achievement)
+	if changed:
+		UserAchievement.objects.bulk_update(changed, ["progression", "unlocked", "date_earned"])
+		logging.getLogger('game').info(f"Updated {len(changed)} achievements of user {user_id}")
+
+@database_sync_to_async
+def persist_game_results(limit, max_backoff):
+	"""Applies up to limit due results, one transaction each.
+
+	The row lock skips results another worker is applying and processed_at
+	is set in the same transaction as the writes, so a result is never
+	applied twice. A failing result is pushed back with exponential backoff.
+	Returns how many results were due and whether any are still queued.
+	"""
+	from .models import QueuedGameResult
+	now = timezone.now()
+	due = list(QueuedGameResult.objects.filter(processed_at=None, available_at__lte=now).order_by('available_at').values_list('game_id', 'attempts')[:limit])
+	for game_id, attempts in due:
+		try:
+			with transaction.atomic():
+				job = QueuedGameResult.objects.select_for_update(skip_locked=True).filter(game_id=game_id, processed_at=None).first()
+				if job is None:
+					continue
+				apply_game_result(job)
+				job.processed_at = timezone.now()
+				job.replay = None
+				job.save(update_fields=["processed_at", "replay"])
+		except Exception as e:
+			delay = min(2 ** attempts, max_backoff)
+			logging.getLogger('game').error(f"Persisting result of game {game_id} failed (attempt {attempts + 1}), retrying in {delay}s: {e}")
+			QueuedGameResult.objects.filter(game_id=game_id).update(
+				attempts=F('attempts') + 1,
+				last_error=str(e),
+				available_at=timezone.now() + timedelta(seconds=delay),
+			)
+	return len(due), QueuedGameResult.objects.filter(processed_at=None).exists()
+
+@database_sync_to_async
+def get_game_replay(game_id):
+	from .models import GameReplay
+	return GameReplay.objects.select_related('game__player_left', 'game__player_right').filter(game_id=game_id).first()
 
 @database_sync_to_async
 def delete_game_history(game_id):
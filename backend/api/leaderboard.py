@@ -0,0 +1,178 @@
+import logging
+import redis
+from django.conf import settings
+from channels.db import database_sync_to_async
+
+MODES = ("classic", "rumble")
+ELO_OFFSET = 1 << 20
+WINRATE_SCALE = 10001
+REBUILD_CHUNK = 1000
+# seconds a rebuild may hold the rebuilding marker, a crashed one stops logging writes aside after that
+REBUILD_TIMEOUT = 300
+
+# While a rebuild reads UserStatistic, every write to a set is also logged in
+# its pending (added members) or removed set, replayed by SWAP_SCRIPT over
+# the rebuilt set in the same atomic step that swaps it in.
+ADD_SCRIPT = """
+local rebuilding = redis.call('EXISTS', KEYS[2]) == 1
+for i = 1, #ARGV, 2 do
+	redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+	if rebuilding then
+		redis.call('ZADD', KEYS[3], ARGV[i], ARGV[i + 1])
+		redis.call('SREM', KEYS[4], ARGV[i + 1])
+	end
+end
+"""
+REMOVE_SCRIPT = """
+local rebuilding = redis.call('EXISTS', KEYS[2]) == 1
+for i = 1, #ARGV do
+	redis.call('ZREM', KEYS[1], ARGV[i])
+	if rebuilding then
+		redis.call('ZREM', KEYS[3], ARGV[i])
+		redis.call('SADD', KEYS[4], ARGV[i])
+	end
+end
+"""
+SWAP_SCRIPT = """
+local pending = redis.call('ZRANGE', KEYS[4], 0, -1, 'WITHSCORES')
+for i = 1, #pending, 2 do
+	redis.call('ZADD', KEYS[1], pending[i + 1], pending[i])
+end
+for _, member in ipairs(redis.call('SMEMBERS', KEYS[5])) do
+	redis.call('ZREM', KEYS[1], member)
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+	redis.call('RENAME', KEYS[1], KEYS[2])
+else
+	redis.call('DEL', KEYS[2])
+end
+redis.call('DEL', KEYS[3], KEYS[4], KEYS[5])
+redis.call('SET', KEYS[6], 1)
+"""
+
+_client = None
+
+def get_redis():
+	global _client
+	if _client is None:
+		_client = redis.Redis.from_url(settings.LEADERBOARD_REDIS_URL,
+			socket_timeout=settings.LEADERBOARD_REDIS_TIMEOUT, socket_connect_timeout=settings.LEADERBOARD_REDIS_TIMEOUT)
+	return _client
+
+def leaderboard_key(mode):
+	return f"leaderboard:{mode}"
+
+def ready_key(mode):
+	return f"leaderboard:{mode}:ready"
+
+def rebuild_keys(mode):
+	"""The rebuilding marker and the sets logging writes made while it is set."""
+	return [f"leaderboard:{mode}:rebuilding", f"leaderboard:{mode}:pending", f"leaderboard:{mode}:removed"]
+
+def winrate_points(wins, games):
+	"""Winrate in hundredths of a percent, rounded the way get_winrate displays it."""
+	if games == 0:
+		return 0
+	return round(round(wins / games * 100, 2) * 100)
+
+def leaderboard_score(elo, games, wins):
+	"""Negated (elo, has games, winrate) key, ascending scores are the leaderboard order."""
+	return -(((elo + ELO_OFFSET) * 2 + (1 if games else 0)) * WINRATE_SCALE + winrate_points(wins, games))
+
+def leaderboard_member(user_id, username):
+	# equal scores are ordered by member bytes, NUL sorts a username before any longer one it prefixes
+	return f"{username.lower()}\x00{user_id}"
+
+def member_user_id(member):
+	return int(member.rsplit(b"\x00", 1)[1])
+
+def statistic_fields(mode):
+	return (f"{mode}_elo", f"{mode}_total_played", f"{mode}_wins")
+
+def update_leaderboard(mode, rows):
+	"""rows are (user id, username, elo, games, wins) of players whose statistics changed."""
+	try:
+		args = []
+		for user_id, username, elo, games, wins in rows:
+			args += [leaderboard_score(elo, games, wins), leaderboard_member(user_id, username)]
+		client = get_redis()
+		client.register_script(ADD_SCRIPT)(keys=[leaderboard_key(mode), *rebuild_keys(mode)], args=args, client=client)
+	except redis.RedisError as e:
+		logging.getLogger('game').error(f"Could not update the {mode} leaderboard: {e}")
+
+def add_to_leaderboards(user):
+	for mode in MODES:
+		update_leaderboard(mode, [(user.id, user.username, 1000, 0, 0)])
+
+def remove_from_leaderboards(user_id, username):
+	"""Takes the id and name rather than the user, a deleted user no longer has its id."""
+	try:
+		client = get_redis()
+		remove = client.register_script(REMOVE_SCRIPT)
+		pipe = client.pipeline()
+		for mode in MODES:
+			remove(keys=[leaderboard_key(mode), *rebuild_keys(mode)], args=[leaderboard_member(user_id, username)], client=pipe)
+		pipe.execute()
+	except redis.RedisError as e:
+		logging.getLogger('game').error(f"Could not remove {username} from the leaderboards: {e}")
+
+def rebuild_leaderboard(mode):
+	"""Refills the set from UserStatistic into a temporary key, swapped in at the end.
+
+	The rebuilding marker is set before the rows are read, so a write they
+	may not reflect yet is logged aside and replayed over the rebuilt set by
+	swap_leaderboard. A rebuild already running elsewhere is left to finish.
+	"""
+	from .models import UserStatistic
+	client = get_redis()
+	rebuilding, pending, removed = rebuild_keys(mode)
+	if not client.set(rebuilding, 1, nx=True, ex=REBUILD_TIMEOUT):
+		return
+	try:
+		building = f"{leaderboard_key(mode)}:building"
+		client.delete(building, pending, removed)
+		members = {}
+		rows = UserStatistic.objects.values_list('user_id', 'user__username', *statistic_fields(mode))
+		for user_id, username, elo, games, wins in rows.iterator(chunk_size=REBUILD_CHUNK):
+			members[leaderboard_member(user_id, username)] = leaderboard_score(elo, games, wins)
+			if len(members) == REBUILD_CHUNK:
+				client.zadd(building, members)
+				members = {}
+		if members:
+			client.zadd(building, members)
+		swap_leaderboard(client, mode, building)
+	except Exception:
+		client.delete(rebuilding)
+		raise
+	logging.getLogger('game').info(f"Rebuilt the {mode} leaderboard")
+
+def swap_leaderboard(client, mode, building):
+	client.register_script(SWAP_SCRIPT)(keys=[building, leaderboard_key(mode), *rebuild_keys(mode), ready_key(mode)], client=client)
+
+def ensure_leaderboard(mode):
+	if not get_redis().exists(ready_key(mode)):
+		rebuild_leaderboard(mode)
+
+@database_sync_to_async
+def leaderboard_page(mode, offset, limit):
+	"""(rank, UserStatistic with its user) of one page, and the number of ranked players."""
+	from .models import UserStatistic
+	ensure_leaderboard(mode)
+	pipe = get_redis().pipeline()
+	pipe.zrange(leaderboard_key(mode), offset, offset + limit - 1)
+	pipe.zcard(leaderboard_key(mode))
+	members, total = pipe.execute()
+	ids = [member_user_id(member) for member in members]
+	statistics = UserStatistic.objects.select_related('user').in_bulk(ids, field_name='user_id')
+	return [(offset + index + 1, statistics[user_id]) for index, user_id in enumerate(ids) if user_id in statistics], total
+
+def user_ranks(user_id, username):
+	"""1 based rank of a player in every mode, one round trip of O(log N) ZRANKs."""
+	for mode in MODES:
+		ensure_leaderboard(mode)
+	pipe = get_redis().pipeline(transaction=False)
+	for mode in MODES:
+		pipe.zrank(leaderboard_key(mode), leaderboard_member(user_id, username))
+	return {mode: None if rank is None else rank + 1 for mode, rank in zip(MODES, pipe.execute())}
+
+get_user_ranks = database_sync_to_async(user_ranks)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_user_tournament'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamehistory',
+            name='seed',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_gamereplay'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedGameResult',
+            fields=[
+                ('game_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('replay', models.BinaryField(null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
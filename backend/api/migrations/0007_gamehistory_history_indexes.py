@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_queuedgameresult'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(fields=['player_left', 'game_state', 'created_at', 'id'], name='gamehistory_left_history'),
+        ),
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(fields=['player_right', 'game_state', 'created_at', 'id'], name='gamehistory_right_history'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_gamehistory_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(condition=models.Q(('game_state', 'waiting')), fields=['game_mode', 'id'], name='gamehistory_waiting_mode'),
+        ),
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(condition=models.Q(('game_state', 'waiting')), fields=['player_left', 'player_right', 'game_type'], name='gamehistory_waiting_players'),
+        ),
+    ]
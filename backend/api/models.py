@@ -1,9 +1,10 @@
 # models.py
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
 from channels.db import database_sync_to_async
+from .leaderboard import add_to_leaderboards
 
 ######################## USER ###########################
 
@@ -31,6 +32,8 @@ class UserManager(BaseUserManager):
         UserPreference.objects.create(user=user)
         UserStatistic.objects.create(user=user)
         self._create_default_achievements(user)
+        # the Redis write waits for the user rows to be committed, as apply_game_result does
+        transaction.on_commit(lambda: add_to_leaderboards(user), using=self._db, robust=True)
         return user
 
     def	create_user_oauth(self, username, avatarUrl):
@@ -41,6 +44,7 @@ class UserManager(BaseUserManager):
         UserPreference.objects.create(user=user)
         UserStatistic.objects.create(user=user)
         self._create_default_achievements(user)
+        transaction.on_commit(lambda: add_to_leaderboards(user), using=self._db, robust=True)
         return user
 
     def create_superuser(self, username, password=None):
@@ -157,6 +161,34 @@ class GameHistory(models.Model):
     tournament_count = models.IntegerField(default=0)
     tournament_round2_game_id = models.IntegerField(default=-1)
     tournament_round2_place = models.IntegerField(default=-1)
+    seed = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            # a player's history, newest first, one range scan per side
+            models.Index(fields=['player_left', 'game_state', 'created_at', 'id'], name='gamehistory_left_history'),
+            models.Index(fields=['player_right', 'game_state', 'created_at', 'id'], name='gamehistory_right_history'),
+            # matchmaking only ever looks for waiting games, a handful of rows among every game ever played
+            models.Index(fields=['game_mode', 'id'], condition=models.Q(game_state='waiting'), name='gamehistory_waiting_mode'),
+            models.Index(fields=['player_left', 'player_right', 'game_type'], condition=models.Q(game_state='waiting'), name='gamehistory_waiting_players'),
+        ]
+
+class GameReplay(models.Model):
+    # kept apart from GameHistory so history queries never load the logs
+    game = models.OneToOneField(GameHistory, on_delete=models.CASCADE, primary_key=True, related_name='replay')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class QueuedGameResult(models.Model):
+    # write-behind queue of finished games, see Game.results; keyed by game id so a result is applied once
+    game_id = models.BigIntegerField(primary_key=True)
+    payload = models.JSONField()
+    replay = models.BinaryField(null=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
 class RecoveryCode(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='recovery_codes')
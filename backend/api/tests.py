@@ -0,0 +1,173 @@
+import os
+import random
+from unittest import skipUnless
+from unittest.mock import patch
+import redis
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from api import leaderboard
+from api.consumers.delete_user import DeleteUserConsumer
+from api.db_utils import flush_achievements
+from api.leaderboard import MODES, leaderboard_key, leaderboard_member, leaderboard_score, ready_key, rebuild_keys, update_leaderboard, remove_from_leaderboards, rebuild_leaderboard, user_ranks
+from api.models import Achievement, User, UserAchievement
+from api.utils import get_winrate
+
+# the leaderboard keys of this database are overwritten and deleted, as with api.benchmarks.rank_lookup
+TEST_REDIS_URL = os.environ.get('LEADERBOARD_TEST_REDIS_URL', 'redis://redis:6379/15')
+
+def redis_reachable():
+	try:
+		return redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=1).ping()
+	except redis.RedisError:
+		return False
+
+REDIS_REACHABLE = redis_reachable()
+
+class LeaderboardRedisMixin:
+	"""Points api.leaderboard at the test Redis database, with empty leaderboards."""
+
+	def setUp(self):
+		super().setUp()
+		self.redis = redis.Redis.from_url(TEST_REDIS_URL)
+		leaderboard._client = self.redis
+		self.clear_leaderboards()
+		self.addCleanup(self.clear_leaderboards)
+		self.addCleanup(setattr, leaderboard, '_client', None)
+
+	def clear_leaderboards(self):
+		for mode in MODES:
+			self.redis.delete(leaderboard_key(mode), f"{leaderboard_key(mode)}:building", ready_key(mode), *rebuild_keys(mode))
+
+	def score(self, mode, user):
+		return self.redis.zscore(leaderboard_key(mode), leaderboard_member(user.id, user.username))
+
+@skipUnless(REDIS_REACHABLE, "needs the leaderboard test Redis")
+class LeaderboardConsistencyTests(LeaderboardRedisMixin, TransactionTestCase):
+	"""Writes to the sorted sets must not get lost, neither on account deletion nor during a rebuild."""
+
+	def create_users(self, *usernames):
+		users = [User.objects.create_user(username, "password") for username in usernames]
+		for mode in MODES:
+			self.redis.set(ready_key(mode), 1)
+		return users
+
+	def test_deleted_user_leaves_the_leaderboards(self):
+		alice, bob = self.create_users("alice", "bob")
+		for mode in MODES:
+			self.assertEqual(self.score(mode, alice), leaderboard_score(1000, 0, 0))
+		self.assertTrue(async_to_sync(DeleteUserConsumer().delete_user)(alice.id))
+		for mode in MODES:
+			self.assertEqual(self.redis.zrange(leaderboard_key(mode), 0, -1), [leaderboard_member(bob.id, "bob").encode()])
+
+	def test_writes_during_a_rebuild_survive_the_swap(self):
+		alice, bob, carol = self.create_users("alice", "bob", "carol")
+		swap_leaderboard = leaderboard.swap_leaderboard
+
+		def swap_after_writes(client, mode, building):
+			# a game result and an account deletion land between the rows read and the swap
+			update_leaderboard(mode, [(alice.id, alice.username, 1016, 1, 1)])
+			remove_from_leaderboards(bob.id, bob.username)
+			swap_leaderboard(client, mode, building)
+
+		with patch("api.leaderboard.swap_leaderboard", swap_after_writes):
+			for mode in MODES:
+				rebuild_leaderboard(mode)
+		for mode in MODES:
+			with self.subTest(mode=mode):
+				self.assertEqual(self.score(mode, alice), leaderboard_score(1016, 1, 1))
+				self.assertIsNone(self.score(mode, bob))
+				self.assertEqual(self.score(mode, carol), leaderboard_score(1000, 0, 0))
+				self.assertTrue(self.redis.exists(ready_key(mode)))
+				self.assertEqual(self.redis.exists(*rebuild_keys(mode)), 0)
+		# without a rebuild running, writes go to the set alone
+		update_leaderboard("classic", [(carol.id, carol.username, 984, 1, 0)])
+		self.assertEqual(self.redis.exists(*rebuild_keys("classic")), 0)
+
+	def test_running_rebuild_is_left_to_finish(self):
+		self.create_users("alice")
+		self.redis.delete(ready_key("classic"))
+		self.redis.set(rebuild_keys("classic")[0], 1)
+		rebuild_leaderboard("classic")
+		self.assertFalse(self.redis.exists(ready_key("classic")))
+
+def sort_leaderboard(leaderboard):
+	"""The Python sort the sorted sets replaced, kept as the reference order."""
+	return sorted(leaderboard,
+			key=lambda x: (-x['elo'], x['winrate'] == 'No games', -float(x['winrate'].rstrip('%')) if x['winrate'] != 'No games' else 0, x['username'].lower()))
+
+@skipUnless(REDIS_REACHABLE, "needs the leaderboard test Redis")
+class LeaderboardRankTests(LeaderboardRedisMixin, SimpleTestCase):
+	"""ZRANK over the sorted sets gives every player the rank the removed sort_leaderboard did."""
+
+	def assertSameOrder(self, players):
+		for mode in MODES:
+			self.redis.set(ready_key(mode), 1)
+			update_leaderboard(mode, players)
+		expected = sort_leaderboard([{'username': username, 'elo': elo, 'winrate': get_winrate(wins, games)} for _, username, elo, games, wins in players])
+		ranks = {row['username']: index + 1 for index, row in enumerate(expected)}
+		for user_id, username, *_ in players:
+			self.assertEqual(user_ranks(user_id, username), {mode: ranks[username] for mode in MODES}, username)
+
+	def test_tie_breaks(self):
+		self.assertSameOrder([
+			# equal elo, the winrate decides, then players without games come last
+			(1, "dave", 1200, 4, 1),
+			(2, "carl", 1200, 4, 3),
+			(3, "abel", 1200, 0, 0),
+			(4, "bert", 1200, 3, 1),
+			# equal score, case-insensitive username order
+			(5, "Zoe", 1000, 3, 2),
+			(6, "yann", 1000, 6, 4),
+			(7, "Xavier", 1000, 0, 0),
+			(8, "walt", 1000, 0, 0),
+			# a username before every longer one it prefixes, whatever the ids
+			(19, "ann", 900, 2, 1),
+			(9, "anna", 900, 2, 1),
+			(10, "ann_", 900, 2, 1),
+			(11, "an", 900, 0, 0),
+			# winrates equal once rounded to the hundredth of a percent
+			(12, "tom", 800, 3, 1),
+			(13, "sam", 800, 300, 100),
+			(14, "rob", 800, 30001, 10000),
+			(15, "low", -50, 10, 0),
+		])
+
+	def test_random_players(self):
+		rng = random.Random(42)
+		names = ["".join(rng.choice("abAB_") for _ in range(rng.randint(1, 4))) for _ in range(400)]
+		players = []
+		for user_id, username in enumerate(dict.fromkeys(name.lower() for name in names), start=1):
+			games = rng.choice((0, rng.randint(1, 6), rng.randint(1, 300)))
+			players.append((user_id, rng.choice((username, username.upper())), rng.choice((990, 1000, 1010)), games, rng.randint(0, games)))
+		self.assertSameOrder(players)
+
+class FlushAchievementsTests(TestCase):
+	"""Progression written at game end never goes back, and unlocked achievements stay as they are."""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.speed, cls.challenger, cls.flawless = (Achievement.objects.create(name=name, description="", icon="", order=order, unlock_value=unlock_value)
+			for order, (name, unlock_value) in enumerate((("Speed Of Light", 100), ("Challenger", 10), ("Flawless", 1))))
+		cls.user = User.objects.create_user("alice", "password")
+
+	def progression(self, achievement):
+		return UserAchievement.objects.values_list("progression", "unlocked").get(user=self.user, achievement=achievement)
+
+	def test_progression_never_goes_back(self):
+		flush_achievements(self.user.id, [[self.speed.id, 63, False], [self.challenger.id, 4, False]])
+		flush_achievements(self.user.id, [[self.speed.id, 41, False], [self.challenger.id, 5, False]])
+		self.assertEqual(self.progression(self.speed), (63, False))
+		self.assertEqual(self.progression(self.challenger), (5, False))
+
+	def test_unlocked_achievement_is_left_alone(self):
+		flush_achievements(self.user.id, [[self.flawless.id, 1, True], [self.challenger.id, 10, True]])
+		earned = UserAchievement.objects.get(user=self.user, achievement=self.challenger).date_earned
+		flush_achievements(self.user.id, [[self.challenger.id, 3, False], [self.flawless.id, 1, True]])
+		self.assertEqual(self.progression(self.flawless), (1, True))
+		self.assertEqual(self.progression(self.challenger), (10, True))
+		self.assertEqual(UserAchievement.objects.get(user=self.user, achievement=self.challenger).date_earned, earned)
+
+	def test_nothing_to_write(self):
+		with self.assertNumQueries(0):
+			flush_achievements(None, [[self.speed.id, 63, False]])
+			flush_achievements(self.user.id, [])
@@ -2,7 +2,7 @@ from django.http import QueryDict
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
 from channels.db import database_sync_to_async
-from api.db_utils import get_user, get_user_by_name, get_users, get_user_statistic
+from api.db_utils import get_user
 import os
 import jwt
 import re
@@ -102,39 +102,12 @@ def get_user_avatar_url(user, headers):
 	url = f"https://{host}:{port}"
 	return f"{url}{user.avatar.url}" if user.avatar else f"{url}/imgs/default_avatar.png"
 
-async def get_users_with_stats(game_mode, headers):
-	users = await get_users()
-
-	for user in users:
-		db_user = await get_user_by_name(user['username'])
-		user_statistic = await get_user_statistic(db_user)
-		
-		avatar_url = get_user_avatar_url(db_user, headers)
-		user['is_42_user'] = db_user.is_42_user
-		user['avatar'] = avatar_url
-		user['username'] = db_user.username
-		user['display_name'] = db_user.display_name
-
-		if (game_mode == "classic"):
-			user['elo'] = user_statistic.classic_elo
-			user['games'] = user_statistic.classic_total_played
-			user['winrate'] = get_winrate(user_statistic.classic_wins, user['games'])
-		else:
-			user['elo'] = user_statistic.rumble_elo
-			user['games'] = user_statistic.rumble_total_played
-			user['winrate'] = get_winrate(user_statistic.rumble_wins, user['games'])
-	return users
-
 def get_winrate(wins, games):
 	if games != 0:
 		return f"{(wins / games) * 100:.2f}%"
 	else:
 		return 'No games'
 
-def sort_leaderboard(leaderboard):
-	return sorted(leaderboard, 
-			key=lambda x: (-x['elo'], x['winrate'] == 'No games', -float(x['winrate'].rstrip('%')) if x['winrate'] != 'No games' else 0, x['username'].lower()))
-
 async def parse_multipart_form_data(body):
 	"""Parse multipart form data and return a dictionary."""
 	#from djangoapi.utils.datastructures import MultiValueDict
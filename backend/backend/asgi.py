@@ -14,6 +14,7 @@ from channels.auth import AuthMiddlewareStack
 from Chat.routing import websocket_urlpatterns as chat_websocket_patterns
 from Game.routing import websocket_urlpatterns as game_websocket_patterns
 from Game.routing import websocket_urlpatternsTournament as tournament_websocket_patterns
+from Game.routing import websocket_urlpatternsReplay as replay_websocket_patterns
 from django.urls import path, re_path
 from api.consumers.leaderboard import LeaderboardConsumer
 from api.consumers.login_2fa import Login2FAConsumer
@@ -25,6 +26,7 @@ from api.consumers.generate_2fa_recovery import Generate2FARecoveryConsumer
 from api.consumers.oauth import OAuthConsumer
 from api.consumers.login_oauth import LoginOAuthConsumer
 from api.consumers.game_history import GameHistoryConsumer
+from api.consumers.game_history_export import GameHistoryExportConsumer
 from api.consumers.profile import ProfileConsumer
 from api.consumers.profile_achievement import ProfileAchievementConsumer
 from api.consumers.achievement import AchievementConsumer
@@ -50,6 +52,7 @@ websocket_patterns = [
     path('ws/game/', URLRouter(game_websocket_patterns)),
     path('ws/game/invite', URLRouter(game_websocket_patterns)),
     path('ws/tournament/', URLRouter(tournament_websocket_patterns)),
+    path('ws/replay/', URLRouter(replay_websocket_patterns)),
 ]
 
 http_patterns = [
@@ -63,6 +66,7 @@ http_patterns = [
     path('api/profiles/me/nav/', ProfileNavConsumer.as_asgi()),
     re_path(r'^api/profiles/(?P<username>.*)/avatar/$', AvatarConsumer.as_asgi()),
     re_path(r'^api/profiles/(?P<username>.*)/achievements/$', ProfileAchievementConsumer.as_asgi()),
+    re_path(r'^api/profiles/(?P<username>.*)/history/export/$', GameHistoryExportConsumer.as_asgi()),
     re_path(r'^api/profiles/(?P<username>.*)/history/$', GameHistoryConsumer.as_asgi()),
     re_path(r'^api/profiles/(?P<username>.*)/colors/$', ColorsConsumer.as_asgi()),
     re_path(r'^api/profiles/(?P<username>.*)/$', ProfileConsumer.as_asgi()),
@@ -170,3 +170,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Game simulation
+
+# Push game frames straight to the consumers of the process running the game instead of through Redis
+GAME_LOCAL_DELIVERY = os.environ.get('GAME_LOCAL_DELIVERY', 'true').lower() == 'true'
+# Spectators allowed per game, further watch requests are refused so the match itself keeps its frame budget
+GAME_MAX_SPECTATORS = int(os.environ.get('GAME_MAX_SPECTATORS', '50'))
+
+# Leaderboards
+# Redis holding the per mode ranking sorted sets (api.leaderboard), rebuilt from the database when missing
+
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL', 'redis://redis:6379/0')
+# Seconds to connect or wait for a reply, an unreachable Redis fails the leaderboard call instead of hanging the request
+LEADERBOARD_REDIS_TIMEOUT = float(os.environ.get('LEADERBOARD_REDIS_TIMEOUT', '1'))
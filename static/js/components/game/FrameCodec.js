@@ -0,0 +1,100 @@
+// Binary game protocol, mirrors backend/Game/frame_codec.py.
+// Enabled by connecting to ws/game/ with protocol=binary.
+
+const MESSAGE_NAMES = { 1: "game_update" };
+const FLAG_KEYFRAME = 0x01;
+const ENTITIES = ["player_left", "player_right", "ball"];
+const AXES = ["x", "y", "z"];
+const MASK_KEYS = 1 << 9;
+const MASK_SCORES = 1 << 10;
+const MASK_BALL_COLOR = 1 << 11;
+const MASK_TRAJECTORY = 1 << 12;
+const MASK_EVENTS = 1 << 13;
+const MASK_ACKS = 1 << 14;
+const MASK_FRAME = 1 << 15;
+const KEY_BITS = [
+	["player_left", "UP", 0x01],
+	["player_left", "DOWN", 0x02],
+	["player_right", "UP", 0x04],
+	["player_right", "DOWN", 0x08],
+];
+const INPUT_TYPES = { keydown: 1, keyup: 2 };
+const INPUT_KEYS = ["ArrowUp", "ArrowDown", "W", "S"];
+
+export function isBinaryProtocol(ws) {
+	return new URL(ws.url).searchParams.get("protocol") === "binary";
+}
+
+export function decodeFrame(buffer) {
+	const view = new DataView(buffer);
+	const type = view.getUint8(0);
+	const flags = view.getUint8(1);
+	const mask = view.getUint16(2, true);
+	let offset = 4;
+	const data = {};
+	if (flags & FLAG_KEYFRAME) data.keyframe = true;
+
+	let index = 0;
+	for (const entity of ENTITIES) {
+		for (const axis of AXES) {
+			if (mask & (1 << index)) {
+				data.positions = data.positions || {};
+				data.positions[entity] = data.positions[entity] || {};
+				data.positions[entity][axis] = view.getFloat32(offset, true);
+				offset += 4;
+			}
+			index++;
+		}
+	}
+	if (mask & MASK_KEYS) {
+		const bits = view.getUint8(offset++);
+		data.keys = { player_left: [], player_right: [] };
+		for (const [side, key, bit] of KEY_BITS) {
+			if (bits & bit) data.keys[side].push(key);
+		}
+	}
+	if (mask & MASK_SCORES) {
+		data.scores = { left: view.getUint8(offset), right: view.getUint8(offset + 1) };
+		offset += 2;
+	}
+	if (mask & MASK_BALL_COLOR) {
+		const rgb = (view.getUint8(offset) << 16) | (view.getUint8(offset + 1) << 8) | view.getUint8(offset + 2);
+		data.ball_color = "#" + rgb.toString(16).padStart(6, "0").toUpperCase();
+		offset += 3;
+	}
+	if (mask & MASK_TRAJECTORY) {
+		const count = view.getUint8(offset++);
+		data.trajectory = [];
+		for (let i = 0; i < count; i++) {
+			data.trajectory.push({
+				x: view.getFloat32(offset, true),
+				y: view.getFloat32(offset + 4, true),
+				z: view.getFloat32(offset + 8, true),
+			});
+			offset += 12;
+		}
+	}
+	if (mask & MASK_ACKS) {
+		data.acks = { player_left: view.getUint16(offset, true), player_right: view.getUint16(offset + 2, true) };
+		offset += 4;
+	}
+	if (mask & MASK_FRAME) {
+		data.frame = view.getUint16(offset, true);
+		if (!data.keyframe) data.base = view.getUint16(offset + 2, true);
+		offset += 4;
+	}
+	if (mask & MASK_EVENTS) {
+		data.events = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, offset)));
+	}
+	return { type: MESSAGE_NAMES[type], data: data };
+}
+
+export function encodeInput(type, key, seq, time) {
+	const buffer = new ArrayBuffer(8);
+	const view = new DataView(buffer);
+	view.setUint8(0, INPUT_TYPES[type]);
+	view.setUint8(1, INPUT_KEYS.indexOf(key));
+	view.setUint16(2, seq & 0xffff, true);
+	view.setUint32(4, time >>> 0, true);
+	return buffer;
+}
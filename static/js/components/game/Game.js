@@ -2,11 +2,13 @@ import { Renderer } from "./Renderer.js";
 import { SceneManager } from "./SceneManager.js";
 import { InputManager } from "./InputManager.js";
 import { ParticleSystem } from "./ParticleSystem.js";
+import { decodeFrame } from "./FrameCodec.js";
 import * as THREE from "https://unpkg.com/three@0.160.0/build/three.module.js";
 
 export class Game {
 	constructor(canvas, ws) {
 		this.ws = ws;
+		this.ws.binaryType = "arraybuffer";
 		this.initialized = false;
 		this.antialiasing = false;
 		this.canvas = canvas;
@@ -18,6 +20,7 @@ export class Game {
 
 		this.onGameEnd = null;
 		this.ended = false;
+		this.state = null;
 		this.showBanner = null;
 		this.setupWebSocket();
 		this.lastTime = 0;
@@ -58,6 +61,19 @@ export class Game {
 		this.sceneManager = new SceneManager(this.renderer.renderer, window.app.settings.quality);
 		this.inputManager = new InputManager(this.ws);
 		await this.sceneManager.initialize(initData);
+		this.state = {
+			positions: {
+				player_left: initData.positions.player_left,
+				player_right: initData.positions.player_right,
+				ball: initData.positions.ball,
+			},
+			keys: { player_left: [], player_right: [] },
+			trajectory: [],
+		};
+		// spectators get a reduced rate stream and interpolate between its frames
+		this.frameInterval = (initData.frame_interval || 0) * 1000;
+		this.side = initData.side;
+		this.interpolation = null;
 		this.particleSystem = new ParticleSystem(this.sceneManager.scene);
 		this.animate();
 		this.initialized = true;
@@ -66,7 +82,7 @@ export class Game {
 
 	setupWebSocket() {
 		this.ws.onmessage = (event) => {
-			const message = JSON.parse(event.data);
+			const message = typeof event.data === "string" ? JSON.parse(event.data) : decodeFrame(event.data);
 			switch (message.type) {
 				case "init":
 					this.initialize(message.data);
@@ -108,28 +124,71 @@ export class Game {
 		}
 	}
 
+	// Frames only carry the fields that changed since the previous one, keyframes carry all of them.
+	// A delta names the frame it applies to in base, any other base means a frame got lost on the way.
+	mergeState(data) {
+		if (data.keyframe) {
+			this.state = { positions: {}, keys: {}, trajectory: [] };
+			this.resyncRequested = false;
+		} else if (data.base !== undefined && data.base !== this.lastFrame) {
+			this.requestResync();
+		}
+		if (data.frame !== undefined) this.lastFrame = data.frame;
+		if (data.positions) this.mergeInto(this.state.positions, data.positions);
+		if (data.keys) this.mergeInto(this.state.keys, data.keys);
+		if (data.trajectory) this.state.trajectory = data.trajectory;
+		if (data.ball_color) this.state.ball_color = data.ball_color;
+		if (data.acks && this.side) this.inputManager.acknowledge(data.acks[this.side]);
+	}
+
+	requestResync() {
+		if (this.resyncRequested || !this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+		this.resyncRequested = true;
+		this.ws.send(JSON.stringify({ type: "resync" }));
+	}
+
+	mergeInto(target, patch) {
+		for (const [key, value] of Object.entries(patch)) {
+			if (value && typeof value === "object" && !Array.isArray(value) && target[key]) {
+				this.mergeInto(target[key], value);
+			} else {
+				target[key] = value;
+			}
+		}
+	}
+
 	handleGameUpdate(data) {
+		this.mergeState(data);
+		const state = this.state;
 		if (data.positions && this.sceneManager.debugMod) {
-			this.sceneManager.updateDebugPositions(data.positions);
+			this.sceneManager.updateDebugPositions(state.positions);
+		} else if (data.positions && this.frameInterval) {
+			this.startInterpolation(state.positions);
 		} else if (data.positions) {
-			this.sceneManager.updateObjectPosition(data.positions);
+			this.sceneManager.updateObjectPosition(state.positions);
 		}
-		if (data.trajectory) {
-			this.sceneManager.updateTrajectory(data.trajectory);
-			this.sceneManager.showTrajectory(true);
-		} else {
-			this.sceneManager.showTrajectory(false);
+		if (data.positions || data.trajectory) {
+			if (state.trajectory.length > 0) {
+				this.sceneManager.updateTrajectory([state.positions.ball, ...state.trajectory]);
+				this.sceneManager.showTrajectory(true);
+			} else {
+				this.sceneManager.updateTrajectory([]);
+				this.sceneManager.showTrajectory(false);
+			}
 		}
-		if (data.keys)
+		if (data.keys && state.keys.player_left && state.keys.player_right)
 		{
-			const playerLeftKeys = data.keys.player_left;
-			const playerRightKeys = data.keys.player_right;
+			const playerLeftKeys = state.keys.player_left;
+			const playerRightKeys = state.keys.player_right;
 
 			this.sceneManager.setButtonBrightness("left", true, playerLeftKeys.includes("UP"))
 			this.sceneManager.setButtonBrightness("left", false, playerLeftKeys.includes("DOWN"))
 			this.sceneManager.setButtonBrightness("right", true, playerRightKeys.includes("UP"))
 			this.sceneManager.setButtonBrightness("right", false, playerRightKeys.includes("DOWN"))
 		}
+		if (data.ball_color) {
+			this.sceneManager.updateBallColor(data.ball_color, data.ball_color);
+		}
 		if (data.events && data.events.length > 0) {
 			data.events.forEach((event) => {
 				if (event.type === "score" && event.position) {
@@ -153,9 +212,6 @@ export class Game {
 					this.ws.close(1000);
 					
 				}
-				if (event.type == "ball_last_hitter") {
-					this.sceneManager.updateBallColor(event.color, event.color);
-				}
 				if (event.type == "event") {
 					try {
 						
@@ -174,6 +230,25 @@ export class Game {
 		}
 	}
 
+	startInterpolation(positions) {
+		const from = this.interpolation ? this.interpolatedPositions(performance.now()) : positions;
+		this.interpolation = { from: structuredClone(from), to: structuredClone(positions), start: performance.now() };
+	}
+
+	interpolatedPositions(now) {
+		const { from, to, start } = this.interpolation;
+		const t = Math.min(1, (now - start) / this.frameInterval);
+		const positions = {};
+		for (const entity of ["player_left", "player_right", "ball"]) {
+			positions[entity] = {
+				x: from[entity].x + (to[entity].x - from[entity].x) * t,
+				y: from[entity].y + (to[entity].y - from[entity].y) * t,
+				z: from[entity].z + (to[entity].z - from[entity].z) * t,
+			};
+		}
+		return positions;
+	}
+
 	activateEvent(event) {
 		
 		switch (event.name) {
@@ -224,6 +299,9 @@ export class Game {
 			if (this.particleSystem) {
 				this.particleSystem.update(deltaTime);
 			}
+			if (this.interpolation) {
+				this.sceneManager.updateObjectPosition(this.interpolatedPositions(performance.now()));
+			}
 			this.sceneManager.composer.render();
 		}
 	}
@@ -70,7 +70,7 @@ export default class GameComponent {
 			{
 				const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
 				const host = window.location.host;
-				const wsUrl = `${protocol}//${host}/ws/game/?local=true&mode=${window.app.settings["game-mode"]}`;
+				const wsUrl = `${protocol}//${host}/ws/game/?local=true&mode=${window.app.settings["game-mode"]}&protocol=binary`;
 		
 				this.initializeWebSocket(wsUrl);
 			}
@@ -101,7 +101,7 @@ export default class GameComponent {
 	searchGame() {
 		const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
 		const host = window.location.host;
-		const wsUrl = `${protocol}//${host}/ws/game/?mode=${window.app.settings["game-mode"]}`;
+		const wsUrl = `${protocol}//${host}/ws/game/?mode=${window.app.settings["game-mode"]}&protocol=binary`;
 
 		this.initializeWebSocket(wsUrl);
 		this.startSearchGameTimer();
@@ -110,7 +110,7 @@ export default class GameComponent {
 	playBot(difficulty) {
 		const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
 		const host = window.location.host;
-		const wsUrl = `${protocol}//${host}/ws/game/?bot=${difficulty}&mode=${window.app.settings["game-mode"]}`;
+		const wsUrl = `${protocol}//${host}/ws/game/?bot=${difficulty}&mode=${window.app.settings["game-mode"]}&protocol=binary`;
 
 		this.initializeWebSocket(wsUrl);
 	}
@@ -121,6 +121,7 @@ export default class GameComponent {
 		}
 
 		window.app.gamews = new WebSocket(wsUrl);
+		window.app.gamews.binaryType = "arraybuffer";
 
 		window.app.gamews.onmessage = (event) => {
 			const events = JSON.parse(event.data);
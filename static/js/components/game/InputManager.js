@@ -1,8 +1,15 @@
+import { isBinaryProtocol, encodeInput } from "./FrameCodec.js";
+
 export class InputManager {
 	constructor(ws) {
 		this.keys = {};
 		this.lastKeyPressed = null;
 		this.ws = ws;
+		this.binary = isBinaryProtocol(ws);
+		this.seq = 0;
+		// send time of each input not yet acked by the server, for input to effect latency
+		this.unacked = new Map();
+		this.inputLatency = 0;
 		this.initListeners();
 	}
 
@@ -45,12 +52,21 @@ export class InputManager {
 			if (key === 's')
 			{
 				key = 'S'
+			}
+			this.seq = (this.seq + 1) & 0xffff;
+			const time = Math.round(performance.now());
+			this.unacked.set(this.seq, time);
+			if (this.binary) {
+				this.ws.send(encodeInput(type, key, this.seq, time));
+				return;
 			}
 			 // Debug log
 			this.ws.send(
 				JSON.stringify({
 					type: type,
 					key: key,
+					seq: this.seq,
+					t: time,
 				}),
 			);
 			console.log(JSON.stringify({
@@ -61,6 +77,16 @@ export class InputManager {
 		}
 	}
 
+	// The server acks the last input it applied, every input up to it has taken effect.
+	acknowledge(seq) {
+		const now = performance.now();
+		for (const [sent, time] of this.unacked) {
+			if (((seq - sent) & 0xffff) >= 0x8000) break;
+			this.inputLatency += (now - time - this.inputLatency) * 0.2;
+			this.unacked.delete(sent);
+		}
+	}
+
 	dispose() {
 		window.removeEventListener("keydown", this.keydownListener);
 		window.removeEventListener("keyup", this.keyupListener);
@@ -50,6 +50,7 @@ export default class LeaderboardView {
 	addEventListeners() {
 		window.app.addNavEventListeners();
 		this.addGameModeCheckboxEventListeners();
+		this.addScrollEventListener();
 	}
 
 	addGameModeCheckboxEventListeners() {
@@ -60,20 +61,41 @@ export default class LeaderboardView {
 		});
 	}
 
+	addScrollEventListener() {
+		const table = document.getElementById("leaderboard-table-container");
+		table.addEventListener("scroll", async () => {
+			if (table.scrollTop + table.clientHeight >= table.scrollHeight - 100) {
+				await this.loadPage();
+			}
+		});
+	}
+
 	async addContent(gameMode)
 	{
+		this.gameMode = gameMode;
+		this.nextOffset = 0;
+		this.loading = null;
+		document.getElementById("leaderboard-table-container").innerHTML = "";
+		await this.loadPage();
+	}
+
+	async loadPage()
+	{
+		if (this.nextOffset === null || this.loading)
+			return;
+		const gameMode = this.gameMode;
+		this.loading = fetch(`/api/leaderboard/${gameMode}/?offset=${this.nextOffset}`);
 		try {
-			const response = await fetch(`/api/leaderboard/${gameMode}/`);
-	
+			const response = await this.loading;
 			const data = await response.json();
-	
+			if (gameMode !== this.gameMode)
+				return;
+
 			if (data.success) {
-				const leaderboardTable = document.getElementById("leaderboard-table-container");
-				leaderboardTable.innerHTML = "";
-				let i = 0;
-				while (i < data.leaderboard.length) {
-					this.addUserToLB(data.leaderboard[i], ++i);
-				}	
+				for (const user of data.leaderboard) {
+					this.addUserToLB(user, user.rank);
+				}
+				this.nextOffset = data.next_offset;
 			}
 			else if (response.status === 401 && data.hasOwnProperty('is_jwt_valid') && !data.is_jwt_valid) {
 				window.app.logout();
@@ -85,6 +107,10 @@ export default class LeaderboardView {
 		catch (e) {
 			console.error(e);
 		}
+		finally {
+			if (gameMode === this.gameMode)
+				this.loading = null;
+		}
 	}
 
 	addUserToLB(user, rank) {
@@ -142,6 +142,16 @@ export default class ProfileView {
 	addEventListeners() {
 		window.app.addNavEventListeners();
 		this.addRedirectToAchievementsListener();
+		this.addGameHistoryScrollListener();
+	}
+
+	addGameHistoryScrollListener() {
+		const itemContainer = document.getElementById('game-history-item-container');
+		itemContainer.addEventListener('scroll', async () => {
+			if (itemContainer.scrollTop + itemContainer.clientHeight >= itemContainer.scrollHeight - 100) {
+				await this.setGameHistory();
+			}
+		});
 	}
 
 	addRedirectToAchievementsListener() {
@@ -222,15 +232,17 @@ export default class ProfileView {
 	}
 
 	async setGameHistory() {
+		if (this.historyCursor === null || this.historyLoading)
+			return;
+		this.historyLoading = true;
 		try {
-			const response = await fetch(`/api/profiles/${this.username}/history/`);
+			const cursor = this.historyCursor ? `?cursor=${encodeURIComponent(this.historyCursor)}` : '';
+			const response = await fetch(`/api/profiles/${this.username}/history/${cursor}`);
 	
 			const data = await response.json();
 			if (data.success) {
-				Object.keys(data).forEach(key => {
-					if (key.startsWith('game_history_'))
-						this.addGameHistoryToGameHistories(data[key]);
-				});
+				data.games.forEach(gameHistory => this.addGameHistoryToGameHistories(gameHistory));
+				this.historyCursor = data.next_cursor;
 			}
 			else if (response.status === 401 && data.hasOwnProperty('is_jwt_valid') && !data.is_jwt_valid) {
 				window.app.logout();
@@ -242,6 +254,9 @@ export default class ProfileView {
 		catch (e) {
 			console.error(e);
 		}
+		finally {
+			this.historyLoading = false;
+		}
 	}
 
 	async setAchievements() {